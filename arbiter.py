@@ -1,12 +1,10 @@
 from pc.models.world import WorldUpdater, World
-from pc.vision import tools, camera, vision
-from pc.planning.planner import Planner
+from pc.vision import tools, camera, vision, preprocessing
+from pc.planning.planner import Planner, PlanningLoop, PLANNING_RATE
 from pc.robot import Robot
 import time
 from pc.vision import calibrationgui, visiongui
 from Tkinter import *
-from pc.vision.vision import split_into_rgb_channels
-import cv2
 
 CONTROLS = ["LH", "UH", "LS", "US", "LV", "UV", "LR",
             "UR", "LG", "UG", "LB", "UB", "BR", "BL",
@@ -36,7 +34,8 @@ class Arbiter(object):
     """
 
     def __init__(self, pitch, colour, our_side, profile="None",
-                 video_src=0, comm_port='/dev/ttyACM0', comms=False):
+                 video_src=0, comm_port='/dev/ttyACM0', comms=False,
+                 engines=None, planning_rate=PLANNING_RATE):
         """
         Entry point for the SDP system. Initialises all components
         and runs the polling loop.
@@ -48,6 +47,9 @@ class Arbiter(object):
         :param video_src: Source of feed - 0 default for DICE cameras
         :param comm_port: Robot serial port
         :param comms: Enable serial communication
+        :param engines: Detection engine per object kind, e.g.
+                        {'ball': 'backprojection'} - see pc/vision/engines.py
+        :param planning_rate: Rate in Hz of the planning loop
         :return:
         """
 
@@ -62,9 +64,17 @@ class Arbiter(object):
         self.profile = profile
         self.calibration = tools.get_colors(pitch)
         self.comms = comms
+        self.engines = engines
+        self.planning_rate = planning_rate
+        self.planner_paused = False  # Flag for pausing/resuming the planning
 
         self.contrast_toggle = False
         self.vision_filter_toggle = False
+        self.lighting_toggle = False
+
+        # Shared frame preprocessing (contrast etc.) for vision and the GUIs
+        self.preprocessor = preprocessing.Preprocessor(
+            self.calibration, tools.get_lighting_region(pitch))
 
         # Set up capture device
         self.camera = camera.Camera(pitch, video_src=video_src)
@@ -78,15 +88,20 @@ class Arbiter(object):
 
         # Set up world model; updater
         self.world = None
+        self.predicted_world = None
         self.world_updater = None
         self.start_world()
 
-        # Set up the planner
+        # Set up the planner, run on its own thread
         self.planner = None
+        self.planning_loop = None
         self.start_planner()
 
         # Initialize the main GUI
         self.root = Tk()
+        # Errors in callbacks end the main loop and are raised from run
+        self._callback_error = None
+        self.root.report_callback_exception = self.report_callback_exception
         self.root.resizable(width=FALSE, height=FALSE)
         self.root.wm_title("Vision Wrapper")
         self.root.bind('<Key>', self.key_press)
@@ -139,7 +154,6 @@ class Arbiter(object):
 
         # Buttons
         # Planning pause/resume toggle
-        self.planner_paused = False  # Flag for pausing/resuming the planning
         planning_toggle = Button(self.root)
         planning_toggle["text"] = "P[l]anning Toggle"
         planning_toggle["command"] = self.toggle_planning
@@ -171,9 +185,19 @@ class Arbiter(object):
         vision_filter_toggle.grid(row=7, column=1, columnspan=5)
         # Contrast toggle
         contrast_toggle = Button(self.root)
-        contrast_toggle["text"] = "Toggle Contrast\nEXPERIMENTAL (-FPS)"
+        contrast_toggle["text"] = "Toggle Contrast"
         contrast_toggle["command"] = self.toggle_contrast
         contrast_toggle.grid(row=8, column=1, columnspan=5)
+        # Lighting compensation toggle
+        lighting_toggle = Button(self.root)
+        lighting_toggle["text"] = "Toggle Lighting\nCompensation"
+        lighting_toggle["command"] = self.toggle_lighting
+        lighting_toggle.grid(row=9, column=1, columnspan=5)
+        # Lighting reference reset
+        lighting_reset = Button(self.root)
+        lighting_reset["text"] = "Reset Lighting\nReference"
+        lighting_reset["command"] = self.preprocessor.lighting.reset
+        lighting_reset.grid(row=10, column=1, columnspan=5)
 
         # Used by the calibration GUI to know
         # which mode to calibrate (plate/dot/red etc)
@@ -191,9 +215,18 @@ class Arbiter(object):
     def start_planner(self):
         """
         Starts a new planner depending on our current world state, robot controller, and profile.
+        The planner runs in a planning loop of its own, replacing the previous one.
         """
+        if self.planning_loop is not None:
+            self.planning_loop.stop()
+            self.planning_loop = None
+
         if self.profile != "None":
-            self.planner = Planner(self.world, self.robot_controller, self.profile)
+            self.planner = Planner(self.predicted_world, self.robot_controller,
+                                   self.profile)
+            self.planning_loop = PlanningLoop(self.planner, self.planning_rate)
+            self.planning_loop.paused = self.planner_paused
+            self.planning_loop.start()
         else:
             self.planner = None
 
@@ -205,15 +238,21 @@ class Arbiter(object):
         frame_center = self.camera.get_adjusted_center()
         self.vision = vision.Vision(self.pitch, self.colour, self.side, frame_shape,
                                     frame_center, self.calibration,
-                                    perspective_correction=True)
+                                    perspective_correction=True,
+                                    engines=self.engines)
 
     def start_world(self):
         """
         Starts a new world model and world updater.
+        The planner plans on a second world, predicted ahead to when its
+        commands are carried out.
         """
         self.world = World(self.side, self.pitch)
+        self.predicted_world = World(self.side, self.pitch)
         self.world_updater = WorldUpdater(self.pitch, self.colour, self.side,
-                                          self.world, self.vision)
+                                          self.world, self.vision,
+                                          self.predicted_world,
+                                          self.robot_controller)
 
     def key_press(self, event):
         """
@@ -228,7 +267,8 @@ class Arbiter(object):
         """
         Toggles planning to prevent updates.
         """
-        self.planner.robot_ctl.stop()
+        if self.planning_loop is not None:
+            self.planning_loop.toggle_pause()
         self.planner_paused = not self.planner_paused
 
     def clear_calibrations(self):
@@ -311,11 +351,18 @@ class Arbiter(object):
     def toggle_contrast(self):
         """
         Toggle the contrast filtering on vision.
-        Restarts the vision system, and the vision GUI.
+        The preprocessed frame is shared by vision and the GUIs, so nothing
+        needs restarting.
         """
         self.contrast_toggle = not self.contrast_toggle
-        self.start_vision()
-        self.gui = visiongui.VisionGUI(self, self.pitch, self.vision_filter_toggle)
+
+    def toggle_lighting(self):
+        """
+        Toggle the lighting drift compensation on vision.
+        The reference is taken from the calibration, or from the next frame if
+        there is none for this pitch yet.
+        """
+        self.lighting_toggle = not self.lighting_toggle
 
     def toggle_vision_filters(self):
         """
@@ -332,62 +379,70 @@ class Arbiter(object):
         try:
             self.tick()
             self.root.mainloop()
+            if self._callback_error is not None:
+                error = self._callback_error
+                raise error[0], error[1], error[2]
         except:
             raise
         finally:
+            if self.planning_loop is not None:
+                self.planning_loop.stop()
+            if self.planner is not None and \
+                    self.planner.alignment_commands is not None:
+                print "Commands per alignment: %.2f" % \
+                    self.planner.alignment_commands
             if self.comms:
                 self.robot_controller.teardown()
             self.camera.release()
             tools.save_colors(self.pitch, self.calibration)
 
+    def report_callback_exception(self, *exc_info):
+        """
+        Keep an error raised by a Tk callback and leave the main loop, so that
+        run raises it and tears down.
+        """
+        self._callback_error = exc_info
+        self.root.quit()
+
     def tick(self):
         """
         Main loop of the system. Grabs frames and passes them to the GUIs and
         the world state.
         """
+        # An error in planning is raised here so the system tears down
+        if self.planning_loop is not None:
+            self.planning_loop.check()
+
         # Get frame
         frame = self.camera.get_frame()
 
-        ct_clipLimit = self.sliders['C1'].get()
-        ct_tileGridSize = self.sliders['C2'].get()
+        # Apply lighting and contrast changes first, the HSV conversion is
+        # shared onwards
+        contrast = None
         if self.contrast_toggle:
-            # Apply contrast changes first
-            r, g, b = split_into_rgb_channels(frame)
-
-            if ct_clipLimit == 0:
-                ct_clipLimit += 1
-
-            if ct_tileGridSize == 0:
-                ct_tileGridSize += 1
-
-            clahe = cv2.createCLAHE(clipLimit=1.0*ct_clipLimit,
-                                    tileGridSize=(1.0*ct_tileGridSize, 1.0*ct_tileGridSize))
-
-            r_c = clahe.apply(r)
-            g_c = clahe.apply(g)
-            b_c = clahe.apply(b)
-
-            frame = cv2.merge((r_c, g_c, b_c))
+            contrast = (self.sliders['C1'].get(), self.sliders['C2'].get())
+        frame, frame_hsv = self.preprocessor.process(frame, contrast,
+                                                     self.lighting_toggle)
 
         # Find object positions, update world model
         model_positions, regular_positions, grabbers = \
-            self.world_updater.update_world(frame)
+            self.world_updater.update_world(frame, frame_hsv,
+                                            self.camera.timestamp)
 
-        # Act on the updated world model
+        # The planning loop acts on the updated world model, show its state
         p_state = s_state = None
-        if self.planner is not None:
-            if not self.planner_paused:
-                self.planner.plan()
-                p_state = self.planner.planner_state_string
-                s_state = self.planner.strategy_state_string
+        if self.planning_loop is not None:
+            p_state, s_state = self.planning_loop.status
 
         fps = float(self.counter) / (time.clock() - self.timer)
 
         # Draw GUIs
-        self.calibration_gui.show(frame, self.key_event, key=self.key)
+        self.calibration_gui.show(frame, self.key_event, key=self.key,
+                                  frame_hsv=frame_hsv)
         self.gui.draw(frame, model_positions, regular_positions,
                       grabbers, fps, self.colour, self.side, p_state,
-                      s_state, self.sliders['BR'].get(), self.sliders['BL'].get())
+                      s_state, self.sliders['BR'].get(), self.sliders['BL'].get(),
+                      health=self.vision.get_health())
 
         self.counter += 1
 
@@ -0,0 +1,63 @@
+import argparse
+import timeit
+
+from postprocessing import Postprocessing
+from world import World
+
+KEYS = ['our_defender', 'our_attacker', 'their_defender', 'their_attacker',
+        'ball']
+
+
+def get_positions(frame):
+    """
+    Vision output for a frame with every object moving a little.
+    """
+    positions = {}
+    for i, key in enumerate(KEYS):
+        positions[key] = {'x': 50 + 40 * i + frame % 7,
+                          'y': 100 + frame % 11,
+                          'angle': (0.1 * frame) % 6 if key != 'ball' else None,
+                          'velocity': None}
+    return positions
+
+
+def checked_update(world, pos_dict):
+    """
+    World update through the validating vector setters.
+    """
+    world.our_attacker.vector = pos_dict['our_attacker']
+    world.their_attacker.vector = pos_dict['their_attacker']
+    world.our_defender.vector = pos_dict['our_defender']
+    world.their_defender.vector = pos_dict['their_defender']
+    world.ball.vector = pos_dict['ball']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the per-frame cost of a world model update.')
+    parser.add_argument('--frames', type=int, default=10000,
+                        help='Number of frames to time')
+    parser.add_argument('--pitch', type=int, default=0)
+    args = parser.parse_args()
+
+    world = World('left', args.pitch)
+    postprocessing = Postprocessing()
+    frames = [postprocessing.analyze(get_positions(i), i / 25.0)
+              for i in range(args.frames)]
+
+    def checked():
+        for pos_dict in frames:
+            checked_update(world, pos_dict)
+
+    def unchecked():
+        for pos_dict in frames:
+            world.update_positions(pos_dict)
+
+    for name, run in [('checked', checked), ('unchecked', unchecked)]:
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        print '%-10s %8.2f us per frame' % (name,
+                                             seconds / args.frames * 1e6)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import numpy as np
+
+from state import X, Y, ANGLE
+
+
+class WorldHistory(object):
+    """
+    Fixed-capacity ring buffer of timestamped kinematics of every object.
+
+    Samples are written into preallocated arrays, so appending never
+    allocates and the oldest sample is overwritten once the buffer is full:
+
+        times   (capacity,)        time of each sample in seconds
+        states  (capacity, n, 4)   x, y, angle, velocity of each object
+
+    Queries take times in seconds and return arrays with one row per object.
+    """
+
+    def __init__(self, names, capacity=256):
+        """
+        :param names: Name of the object in each row, as in WorldState
+        :param capacity: Number of samples kept
+        """
+        self.names = list(names)
+        self.rows = dict((name, row) for row, name in enumerate(self.names))
+        self.capacity = capacity
+        self.times = np.zeros(capacity)
+        self.states = np.zeros((capacity, len(self.names), 4))
+        self._next = 0  # Slot the next sample is written to
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, time, kinematics):
+        """
+        Add the kinematics of every object at the given time.
+
+        :param time: Time of the sample, not earlier than the previous sample
+        :param kinematics: (x, y, angle, velocity) of each object
+        """
+        self.times[self._next] = time
+        self.states[self._next] = kinematics
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
+
+    def _slots(self, count=None):
+        """
+        Indices of the last count samples (all if None), oldest first.
+        """
+        count = self._count if count is None else min(count, self._count)
+        return np.arange(self._next - count, self._next) % self.capacity
+
+    @property
+    def latest_time(self):
+        if not self._count:
+            return None
+        return self.times[(self._next - 1) % self.capacity]
+
+    def latest(self):
+        """
+        The most recent kinematics of every object, or None if empty.
+        """
+        if not self._count:
+            return None
+        return self.states[(self._next - 1) % self.capacity]
+
+    def window(self, seconds, end=None):
+        """
+        The samples of the last seconds, up to end (the latest sample's
+        time by default).
+
+        :return: (times, states) arrays ordered oldest first
+        """
+        slots = self._slots()
+        times = self.times[slots]
+        if end is None:
+            end = self.latest_time if self._count else 0
+        selected = (times >= end - seconds) & (times <= end)
+        slots = slots[selected]
+        return self.times[slots], self.states[slots]
+
+    def at(self, time):
+        """
+        The kinematics of every object at a time, interpolated linearly
+        between the samples around it. Angles are interpolated the short way
+        round. Times outside the buffer are clamped to the oldest or newest
+        sample.
+
+        :return: Array of (x, y, angle, velocity) per object, or None if empty
+        """
+        if not self._count:
+            return None
+        slots = self._slots()
+        times = self.times[slots]
+        after = np.searchsorted(times, time)
+        if after == 0:
+            return self.states[slots[0]].copy()
+        if after == len(times):
+            return self.states[slots[-1]].copy()
+
+        t0, t1 = times[after - 1], times[after]
+        s0, s1 = self.states[slots[after - 1]], self.states[slots[after]]
+        fraction = (time - t0) / (t1 - t0) if t1 > t0 else 1.0
+        delta = s1 - s0
+        delta[:, ANGLE] = (delta[:, ANGLE] + np.pi) % (2 * np.pi) - np.pi
+        state = s0 + fraction * delta
+        state[:, ANGLE] %= 2 * np.pi
+        return state
+
+    def _fit(self, seconds, degree, columns):
+        """
+        Least squares polynomial fit of the given columns over the window.
+
+        :return: Coefficients of shape (degree + 1, n, len(columns)), highest
+        power first, or None if the window has too few samples
+        """
+        times, states = self.window(seconds)
+        if len(times) <= degree or times[-1] == times[0]:
+            return None
+        values = states[:, :, columns]
+        if ANGLE in columns:
+            index = columns.index(ANGLE)
+            values[:, :, index] = np.unwrap(values[:, :, index], axis=0)
+        count, objects = values.shape[:2]
+        coefficients = np.polyfit(times - times[-1],
+                                  values.reshape(count, -1), degree)
+        return coefficients.reshape(degree + 1, objects, len(columns))
+
+    def velocity(self, seconds):
+        """
+        Velocity (dx/dt, dy/dt) of every object over the last seconds.
+
+        :return: (n, 2) array, zero if there are fewer than two samples
+        """
+        fit = self._fit(seconds, 1, [X, Y])
+        return fit[0] if fit is not None else np.zeros((len(self.names), 2))
+
+    def acceleration(self, seconds):
+        """
+        Acceleration of every object over the last seconds, from a quadratic
+        fit of the positions.
+
+        :return: (n, 2) array, zero if there are fewer than three samples
+        """
+        fit = self._fit(seconds, 2, [X, Y])
+        return 2 * fit[0] if fit is not None else \
+            np.zeros((len(self.names), 2))
+
+    def angular_velocity(self, seconds):
+        """
+        Rate of change of the angle of every object over the last seconds,
+        in radians per second.
+        """
+        fit = self._fit(seconds, 1, [ANGLE])
+        return fit[0, :, 0] if fit is not None else np.zeros(len(self.names))
+
+    def angle_change(self, seconds):
+        """
+        Absolute change of the angle of every object between the latest
+        sample and seconds before it.
+        """
+        if not self._count:
+            return np.zeros(len(self.names))
+        now = self.latest()[:, ANGLE]
+        before = self.at(self.latest_time - seconds)[:, ANGLE]
+        return np.abs((now - before + np.pi) % (2 * np.pi) - np.pi)
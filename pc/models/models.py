@@ -1,7 +1,13 @@
 from Polygon.cPolygon import Polygon
 from math import cos, sin, hypot, pi, atan2
-from ..vision.tools import get_croppings
+from ..vision.tools import get_croppings, CACHE_PATH
 from collections import deque
+import hashlib
+import json
+import os
+import cv2
+import numpy as np
+import geometry
 
 # Width measures the front and back of an object
 # Length measures along the sides of an object
@@ -23,6 +29,17 @@ GOAL_LENGTH_CM = 1
 
 CM_PER_PX = 38.4 / 91
 
+# Seconds of history over which a robot counts as turning
+TURNING_WINDOW = 0.2
+# Speed in cm/s above which a robot counts as driving
+DRIVING_SPEED = 10
+
+ZONE_KEYS = ['Zone_0', 'Zone_1', 'Zone_2', 'Zone_3']
+# Label of points outside every zone in the zone label map
+NO_ZONE = 255
+# Directory of the rasterized zone label maps
+ZONE_MAP_CACHE = CACHE_PATH
+
 # In px
 ROBOT_WIDTH = ROBOT_WIDTH_CM / CM_PER_PX
 ROBOT_LENGTH = ROBOT_LENGTH_CM / CM_PER_PX
@@ -37,8 +54,31 @@ GOAL_HEIGHT = GOAL_HEIGHT_CM / CM_PER_PX
 GOAL_LENGTH = GOAL_LENGTH_CM / CM_PER_PX
 
 
+class CacheStats(object):
+    """
+    Hit and miss counters of a cache, for profiling.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return 'hits: %s, misses: %s' % (self.hits, self.misses)
+
+
+# Counters of the memoized object polygons and catcher areas
+GEOMETRY_CACHE_STATS = CacheStats()
+
+
 class Coordinate(object):
 
+    __slots__ = ('_x', '_y')
+
     def __init__(self, x, y):
         if x is None or y is None:
             raise ValueError('Can not initialize to attributes to None')
@@ -74,6 +114,8 @@ class Coordinate(object):
 
 class Vector(Coordinate):
 
+    __slots__ = ('_angle', '_velocity')
+
     def __init__(self, x, y, angle, velocity):
         super(Vector, self).__init__(x, y)
         if angle is None or velocity is None or angle < 0 or angle >= (2*pi):
@@ -82,6 +124,19 @@ class Vector(Coordinate):
             self._angle = angle
             self._velocity = velocity
 
+    @classmethod
+    def _unchecked(cls, x, y, angle, velocity):
+        """
+        Create a vector without validating the values. Only for per-frame
+        updates from values that are known to be valid.
+        """
+        vector = cls.__new__(cls)
+        vector._x = x
+        vector._y = y
+        vector._angle = angle
+        vector._velocity = velocity
+        return vector
+
     @property
     def angle(self):
         return self._angle
@@ -105,7 +160,12 @@ class Vector(Coordinate):
 
     def __eq__(self, other):
         return isinstance(other, self.__class__) \
-            and (self.__dict__ == other.__dict__)
+            and self._x == other._x and self._y == other._y \
+            and self._angle == other._angle \
+            and self._velocity == other._velocity
+
+    def __ne__(self, other):
+        return not self == other
 
     def __repr__(self):
         return ('x: %s, y: %s, angle: %s, velocity: %s\n' %
@@ -119,6 +179,11 @@ class PitchObject(object):
     Width measures the front and back of an object
     Length measures along the sides of an object
     """
+
+    __slots__ = ('_width', '_length', '_height', '_angle_offset', '_vector',
+                 '_catcher_area', '_polygon', '_catcher_polygon', '_corners',
+                 '_catcher_corners', '_state_kinematics', '_state_row')
+
     def __init__(self, x, y, angle, velocity, width,
                  length, height, angle_offset=0):
         if width < 0 or length < 0 or height < 0:
@@ -130,6 +195,29 @@ class PitchObject(object):
             self._angle_offset = angle_offset
             self._vector = Vector(x, y, angle, velocity)
             self._catcher_area = None
+            # Memoized geometry, cleared when the vector or catcher changes
+            self._polygon = None
+            self._catcher_polygon = None
+            self._corners = None
+            self._catcher_corners = None
+            # Row of the world state the vector is written through to
+            self._state_kinematics = None
+            self._state_row = None
+
+    def _bind_state(self, kinematics, row):
+        """
+        Write every later change of the vector through to a row of the
+        world state's kinematics array, so that the two never disagree.
+        """
+        self._state_kinematics = kinematics
+        self._state_row = row
+        self._write_state()
+
+    def _write_state(self):
+        if self._state_kinematics is not None:
+            vector = self._vector
+            self._state_kinematics[self._state_row] = \
+                (vector._x, vector._y, vector._angle, vector._velocity)
 
     @property
     def width(self):
@@ -173,14 +261,48 @@ class PitchObject(object):
             raise ValueError('The new vector can not be None and '
                              'must be an instance of a Vector')
         else:
-            self._vector = Vector(new_vector.x, new_vector.y,
-                                  new_vector.angle - self._angle_offset,
-                                  new_vector.velocity)
+            vector = Vector(new_vector.x, new_vector.y,
+                            new_vector.angle - self._angle_offset,
+                            new_vector.velocity)
+            self._invalidate_geometry(vector)
+            self._vector = vector
+            self._write_state()
+
+    def _set_vector_unchecked(self, x, y, angle, velocity):
+        """
+        Set the position without validating it. Only for per-frame updates
+        from values that are known to be valid, e.g. from postprocessing.
+        """
+        vector = Vector._unchecked(x, y, angle - self._angle_offset, velocity)
+        self._invalidate_geometry(vector)
+        self._vector = vector
+        self._write_state()
+
+    def _invalidate_geometry(self, new_vector):
+        """
+        Clear the memoized geometry if the new vector moves the object.
+        """
+        old = self._vector
+        if old._x != new_vector._x or old._y != new_vector._y \
+                or old._angle != new_vector._angle:
+            self._polygon = None
+            self._catcher_polygon = None
+            self._corners = None
+            self._catcher_corners = None
 
     def overlaps(self, poly):
         """
-        True if this object overlaps the given polygon
+        True if this object overlaps the given convex polygon
+
+        :param poly: Polygon or list of the polygon's vertices
         """
+        if geometry.USE_NUMPY:
+            if isinstance(poly, Polygon):
+                poly = poly[0]
+            return bool(geometry.overlaps(self.get_corners(),
+                                          geometry.order_convex(poly)))
+        if not isinstance(poly, Polygon):
+            poly = Polygon(poly)
         return self.get_polygon().overlaps(poly)
 
     def get_generic_polygon(self, width, length):
@@ -200,8 +322,27 @@ class PitchObject(object):
         """
         Returns 4 edges of a rectangle bounding the current object in the
         following order: front left, front right, bottom left and bottom right.
+
+        The polygon is memoized until the object moves, so it must not be
+        modified by the caller.
+        """
+        if self._polygon is None:
+            GEOMETRY_CACHE_STATS.misses += 1
+            self._polygon = self.get_generic_polygon(self.width, self.length)
+        else:
+            GEOMETRY_CACHE_STATS.hits += 1
+        return self._polygon
+
+    def get_corners(self):
         """
-        return self.get_generic_polygon(self.width, self.length)
+        Corners of the rectangle bounding the current object as a numpy array,
+        in the order front left, front right, back right, back left.
+        Memoized like get_polygon.
+        """
+        if self._corners is None:
+            self._corners = geometry.rectangle(self.x, self.y, self.angle,
+                                               self.width, self.length)
+        return self._corners
 
     def __repr__(self):
         return ('x: %s\ny: %s\nangle: %s\nvelocity: %s\ndimensions: %s\n' %
@@ -212,13 +353,14 @@ class PitchObject(object):
 
 class Robot(PitchObject):
 
+    __slots__ = ('_zone', '_world')
+
     def __init__(self, zone, x, y, angle, velocity, world, width=ROBOT_WIDTH,
                  length=ROBOT_LENGTH, height=ROBOT_HEIGHT, angle_offset=0):
         super(Robot, self).__init__(x, y, angle, velocity, width, length,
                                     height, angle_offset)
         self._zone = zone
         self._world = world
-        self.last_angle = self.angle
 
     @property
     def zone(self):
@@ -226,6 +368,16 @@ class Robot(PitchObject):
 
     @property
     def catcher_area(self):
+        """
+        Polygon of the area in front of the robot in which it can catch the
+        ball. Memoized until the robot moves or the area definition changes,
+        so it must not be modified by the caller.
+        """
+        if self._catcher_polygon is not None:
+            GEOMETRY_CACHE_STATS.hits += 1
+            return self._catcher_polygon
+        GEOMETRY_CACHE_STATS.misses += 1
+
         front_left = (self.x + self._catcher_area['front_offset'] +
                       self._catcher_area['height'],
                       self.y + self._catcher_area['width']/2.0)
@@ -243,11 +395,38 @@ class Robot(PitchObject):
         area = Polygon((front_left, front_right, back_left, back_right))
         area.rotate(self.angle, self.x, self.y)
 
+        self._catcher_polygon = area
         return area
 
     @catcher_area.setter
     def catcher_area(self, area_dict):
-        self._catcher_area = area_dict
+        if area_dict != self._catcher_area:
+            self._catcher_area = area_dict
+            self._catcher_polygon = None
+            self._catcher_corners = None
+
+    def get_catcher_corners(self):
+        """
+        Corners of the catcher area as a numpy array, memoized like
+        catcher_area.
+        """
+        if self._catcher_corners is None:
+            area = self._catcher_area
+            centre = self.x + area['front_offset'] + area['height'] / 2.0
+            corners = geometry.rectangle(centre, self.y, 0,
+                                         area['width'], area['height'])
+            self._catcher_corners = geometry.rotate(corners, self.angle,
+                                                    self.x, self.y)
+        return self._catcher_corners
+
+    def can_catch(self, x, y):
+        """
+        True if the point is inside the catcher area.
+        """
+        if geometry.USE_NUMPY:
+            return bool(geometry.point_in_convex(self.get_catcher_corners(),
+                                                 (x, y)))
+        return self.catcher_area.isInside(x, y)
 
     def rotation_to_point(self, x, y):
         """
@@ -287,26 +466,17 @@ class Robot(PitchObject):
         y = target y-pos
         top = pass via bottom wall or top wall (true = top)
         """
-        zone_height = self._world._pitch._zones[self._zone].center()[1]*2
-        (_, y_mirror) = self.target_via_wall(x, y, zone_height, top)
+        (_, y_mirror) = self.target_via_wall(x, y, top)
         return self.rotation_to_point(x, y_mirror)
 
     def target_via_wall(self, x, y, top=True):
         """
         Given a target, return the point at which we should shoot
-        to have the ball bounce and reach the target.
+        to have the ball bounce and reach the target. This is the target
+        mirrored across the top or bottom wall.
         """
-        margin_bottom = 31 # assume magic 20 pixels on bottom of pitch
-        zone_height = self._world._pitch._zones[self._zone].center()[1]*2
-
-        if top:
-            y_mirror = y + 2*(zone_height - 1.5*margin_bottom - y)
-        else:
-            y_mirror = -y + (margin_bottom*3)
-
-        print "top:"+str(top)+"; y_mirror:"+str(y_mirror)
-
-        return x, y_mirror
+        x_mirror, y_mirror = self._world.raycaster.mirror((x, y), top)
+        return x_mirror, y_mirror
 
     def dist_from_grabber_to_point(self, x, y):
         """
@@ -331,16 +501,6 @@ class Robot(PitchObject):
         displacement = hypot(delta_x, delta_y) * CM_PER_PX  # To CM
         return displacement
 
-    def pass_path(self, target):
-        """
-        Gets a path represented by a Polygon for the area for passing ball
-        between two robots
-        """
-        robot_poly = self.get_polygon()[0]
-        target_poly = target.get_polygon()[0]
-        return Polygon((robot_poly[0], robot_poly[1],
-                        target_poly[0], target_poly[1]))
-
     def is_facing_point(self, x, y, rad_thresh=0.1, backward=False):
         """
         True if the robot is facing a given point given some threshold.
@@ -358,17 +518,21 @@ class Robot(PitchObject):
         """
         return self.displacement_to_point(x, y) < cm_threshold
 
-    def is_turning(self):
-        test = not self.is_facing_angle(self.last_angle)
-        self.last_angle = self.angle
-        return test
+    def is_turning(self, seconds=TURNING_WINDOW, threshold=0.1):
+        """
+        True if the robot's angle changed by more than threshold radians over
+        the last seconds of the world history.
+        """
+        if self._world is None:
+            return False
+        return self._world.get_angle_change(self, seconds) > threshold
 
     def is_driving(self):
         """
-        Assume the robot is driving if velocity > 1 or velocity < -1.
+        Assume the robot is driving if its speed is above DRIVING_SPEED cm/s.
         This also accounts for _most_ turning cases.
         """
-        return self.velocity > 1 or self.velocity < -1
+        return abs(self.velocity) > DRIVING_SPEED
 
     def is_moving(self):
         return self.is_turning() or self.is_driving()
@@ -391,6 +555,8 @@ class Robot(PitchObject):
 
 class Ball(PitchObject):
 
+    __slots__ = ()
+
     def __init__(self, x, y, angle, velocity):
         super(Ball, self).__init__(x, y, angle, velocity,
                                    BALL_WIDTH, BALL_LENGTH, BALL_HEIGHT)
@@ -398,6 +564,8 @@ class Ball(PitchObject):
 
 class Goal(PitchObject):
 
+    __slots__ = ('_zone',)
+
     def __init__(self, zone, x, y, angle):
         super(Goal, self).__init__(x, y, angle, 0, GOAL_WIDTH,
                                    GOAL_LENGTH, GOAL_HEIGHT)
@@ -417,6 +585,11 @@ class Goal(PitchObject):
 class Pitch(object):
     """
     Describe the pitch given the table setup results.
+
+    Besides the zone polygons, the zones are rasterized into a label map with
+    the index of the zone at each pixel, so that zone membership of any number
+    of points is a single array lookup. The map is cached on disk, keyed by
+    the cropping data it was built from.
     """
     def __init__(self, pitch_num):
         config_json = get_croppings(pitch=pitch_num)
@@ -442,12 +615,91 @@ class Pitch(object):
             Polygon([(x, self._height - y)
                      for (x, y) in config_json['Zone_3']]))
 
+        self._zone_map = self.get_zone_map(config_json)
+        # Nested lists are faster than the array for single lookups
+        self._zone_rows = self._zone_map.tolist()
+
+    def get_zone_map(self, config_json):
+        """
+        Load the zone label map for the croppings from the cache, or
+        rasterize and cache it if the croppings have changed.
+
+        :return: uint8 array indexed by [y, x] in model coordinates
+        """
+        key = hashlib.md5(json.dumps(
+            [self._width, self._height] +
+            [config_json[zone] for zone in ZONE_KEYS])).hexdigest()
+        filename = os.path.join(ZONE_MAP_CACHE, 'zones_%s.npy' % key)
+        if os.path.exists(filename):
+            return np.load(filename)
+
+        zone_map = self.rasterize_zones(config_json)
+        try:
+            if not os.path.isdir(ZONE_MAP_CACHE):
+                os.makedirs(ZONE_MAP_CACHE)
+            np.save(filename, zone_map)
+        except (IOError, OSError):
+            print 'Could not cache the zone map in %s' % ZONE_MAP_CACHE
+        return zone_map
+
+    def rasterize_zones(self, config_json):
+        """
+        Draw every zone polygon into a label map covering the pitch and the
+        zones, with NO_ZONE outside of them.
+        """
+        zones = [[(x, self._height - y) for (x, y) in config_json[zone]]
+                 for zone in ZONE_KEYS]
+        width = max([self._width] + [x for zone in zones for x, _ in zone])
+        height = max([self._height] + [y for zone in zones for _, y in zone])
+
+        zone_map = np.empty((int(height) + 1, int(width) + 1), np.uint8)
+        zone_map.fill(NO_ZONE)
+        for label, zone in enumerate(zones):
+            cv2.fillPoly(zone_map, [np.array(zone, np.int32)], label)
+        return zone_map
+
+    def zone_of(self, points):
+        """
+        Get the zones of several points at once.
+
+        :param points: Array-like of (x, y) points in model coordinates
+        :return: Array of zone indices, -1 for points outside every zone
+        """
+        points = np.rint(np.asarray(points, dtype=float).reshape(-1, 2))
+        height, width = self._zone_map.shape
+        xs, ys = points[:, 0], points[:, 1]
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+
+        zones = np.empty(len(points), np.int16)
+        zones.fill(-1)
+        labels = self._zone_map[ys[inside].astype(int), xs[inside].astype(int)]
+        zones[inside] = np.where(labels == NO_ZONE, -1, labels)
+        return zones
+
+    def zone_at(self, x, y):
+        """
+        Get the zone of a single point.
+
+        :return: Zone index, or None if the point is in no zone
+        """
+        x, y = int(round(x)), int(round(y))
+        if x < 0 or y < 0:
+            return None
+        try:
+            label = self._zone_rows[y][x]
+        except IndexError:
+            return None
+        return None if label == NO_ZONE else label
+
     def is_within_bounds(self, robot, x, y):
         """
         Checks whether the position/point planned for the robot is reachable
         """
-        zone = self._zones[robot.zone]
-        return zone.isInside(x, y)
+        return self.zone_at(x, y) == robot.zone
+
+    @property
+    def zone_map(self):
+        return self._zone_map
 
     @property
     def width(self):
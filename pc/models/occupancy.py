@@ -0,0 +1,185 @@
+from math import cos, sin, hypot
+import numpy as np
+
+# Size of a grid cell in px
+CELL_SIZE = 8
+# Width in px of the band around an obstacle in which the cost falls off
+CLEARANCE = 20
+# Cost of a cell under an inflated obstacle, and the highest cost of a cell
+# in the clearance band around it
+OCCUPIED_COST = 1000
+CLEARANCE_COST = 100
+# Movement below which an obstacle is not stamped again
+MOVE_TOLERANCE = 1.0
+ANGLE_TOLERANCE = 0.02
+
+
+class OccupancyGrid(object):
+    """
+    Coarse cost grid over the pitch, indexed by [row, column] = [y, x] / cell.
+
+    Every obstacle stamps its footprint, inflated by the radius of the robot
+    that plans through the grid, as OCCUPIED_COST, surrounded by a band of
+    cost falling off from CLEARANCE_COST to zero. Stamps are summed, so when
+    an obstacle moves only the cells under its old and new stamps are
+    touched: the old stamp is subtracted and the new one added. Each cell also
+    holds the zone its centre is in.
+    """
+
+    def __init__(self, pitch, inflation, cell=CELL_SIZE, clearance=CLEARANCE):
+        """
+        :param pitch: Pitch to cover
+        :param inflation: Radius in px by which obstacles are inflated
+        :param cell: Size of a cell in px
+        :param clearance: Width in px of the cost band around obstacles
+        """
+        self.cell = cell
+        self.inflation = inflation
+        self.clearance = clearance
+        self.rows = int(np.ceil(pitch.height / float(cell)))
+        self.cols = int(np.ceil(pitch.width / float(cell)))
+        self.cost = np.zeros((self.rows, self.cols), np.int32)
+
+        centres = (np.indices((self.rows, self.cols))[::-1] + 0.5) * cell
+        self.zones = pitch.zone_of(centres.reshape(2, -1).T) \
+            .reshape(self.rows, self.cols)
+
+        self._stamps = {}   # name -> (pose, (window, stamp))
+
+    def cell_of(self, x, y):
+        return int(y // self.cell), int(x // self.cell)
+
+    def _inside(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def _make_stamp(self, x, y, angle, width, length):
+        """
+        Rasterize the inflated footprint of an obstacle.
+
+        :return: (window, stamp) - the slices of the grid covered and the cost
+        of each cell in the window, or None if the obstacle is off the grid
+        """
+        reach = hypot(width, length) / 2.0 + self.inflation + self.clearance
+        r0 = max(int((y - reach) // self.cell), 0)
+        r1 = min(int((y + reach) // self.cell) + 1, self.rows)
+        c0 = max(int((x - reach) // self.cell), 0)
+        c1 = min(int((x + reach) // self.cell) + 1, self.cols)
+        if r0 >= r1 or c0 >= c1:
+            return None
+
+        dx = (np.arange(c0, c1) + 0.5) * self.cell - x
+        dy = (np.arange(r0, r1) + 0.5) * self.cell - y
+        c, s = cos(angle), sin(angle)
+        # Distance from each cell centre to the footprint rectangle, in the
+        # obstacle's frame
+        along = np.abs(np.add.outer(dy * s, dx * c)) - length / 2.0
+        across = np.abs(np.subtract.outer(dy * c, dx * s)) - width / 2.0
+        np.maximum(along, 0, along)
+        np.maximum(across, 0, across)
+        distance = np.hypot(along, across)
+
+        occupied = distance <= self.inflation
+        # Cost falling off linearly across the clearance band
+        stamp = distance
+        stamp -= self.inflation + self.clearance
+        stamp *= -float(CLEARANCE_COST) / self.clearance
+        np.clip(stamp, 0, CLEARANCE_COST, stamp)
+        stamp = stamp.astype(np.int32)
+        stamp[occupied] = OCCUPIED_COST
+        return (slice(r0, r1), slice(c0, c1)), stamp
+
+    def _apply(self, stamped, sign):
+        if stamped is None:
+            return
+        window, stamp = stamped
+        self.cost[window] += sign * stamp
+
+    def update(self, name, obj):
+        """
+        Move an obstacle to the current pose of a pitch object, restamping
+        only if it has moved noticeably since it was last stamped.
+        """
+        pose = (obj.x, obj.y, obj.angle)
+        previous = self._stamps.get(name)
+        if previous is not None:
+            x, y, angle = previous[0]
+            if abs(pose[0] - x) < MOVE_TOLERANCE and \
+                    abs(pose[1] - y) < MOVE_TOLERANCE and \
+                    abs(pose[2] - angle) < ANGLE_TOLERANCE:
+                return
+            self._apply(previous[1], -1)
+
+        stamped = self._make_stamp(obj.x, obj.y, obj.angle, obj.width,
+                                   obj.length)
+        self._apply(stamped, 1)
+        self._stamps[name] = (pose, stamped)
+
+    def remove(self, name):
+        previous = self._stamps.pop(name, None)
+        if previous is not None:
+            self._apply(previous[1], -1)
+
+    def get_costs(self, exclude=()):
+        """
+        The cost grid without the named obstacles, e.g. the planning robot
+        itself. The grid itself is returned when nothing is excluded, so it
+        must not be modified.
+        """
+        if not exclude:
+            return self.cost
+        cost = self.cost.copy()
+        for name in exclude:
+            stamped = self._stamps.get(name, (None, None))[1]
+            if stamped is not None:
+                cost[stamped[0]] -= stamped[1]
+        return cost
+
+    def _excluded_cost(self, row, col, exclude):
+        cost = 0
+        for name in exclude:
+            stamped = self._stamps.get(name, (None, None))[1]
+            if stamped is None:
+                continue
+            (rows, cols), stamp = stamped
+            if rows.start <= row < rows.stop and cols.start <= col < cols.stop:
+                cost += stamp[row - rows.start, col - cols.start]
+        return cost
+
+    def cost_at(self, x, y, exclude=()):
+        """
+        Cost of the cell containing a point, None if it is off the grid.
+        """
+        row, col = self.cell_of(x, y)
+        if not self._inside(row, col):
+            return None
+        return int(self.cost[row, col]) - self._excluded_cost(row, col,
+                                                              exclude)
+
+    def costs(self, points, exclude=()):
+        """
+        Costs of the cells containing each of several points, OCCUPIED_COST
+        for points off the grid.
+
+        :param points: Array-like of (x, y) points
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        rows = (points[:, 1] // self.cell).astype(int)
+        cols = (points[:, 0] // self.cell).astype(int)
+        inside = (rows >= 0) & (rows < self.rows) & \
+            (cols >= 0) & (cols < self.cols)
+        costs = np.empty(len(points), np.int32)
+        costs.fill(OCCUPIED_COST)
+        costs[inside] = self.get_costs(exclude)[rows[inside], cols[inside]]
+        return costs
+
+    def is_free(self, x, y, zone=None, exclude=()):
+        """
+        True if the point is not under an inflated obstacle and, if a zone is
+        given, inside that zone.
+        """
+        row, col = self.cell_of(x, y)
+        if not self._inside(row, col):
+            return False
+        if zone is not None and self.zones[row, col] != zone:
+            return False
+        return self.cost_at(x, y, exclude) < OCCUPIED_COST
@@ -1,25 +1,42 @@
-from models import Vector
-from copy import deepcopy
+from models import Vector, CM_PER_PX
 from math import atan2, pi, hypot
+import time
+
+# Weight of the previous velocity in the exponential smoothing of velocities
+VELOCITY_SMOOTHING = 0.5
 
 
 class Postprocessing(object):
+    """
+    Estimates the angle of motion and velocity of each object from its
+    previous sighting. Velocities are in cm/s, measured against the capture
+    timestamps of the frames, so they do not depend on the frame rate.
+    """
 
-    def __init__(self):
+    def __init__(self, smoothing=VELOCITY_SMOOTHING):
+        """
+        :param smoothing: Weight in [0, 1) of the previous velocity when
+        smoothing a new measurement, 0 for no smoothing
+        """
+        assert 0 <= smoothing < 1
+        self.smoothing = smoothing
         self._vectors = {
-            'ball': {'vec': Vector(0, 0, 0, 0), 'time': 0},
-            'our_attacker': {'vec': Vector(0, 0, 0, 0), 'time': 0},
-            'their_attacker': {'vec': Vector(0, 0, 0, 0), 'time': 0},
-            'our_defender': {'vec': Vector(0, 0, 0, 0), 'time': 0},
-            'their_defender': {'vec': Vector(0, 0, 0, 0), 'time': 0}
+            'ball': {'vec': Vector(0, 0, 0, 0), 'time': None},
+            'our_attacker': {'vec': Vector(0, 0, 0, 0), 'time': None},
+            'their_attacker': {'vec': Vector(0, 0, 0, 0), 'time': None},
+            'our_defender': {'vec': Vector(0, 0, 0, 0), 'time': None},
+            'their_defender': {'vec': Vector(0, 0, 0, 0), 'time': None}
         }
-        self._time = 0
+        self._time = None
 
-    def analyze(self, vector_dict):
+    def analyze(self, vector_dict, timestamp=None):
         """
         This method analyzes current positions and previous object vector.
+
+        :param timestamp: Capture time of the frame in seconds, defaults to
+        now
         """
-        self._time += 1
+        self._time = time.time() if timestamp is None else timestamp
         new_vector_dict = {}
         for name, info in vector_dict.iteritems():
             if name == 'ball':
@@ -28,6 +45,21 @@ class Postprocessing(object):
                 new_vector_dict[name] = self.analyze_robot(name, info)
         return new_vector_dict
 
+    def get_velocity(self, key, distance):
+        """
+        Smoothed velocity in cm/s of an object that moved distance pixels
+        since it was last seen.
+        """
+        previous = self._vectors[key]
+        if previous['time'] is None:
+            return 0
+        elapsed = self._time - previous['time']
+        if elapsed <= 0:
+            return previous['vec'].velocity
+        velocity = distance * CM_PER_PX / elapsed
+        return self.smoothing * previous['vec'].velocity + \
+            (1 - self.smoothing) * velocity
+
     def analyze_ball(self, info):
         """
         This method calculates the angle and the velocity of the ball.
@@ -35,13 +67,13 @@ class Postprocessing(object):
         if not(info['x'] is None) and not (info['y'] is None):
             delta_x = info['x'] - self._vectors['ball']['vec'].x
             delta_y = info['y'] - self._vectors['ball']['vec'].y
-            velocity = hypot(delta_y, delta_x)/(self._time - self._vectors['ball']['time'])
+            velocity = self.get_velocity('ball', hypot(delta_y, delta_x))
             angle = atan2(delta_y, delta_x) % (2*pi)
-            self._vectors['ball']['vec'] = Vector(info['x'], info['y'], angle, velocity)
+            self._vectors['ball']['vec'] = Vector._unchecked(info['x'], info['y'], angle, velocity)
             self._vectors['ball']['time'] = self._time
-            return Vector(int(info['x']), int(info['y']), angle, velocity)
+            return Vector._unchecked(int(info['x']), int(info['y']), angle, velocity)
         else:
-            return deepcopy(self._vectors['ball']['vec'])
+            return self.copy_vector(self._vectors['ball']['vec'])
 
     def analyze_robot(self, key, info):
         """
@@ -59,14 +91,22 @@ class Postprocessing(object):
             # Offset the angle if negative, we only want positive values
             delta_angle = delta_angle if delta_angle > 0 else 2 * pi + delta_angle
 
-            velocity = hypot(delta_y, delta_x)/(self._time - self._vectors[key]['time'])
+            speed = hypot(delta_y, delta_x)
 
             # Make the velocity negative if the angles are not roughly the same
             if not (-pi / 2 < abs(delta_angle - robot_angle) < pi / 2):
-                velocity = -velocity
+                speed = -speed
+            velocity = self.get_velocity(key, speed)
 
-            self._vectors[key]['vec'] = Vector(info['x'], info['y'], info['angle'], velocity)
+            self._vectors[key]['vec'] = Vector._unchecked(info['x'], info['y'], info['angle'], velocity)
             self._vectors[key]['time'] = self._time
-            return Vector(info['x'], info['y'], info['angle'], velocity)
+            return Vector._unchecked(info['x'], info['y'], info['angle'], velocity)
         else:
-            return deepcopy(self._vectors[key]['vec'])
\ No newline at end of file
+            return self.copy_vector(self._vectors[key]['vec'])
+
+    def copy_vector(self, vector):
+        """
+        Copy of a previously analyzed vector.
+        """
+        return Vector._unchecked(vector.x, vector.y, vector.angle,
+                                 vector.velocity)
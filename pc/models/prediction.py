@@ -0,0 +1,120 @@
+from math import cos, sin, log
+import numpy as np
+
+from models import CM_PER_PX, BALL_WIDTH
+
+# Default decay rate (1/s) of the ball's speed from rolling friction
+ROLLING_FRICTION = 0.0
+
+
+class BallPredictor(object):
+    """
+    Closed form prediction of the ball's path across the pitch.
+
+    The ball moves in a straight line from its current position and direction
+    and is reflected off the top and bottom walls. With rolling friction k its
+    speed decays as v(t) = v0 * exp(-k t), so it travels
+    v0 * (1 - exp(-k t)) / k in time t, which is v0 * t without friction.
+    Reflections are handled by moving the ball on an unfolded pitch and
+    folding its y coordinate back, so any time can be evaluated directly.
+
+    Positions are in model coordinates (px) and times in seconds. The ball's
+    velocity is taken in cm/s, as given by postprocessing. The left and right
+    ends are not walls, a ball past them has left the pitch.
+    """
+
+    def __init__(self, pitch, friction=ROLLING_FRICTION, radius=BALL_WIDTH/2):
+        """
+        :param pitch: Pitch whose top and bottom walls reflect the ball
+        :param friction: Decay rate k of the ball's speed, 0 for none
+        :param radius: Ball radius, keeping its centre off the walls
+        """
+        self.friction = friction
+        self.bottom = radius
+        self.top = pitch.height - radius
+
+    def _travel(self, times):
+        """
+        Distance travelled per unit of initial speed after the given times.
+        """
+        if self.friction > 0:
+            return (1 - np.exp(-self.friction * times)) / self.friction
+        return times
+
+    def _fold(self, y):
+        """
+        Fold y on the unfolded pitch back between the walls.
+
+        :return: (y, direction) - direction is -1 where the ball has been
+        reflected an odd number of times
+        """
+        height = self.top - self.bottom
+        phase = np.mod(y - self.bottom, 2 * height)
+        reflected = phase > height
+        return (self.bottom + np.where(reflected, 2 * height - phase, phase),
+                np.where(reflected, -1, 1))
+
+    def _components(self, ball):
+        speed = ball.velocity / CM_PER_PX
+        return speed * cos(ball.angle), speed * sin(ball.angle)
+
+    def path(self, ball, times):
+        """
+        Positions of the ball at the given times from now.
+
+        :param ball: Ball model
+        :param times: Array of times in seconds
+        :return: (n, 2) array of (x, y)
+        """
+        times = np.asarray(times, dtype=float)
+        vx, vy = self._components(ball)
+        travel = self._travel(times)
+        y, _ = self._fold(ball.y + vy * travel)
+        return np.column_stack((ball.x + vx * travel, y))
+
+    def velocities(self, ball, times):
+        """
+        Velocities of the ball (px/s) at the given times from now.
+
+        :return: (n, 2) array of (vx, vy)
+        """
+        times = np.asarray(times, dtype=float)
+        vx, vy = self._components(ball)
+        decay = np.exp(-self.friction * times)
+        _, direction = self._fold(ball.y + vy * self._travel(times))
+        return np.column_stack((vx * decay, vy * decay * direction))
+
+    def crossing(self, ball, x):
+        """
+        When and where the ball crosses the vertical line at x.
+
+        :return: (time, y) or None if the ball is not heading towards x or
+        stops before reaching it
+        """
+        vx, vy = self._components(ball)
+        if vx == 0:
+            return None
+        travel = (x - ball.x) / vx
+        if travel < 0:
+            return None
+        if self.friction > 0:
+            if self.friction * travel >= 1:
+                return None
+            time = -log(1 - self.friction * travel) / self.friction
+        else:
+            time = travel
+
+        y = ball.y + vy * travel
+        height = self.top - self.bottom
+        phase = (y - self.bottom) % (2 * height)
+        if phase > height:
+            phase = 2 * height - phase
+        return time, self.bottom + phase
+
+    def stopping_point(self, ball):
+        """
+        Where the ball comes to rest under friction, or None without friction.
+        """
+        if self.friction <= 0:
+            return None
+        return self.path(ball, [np.inf])[0]
@@ -0,0 +1,109 @@
+import numpy as np
+
+import geometry
+from models import BALL_WIDTH
+
+
+class Raycaster(object):
+    """
+    Line of sight tests over the pitch walls and robot footprints.
+
+    A shot or pass from A to B is a corridor: the rectangle swept by a ball of
+    the given width moving from A to B, or the segment itself for width 0.
+    It is clear if it overlaps none of the obstacles, which are convex
+    footprints such as PitchObject.get_corners. Every test is batched over
+    many (A, B) pairs and obstacles at once.
+
+    The top and bottom walls are horizontal lines at the extent of the zones.
+    A single reflection off one of them is found by mirroring the target
+    across the wall (taking the ball's radius off the wall), so the ball is
+    aimed at the mirrored target and bounces at the point where that line
+    meets the wall.
+    """
+
+    def __init__(self, pitch, radius=BALL_WIDTH/2):
+        """
+        :param pitch: Pitch whose zones give the walls
+        :param radius: Distance of the ball's centre from a wall at a bounce
+        """
+        ys = [y for zone in pitch.zones for _, y in zone[0]]
+        self.bottom = min(ys) + radius
+        self.top = max(ys) - radius
+
+    def corridors(self, starts, ends, width=0):
+        """
+        Rectangles swept by a ball of the given width from starts to ends.
+
+        :param starts: (2,) or (m, 2) points
+        :param ends: (2,) or (m, 2) points
+        :return: (m, 4, 2) corner arrays
+        """
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+        starts, ends = np.broadcast_arrays(starts, ends)
+        direction = ends - starts
+        length = np.hypot(direction[:, 0], direction[:, 1])[:, None]
+        normal = np.column_stack((-direction[:, 1], direction[:, 0])) / \
+            np.where(length > 0, length, 1) * (width / 2.0)
+        return np.stack((starts + normal, ends + normal,
+                         ends - normal, starts - normal), axis=1)
+
+    def clear(self, starts, ends, obstacles, width=0):
+        """
+        Whether the corridors from starts to ends miss every obstacle.
+
+        :param obstacles: (n, k, 2) convex obstacles, or an empty list
+        :return: (m,) boolean array, or a bool for a single corridor
+        """
+        single = np.ndim(starts) == 1 and np.ndim(ends) == 1
+        corridors = self.corridors(starts, ends, width)
+        if len(obstacles):
+            clear = ~geometry.overlaps(corridors, obstacles).any(axis=1)
+        else:
+            clear = np.ones(len(corridors), bool)
+        return bool(clear[0]) if single else clear
+
+    def mirror(self, points, top=True):
+        """
+        Mirror points across the top or bottom wall.
+        """
+        points = np.array(points, dtype=float)
+        wall = self.top if top else self.bottom
+        points[..., 1] = 2 * wall - points[..., 1]
+        return points
+
+    def bounce_points(self, starts, ends, top=True):
+        """
+        Where a ball from starts bouncing once off a wall to ends hits the
+        wall.
+
+        :return: (m, 2) array, or (2,) for a single pair
+        """
+        single = np.ndim(starts) == 1 and np.ndim(ends) == 1
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        mirrored = self.mirror(np.asarray(ends, dtype=float).reshape(-1, 2),
+                               top)
+        wall = self.top if top else self.bottom
+        dy = mirrored[:, 1] - starts[:, 1]
+        fraction = (wall - starts[:, 1]) / np.where(dy != 0, dy, np.inf)
+        xs = starts[:, 0] + fraction * (mirrored[:, 0] - starts[:, 0])
+        points = np.column_stack((xs, np.full(len(xs), wall)))
+        return points[0] if single else points
+
+    def bounce_clear(self, starts, ends, obstacles, top=True, width=0):
+        """
+        Whether the corridors bouncing once off a wall from starts to ends
+        miss every obstacle, on both legs.
+
+        :return: (clear, bounce points) - as for clear and bounce_points
+        """
+        single = np.ndim(starts) == 1 and np.ndim(ends) == 1
+        bounces = self.bounce_points(np.asarray(starts).reshape(-1, 2),
+                                     np.asarray(ends).reshape(-1, 2), top)
+        clear = self.clear(np.asarray(starts).reshape(-1, 2), bounces,
+                           obstacles, width) & \
+            self.clear(bounces, np.asarray(ends).reshape(-1, 2), obstacles,
+                       width)
+        if single:
+            return bool(clear[0]), bounces[0]
+        return clear, bounces
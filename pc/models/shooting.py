@@ -0,0 +1,158 @@
+import time
+import numpy as np
+
+from models import BALL_WIDTH
+
+# Standard deviation in radians of the heading the robot shoots along
+HEADING_NOISE = 0.05
+# Aim points sampled along the goal mouth for each kind of shot
+AIM_SAMPLES = 32
+# Heading errors each aim point is scored over
+NOISE_SAMPLES = 16
+# Time limit in seconds of a selection
+SHOT_BUDGET = 0.005
+# Aim points scored at once
+CHUNK = 24
+
+
+def _spread_order(count):
+    """
+    Indices 0..count-1 ordered coarse to fine (bit reversal), so that any
+    prefix covers the range evenly.
+    """
+    bits = max(int(np.ceil(np.log2(max(count, 2)))), 1)
+    reversed_ = [int(format(i, '0%db' % bits)[::-1], 2) for i in range(count)]
+    return [i for _, i in sorted(zip(reversed_, range(count)))]
+
+
+class ShotSelector(object):
+    """
+    Monte Carlo selection of where to aim a shot at their goal.
+
+    Aim points are sampled along the goal mouth for straight shots and for
+    single bounces off the top and bottom walls, where the robot aims at the
+    point mirrored across the wall. Each aim point is scored against a fixed
+    set of heading errors drawn from a normal distribution: the ball is sent
+    along each perturbed heading, folded back off the walls, and counts as a
+    goal if it meets the goal line within the mouth, with at most one bounce,
+    and its corridor misses every obstacle. The success probability of an
+    aim point is the fraction of heading errors that score.
+
+    Aim points are scored in vectorized chunks, coarse to fine across all
+    kinds of shot, until the time budget runs out.
+    """
+
+    def __init__(self, raycaster, heading_noise=HEADING_NOISE,
+                 samples=AIM_SAMPLES, noise_samples=NOISE_SAMPLES,
+                 budget=SHOT_BUDGET, seed=0):
+        """
+        :param raycaster: Raycaster giving the walls and corridor tests
+        :param heading_noise: Standard deviation of the heading error
+        :param samples: Aim points per kind of shot
+        :param noise_samples: Heading errors per aim point
+        :param budget: Time limit of a selection in seconds
+        :param seed: Seed of the heading errors, fixed so that the choice
+        does not flicker between ticks
+        """
+        self.raycaster = raycaster
+        self.samples = samples
+        self.budget = budget
+        self.errors = np.random.RandomState(seed).normal(
+            0, heading_noise, noise_samples)
+        self._order = _spread_order(samples)
+        self.last_selection = None
+
+    def aim_points(self, goal):
+        """
+        Aim points of straight, top bounce and bottom bounce shots.
+
+        :return: (3 * samples, 2) array, interleaved coarse to fine
+        """
+        half = goal.width / 2.0 - BALL_WIDTH
+        ys = goal.y + np.linspace(-half, half, self.samples)[self._order]
+        targets = np.column_stack((np.full(self.samples, goal.x), ys))
+        kinds = [targets, self.raycaster.mirror(targets, True),
+                 self.raycaster.mirror(targets, False)]
+        return np.stack(kinds, axis=1).reshape(-1, 2)
+
+    def score(self, start, aims, goal, obstacles):
+        """
+        Probability of scoring from start when aiming at each point.
+
+        :param start: (x, y) the ball is kicked from
+        :param aims: (n, 2) aim points
+        :param goal: Goal shot at
+        :param obstacles: (k, m, 2) obstacle corners
+        :return: (n,) array of probabilities
+        """
+        aims = np.asarray(aims, dtype=float)
+        dx = aims[:, 0] - start[0]
+        headings = np.arctan2(aims[:, 1] - start[1], dx)[:, None] + \
+            self.errors
+        # Where each perturbed shot meets the goal line on the unfolded pitch
+        with np.errstate(invalid='ignore', divide='ignore'):
+            unfolded = start[1] + np.tan(headings) * dx[:, None]
+        forward = np.cos(headings) * dx[:, None] > 0
+
+        bottom, top = self.raycaster.bottom, self.raycaster.top
+        height = top - bottom
+        phase = np.floor((unfolded - bottom) / height)
+        bounces = np.abs(phase)
+        landing = np.where(phase == 1, 2 * top - unfolded,
+                           np.where(phase == -1, 2 * bottom - unfolded,
+                                    unfolded))
+        in_mouth = np.abs(landing - goal.y) <= goal.width / 2.0 - \
+            BALL_WIDTH / 2.0
+        valid = forward & (bounces <= 1) & in_mouth
+
+        # Bounce points, the landing point itself for straight shots
+        wall = np.where(phase > 0, top, bottom)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = (wall - start[1]) / (unfolded - start[1])
+        bounce_x = np.where(bounces == 1, start[0] + fraction * dx[:, None],
+                            goal.x)
+        bounce_y = np.where(bounces == 1, wall, landing)
+
+        ends = np.stack((np.broadcast_to(goal.x, landing.shape), landing),
+                        axis=-1).reshape(-1, 2)
+        middles = np.stack((bounce_x, bounce_y), axis=-1).reshape(-1, 2)
+        candidates = valid.ravel()
+        clear = np.zeros(len(ends), bool)
+        if candidates.any():
+            middles, ends = middles[candidates], ends[candidates]
+            clear_legs = self.raycaster.clear(
+                np.broadcast_to(start, middles.shape), middles, obstacles,
+                BALL_WIDTH)
+            bounced = bounces.ravel()[candidates] == 1
+            if bounced.any():
+                clear_legs[bounced] &= self.raycaster.clear(
+                    middles[bounced], ends[bounced], obstacles, BALL_WIDTH)
+            clear[candidates] = clear_legs
+        return clear.reshape(valid.shape).mean(axis=1)
+
+    def select(self, start, goal, obstacles):
+        """
+        The aim point most likely to score, within the time budget.
+
+        :param start: (x, y) the ball is kicked from
+        :param goal: Goal shot at
+        :param obstacles: Pitch objects in the way
+        :return: ((x, y) aim point, probability of scoring)
+        """
+        deadline = time.time() + self.budget
+        aims = self.aim_points(goal)
+        corners = [obj.get_corners() for obj in obstacles]
+        best, best_probability, scored = None, -1.0, 0
+        for begin in range(0, len(aims), CHUNK):
+            chunk = aims[begin:begin + CHUNK]
+            probabilities = self.score(start, chunk, goal, corners)
+            index = int(np.argmax(probabilities))
+            if probabilities[index] > best_probability:
+                best = tuple(chunk[index])
+                best_probability = float(probabilities[index])
+            scored += len(chunk)
+            if time.time() > deadline:
+                break
+        self.last_selection = {'scored': scored, 'aims': len(aims),
+                               'probability': best_probability}
+        return best, best_probability
@@ -0,0 +1,91 @@
+import numpy as np
+
+# Columns of WorldState.kinematics
+X, Y, ANGLE, VELOCITY = range(4)
+# Columns of WorldState.dimensions
+WIDTH, LENGTH, HEIGHT = range(3)
+# Columns of WorldState.grabbers
+GRABBER_WIDTH, GRABBER_HEIGHT, GRABBER_OFFSET = range(3)
+
+
+class WorldState(object):
+    """
+    Struct-of-arrays state of every object on the pitch.
+
+    Each object has a fixed row in contiguous arrays, so that per-frame
+    computations over all objects can be done in bulk:
+
+        kinematics  (n, 4)  x, y, angle, velocity
+        dimensions  (n, 3)  width, length, height
+        grabbers    (n, 3)  width, height, front offset - zero if none
+    """
+
+    def __init__(self, names):
+        """
+        :param names: Name of the object in each row
+        """
+        self.names = list(names)
+        self.rows = dict((name, row) for row, name in enumerate(self.names))
+        self.kinematics = np.zeros((len(self.names), 4))
+        self.dimensions = np.zeros((len(self.names), 3))
+        self.grabbers = np.zeros((len(self.names), 3))
+        self.frame = 0  # Number of updates written so far
+        self._grabber_areas = [None] * len(self.names)
+
+    @property
+    def positions(self):
+        return self.kinematics[:, X:ANGLE]
+
+    @property
+    def angles(self):
+        return self.kinematics[:, ANGLE]
+
+    @property
+    def velocities(self):
+        return self.kinematics[:, VELOCITY]
+
+    def advance(self):
+        """
+        Count a new frame, once its kinematics have been written.
+        """
+        self.frame += 1
+
+    def set_dimensions(self, row, width, length, height):
+        self.dimensions[row] = (width, length, height)
+
+    def set_grabber(self, row, area):
+        """
+        :param area: Catcher area dictionary as given to Robot.catcher_area,
+        or None if the object has no grabber
+        """
+        if area is not None:
+            area = (area['width'], area['height'], area['front_offset'])
+        if area != self._grabber_areas[row]:
+            self.grabbers[row] = area if area is not None else 0
+            self._grabber_areas[row] = area
+
+    def row(self, name):
+        """
+        The state of a single object as a dictionary.
+        """
+        row = self.rows[name]
+        x, y, angle, velocity = self.kinematics[row]
+        return {'x': x, 'y': y, 'angle': angle, 'velocity': velocity}
+
+    def copy(self):
+        """
+        Snapshot of the state that is not affected by later writes.
+        """
+        state = WorldState.__new__(WorldState)
+        state.names = self.names
+        state.rows = self.rows
+        state.kinematics = self.kinematics.copy()
+        state.dimensions = self.dimensions.copy()
+        state.grabbers = self.grabbers.copy()
+        state.frame = self.frame
+        state._grabber_areas = list(self._grabber_areas)
+        return state
+
+    def __repr__(self):
+        return '\n'.join('%s: %s' % (name, self.kinematics[row])
+                         for row, name in enumerate(self.names))
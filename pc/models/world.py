@@ -1,12 +1,42 @@
 from postprocessing import Postprocessing
 from Polygon.cPolygon import Polygon
 from models import *
+from state import WorldState
+from history import WorldHistory
+from raycast import Raycaster
+from occupancy import OccupancyGrid
+from prediction import BallPredictor
+from shooting import ShotSelector
+import threading
+import time
 import warnings
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 PX_PER_CM = 91 / 38.4
 
+# Rows of the world state, the moving objects come first
+MOVING_OBJECTS = ['our_defender', 'our_attacker', 'their_defender',
+                  'their_attacker', 'ball']
+STATE_OBJECTS = MOVING_OBJECTS + ['our_goal', 'their_goal']
+ROBOTS = MOVING_OBJECTS[:4]
+
+# Number of frames of the moving objects kept in the world history
+HISTORY_CAPACITY = 256
+# Seconds of history the velocities of predicted robots are fitted over
+PREDICTION_WINDOW = 0.2
+# Mean wait in seconds between a frame reaching the world and the planning
+# tick acting on it
+COMMAND_DELAY = 1 / 60.0
+# Weight of the previous measurement in the smoothing of the latency
+LATENCY_SMOOTHING = 0.9
+
+# Grabber areas - TODO should be adjusted once the robot is finalised
+GRABBERS = {'our_defender': {'width': 30, 'height': 30, 'front_offset': 20},
+            'our_attacker': {'width': 20, 'height': 20, 'front_offset': 18},
+            'their_defender': {'width': 30, 'height': 25, 'front_offset': 10},
+            'their_attacker': {'width': 30, 'height': 25, 'front_offset': 10}}
+
 
 class World(object):
     """
@@ -28,6 +58,37 @@ class World(object):
             Goal(3, self._pitch.width, self._pitch.height/2.0, pi)  # Rightmost
         ]
 
+        # Bulk state of all objects, one row per entry of STATE_OBJECTS
+        self._state = WorldState(STATE_OBJECTS)
+        self._state_objects = [getattr(self, name) for name in STATE_OBJECTS]
+        for row, obj in enumerate(self._state_objects):
+            self._state.set_dimensions(row, obj.width, obj.length, obj.height)
+            obj._bind_state(self._state.kinematics, row)
+
+        # Line of sight tests against the walls and robots
+        self._raycaster = Raycaster(self._pitch)
+
+        # Cost grid of the robot footprints, inflated by our robots' radius
+        self._occupancy = OccupancyGrid(
+            self._pitch, hypot(ROBOT_WIDTH, ROBOT_LENGTH) / 2)
+
+        # Timestamped states of the moving objects over the last frames
+        self._history = WorldHistory(MOVING_OBJECTS, HISTORY_CAPACITY)
+
+        # Held by position updates and by readers that need a whole frame
+        self._lock = threading.RLock()
+
+        self._ball_predictor = BallPredictor(self._pitch)
+        self._shot_selector = ShotSelector(self._raycaster)
+
+    @property
+    def lock(self):
+        """
+        Reentrant lock held while the positions are updated. Readers on
+        other threads hold it to see every object from the same frame.
+        """
+        return self._lock
+
     @property
     def our_attacker(self):
         return self._robots[2] if self.our_side == 'left' else self._robots[1]
@@ -60,15 +121,137 @@ class World(object):
     def pitch(self):
         return self._pitch
 
-    def update_positions(self, pos_dict):
+    @property
+    def state(self):
+        """
+        Struct-of-arrays state of all objects, with rows as in STATE_OBJECTS.
+        """
+        return self._state
+
+    @property
+    def generation(self):
+        """
+        Frame generation counter, incremented by every position update.
+        """
+        return self._state.frame
+
+    @property
+    def cache_stats(self):
+        """
+        Hit and miss counts of the memoized object geometry.
+        """
+        return {'hits': GEOMETRY_CACHE_STATS.hits,
+                'misses': GEOMETRY_CACHE_STATS.misses}
+
+    @property
+    def raycaster(self):
+        return self._raycaster
+
+    @property
+    def occupancy(self):
+        """
+        Cost grid of the pitch with the robots as obstacles, named as in
+        ROBOTS.
+        """
+        return self._occupancy
+
+    @property
+    def history(self):
+        """
+        Ring buffer of the timestamped states of the moving objects, with
+        rows as in MOVING_OBJECTS.
+        """
+        return self._history
+
+    def get_angle_change(self, obj, seconds):
+        """
+        Absolute change of a moving object's angle over the last seconds.
+        """
+        row = self._state_objects.index(obj)
+        return self._history.angle_change(seconds)[row]
+
+    def get_angular_velocity(self, obj, seconds):
+        """
+        Rate of change of a moving object's angle over the last seconds, in
+        radians per second, anticlockwise positive.
+        """
+        row = self._state_objects.index(obj)
+        return self._history.angular_velocity(seconds)[row]
+
+    def snapshot(self):
+        """
+        Copy of the current state for bulk readers.
+        """
+        with self._lock:
+            return self._state.copy()
+
+    def predict(self, seconds, still=(), motions=None):
+        """
+        The positions of the moving objects a number of seconds after the
+        latest frame. Robots carry on at the velocity and rate of turn
+        fitted over the last PREDICTION_WINDOW of the history and the ball
+        follows its predicted path, bouncing off the walls. Robots with a
+        known motion, e.g. our robot following its command, drive along the
+        arc of that motion instead.
+
+        :param seconds: Time to predict ahead
+        :param still: Names of robots known not to be moving, e.g. our robot
+        while it has no command in progress
+        :param motions: Optional dictionary of (speed in cm/s, rate of turn
+        in rad/s anticlockwise) by robot name, as Robot.commanded_motion
+        :return: Dictionary of Vectors for update_positions
+        """
+        motions = motions or {}
+        with self._lock:
+            velocities = self._history.velocity(PREDICTION_WINDOW)
+            turn_rates = self._history.angular_velocity(PREDICTION_WINDOW)
+            vectors = {}
+            for row, name in enumerate(ROBOTS):
+                obj = self._state_objects[row]
+                x, y, angle = obj.x, obj.y, obj.angle
+                if name in motions:
+                    speed, turn_rate = motions[name]
+                    distance = speed * seconds / CM_PER_PX
+                    heading = angle + turn_rate * seconds / 2
+                    x += distance * cos(heading)
+                    y += distance * sin(heading)
+                    angle += turn_rate * seconds
+                elif name not in still:
+                    x += velocities[row][0] * seconds
+                    y += velocities[row][1] * seconds
+                    angle += turn_rates[row] * seconds
+                vectors[name] = Vector._unchecked(
+                    x, y, (angle + obj.angle_offset) % (2*pi), obj.velocity)
+
+            ball = self._ball
+            x, y = self._ball_predictor.path(ball, [seconds])[0]
+            vectors['ball'] = Vector._unchecked(x, y, ball.angle,
+                                                ball.velocity)
+            return vectors
+
+    def update_positions(self, pos_dict, timestamp=None):
         """
         Update the positions of the pitch objects in the world state.
+        The vectors come from postprocessing so they are not validated again.
+
+        Each pitch object writes its vector through to its row of the state
+        arrays, as any assignment to its vector does.
+
+        :param timestamp: Time of the frame in seconds, defaults to now
         """
-        self.our_attacker.vector = pos_dict['our_attacker']
-        self.their_attacker.vector = pos_dict['their_attacker']
-        self.our_defender.vector = pos_dict['our_defender']
-        self.their_defender.vector = pos_dict['their_defender']
-        self.ball.vector = pos_dict['ball']
+        with self._lock:
+            for key, obj in zip(MOVING_OBJECTS, self._state_objects):
+                vector = pos_dict[key]
+                obj._set_vector_unchecked(vector.x, vector.y, vector.angle,
+                                          vector.velocity)
+            self._state.advance()
+            self._history.append(
+                time.time() if timestamp is None else timestamp,
+                self._state.kinematics[:len(MOVING_OBJECTS)])
+
+            for row, obj in enumerate(self._state_objects[:len(ROBOTS)]):
+                self._state.set_grabber(row, obj._catcher_area)
+                self._occupancy.update(ROBOTS[row], obj)
 
     def ball_in_area(self, robots):
         """
@@ -76,10 +259,8 @@ class World(object):
         :param list robots: robots whose areas are to be queried.
         :type robots: Robot list
         """
-        for robot in robots:
-            if self.pitch.zones[robot.zone].isInside(self.ball.x, self.ball.y):
-                return True
-        return False
+        zone = self.pitch.zone_at(self.ball.x, self.ball.y)
+        return any(robot.zone == zone for robot in robots)
 
     def ball_in_play(self):
         """
@@ -87,7 +268,7 @@ class World(object):
         margins.
         :return boolean: True if ball is in play, else False.
         """
-        return self.ball_in_area(self._robots)
+        return self.pitch.zone_at(self.ball.x, self.ball.y) is not None
 
     def ball_too_close(self, robot, threshold=18):
         """
@@ -116,18 +297,16 @@ class World(object):
         else:
             return our_center_x, our_center_y * (2/3.0)
 
-    def get_shot_target(self):  # TODO refactor, lots of reuse here
+    def get_shot_target(self):
         """
         Get the shot target. Ultimately we want to ball to go into the goal
-        1/5 * goal_width from either side. If there is a robot between ourselves
-        and the straightforward shot (far corner) then we will bounce shot off
-        of the closeby wall into the closeby corner of the goal.
+        1/5 * goal_width from either side. If their defender blocks the
+        straightforward shot (far corner) then we will bounce shot off
+        of the closeby wall into the closeby corner of the goal, or off the
+        far wall into the far corner if that is clear instead. If every shot
+        is blocked the closeby bounce is taken anyway.
         """
-        our_center_x, our_center_y = \
-            self.pitch.zones[self.our_attacker.zone].center()
-
-        zone = self.pitch.zones[self.our_attacker.zone]
-        zone_height = zone.center()[1]*2
+        _, our_center_y = self.pitch.zones[self.our_attacker.zone].center()
 
         upper_tgt = self.their_goal.x, \
                     self.their_goal.y + self.their_goal.height * (4/10.0)
@@ -135,29 +314,53 @@ class World(object):
                     self.their_goal.y - self.their_goal.height * (4/10.0)
 
         if self.our_attacker.y > our_center_y:
-            # Check straight shot
-            straight_shot_poly = \
-                Polygon([lower_tgt, (self.our_attacker.x, self.our_attacker.y-5), (self.our_attacker.x, self.our_attacker.y+5)])
-
-            #if self.their_defender.y > (7/10.0) * (self._pitch._zones[self.their_defender.zone].center()[1]*2):
-            if not straight_shot_poly.overlaps(self.their_defender.get_polygon()):
-                return lower_tgt
-            else:  # Bounce shot
-
-                return self.our_attacker.target_via_wall(upper_tgt[0],
-                                                            upper_tgt[1]
-                                                            )
+            straight_tgt, bounce_tgt, top = lower_tgt, upper_tgt, True
         else:
-            straight_shot_poly = \
-                Polygon([upper_tgt, (self.our_attacker.x, self.our_attacker.y), (self.our_attacker.x, self.our_attacker.y+5)])
+            straight_tgt, bounce_tgt, top = upper_tgt, lower_tgt, False
+
+        start = (self.our_attacker.x, self.our_attacker.y)
+        obstacles = [self.their_defender.get_corners()]
+        if self.is_path_clear(start, straight_tgt, [self.their_defender]):
+            return straight_tgt
+
+        for target, wall in [(bounce_tgt, top), (straight_tgt, not top)]:
+            clear, _ = self._raycaster.bounce_clear(start, target, obstacles,
+                                                    wall, BALL_WIDTH)
+            if clear:
+                return self.our_attacker.target_via_wall(target[0], target[1],
+                                                         wall)
+        return self.our_attacker.target_via_wall(bounce_tgt[0], bounce_tgt[1],
+                                                 top)
+
+    @property
+    def shot_selector(self):
+        return self._shot_selector
+
+    def select_shot(self):
+        """
+        Sample aim points along their goal, straight and off either wall,
+        and pick the one our attacker is most likely to score with past
+        their defender. Falls back to get_shot_target if no aim point can
+        score.
+
+        :return: ((x, y) aim point, estimated probability of scoring)
+        """
+        target, probability = self._shot_selector.select(
+            (self.our_attacker.x, self.our_attacker.y), self.their_goal,
+            [self.their_defender])
+        if target is None or probability <= 0:
+            return self.get_shot_target(), 0.0
+        return target, probability
+
+    def is_path_clear(self, start, end, obstacles):
+        """
+        True if the ball can travel straight from start to end without
+        touching any of the obstacles.
 
-            #if self.their_defender.y < (7/10.0) * (self._pitch._zones[self.their_defender.zone].center()[1]*2):
-            if not straight_shot_poly.overlaps(self.their_defender.get_polygon()):
-                return upper_tgt
-            else:  # Bounce shot
-                return self.our_attacker.target_via_wall(lower_tgt[0],
-                                                            lower_tgt[1],
-                                                            False)
+        :param obstacles: Pitch objects in the way
+        """
+        return self._raycaster.clear(
+            start, end, [obj.get_corners() for obj in obstacles], BALL_WIDTH)
 
     def get_pass_receive_spot(self):
         our_center_x, our_center_y = \
@@ -194,7 +397,7 @@ class World(object):
         True if the given robot can catch the ball. Note that this requires
         that the given robot has a grabber area defined.
         """
-        return robot.catcher_area.isInside(self.ball.x, self.ball.y)
+        return robot.can_catch(self.ball.x, self.ball.y)
 
     def cm_to_px(self, cm):
         """
@@ -219,7 +422,9 @@ class WorldUpdater:
     Process camera feed and update the world model.
     """
 
-    def __init__(self, pitch, colour, our_side, world, vision):
+    def __init__(self, pitch, colour, our_side, world, vision,
+                 predicted_world=None, robot_ctl=None,
+                 command_delay=COMMAND_DELAY):
         """
         :param pitch: which pitch - 0: main pitch; 1: second pitch.
         :type pitch: int
@@ -231,6 +436,16 @@ class WorldUpdater:
         :type world: World
         :param vision: The vision object used to update the world
         :type vision: Vision
+        :param predicted_world: Optional world to update with the positions
+        predicted for when a command planned on this frame is carried out
+        :type predicted_world: World
+        :param robot_ctl: Controller of our attacker, whose command round
+        trip adds to the prediction, which follows its drive command in
+        flight and which is not extrapolated while it has no command in
+        progress
+        :type robot_ctl: Robot
+        :param command_delay: Mean wait in seconds for the planning tick
+        :type command_delay: float
         """
         assert pitch in [0, 1]
         assert colour in ['yellow', 'blue']
@@ -242,36 +457,90 @@ class WorldUpdater:
         self.world = world
         self.vision = vision
         self.postprocessing = Postprocessing()
+        self.predicted_world = predicted_world
+        self.robot_ctl = robot_ctl
+        self.command_delay = command_delay
+        self.latency = None  # Smoothed delay from capture to world update
+        self._predicted_time = None
+
+        # Grabber areas only need setting once, the memoized catcher area
+        # polygons follow the robots
+        for world in [self.world, self.predicted_world]:
+            if world is not None:
+                for name in ROBOTS:
+                    getattr(world, name).catcher_area = GRABBERS[name]
 
-    def update_world(self, frame):
+    @property
+    def lead_time(self):
+        """
+        Expected time in seconds from the capture of a frame to a command
+        planned on it being carried out: the measured capture to update
+        latency, the wait for the planning tick and half the command round
+        trip to the robot.
+        """
+        lead = (self.latency or 0) + self.command_delay
+        if self.robot_ctl is not None and \
+                self.robot_ctl.round_trip is not None:
+            lead += self.robot_ctl.round_trip / 2
+        return lead
+
+    def _measure_latency(self, timestamp):
+        latency = max(time.time() - timestamp, 0)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = LATENCY_SMOOTHING * self.latency + \
+                (1 - LATENCY_SMOOTHING) * latency
+
+    def _update_predicted_world(self, timestamp):
+        lead = self.lead_time
+        still = []
+        motions = {}
+        if self.robot_ctl is not None:
+            motion = self.robot_ctl.commanded_motion
+            if motion is not None:
+                motions['our_attacker'] = motion
+            elif not self.robot_ctl.busy:
+                still.append('our_attacker')
+        predicted_time = timestamp + lead
+        # Keep the predicted history in order as the lead time changes
+        if self._predicted_time is not None:
+            predicted_time = max(predicted_time, self._predicted_time)
+        self._predicted_time = predicted_time
+        self.predicted_world.update_positions(
+            self.world.predict(lead, still, motions), predicted_time)
+
+    def update_world(self, frame, frame_hsv=None, timestamp=None):
         """
         Read a frame and update the world model appropriately.
         Returns the object positions for drawing on the UI feed.
 
         :param frame: A new frame to be processed by vision
         :type frame: np.array
+        :param frame_hsv: Optional HSV conversion of the frame shared with the
+        trackers
+        :type frame_hsv: np.array
+        :param timestamp: Capture time of the frame in seconds, defaults to
+        now
+        :type timestamp: float
         :return: New model positions and regular positions for drawing.
         """
+        if timestamp is None:
+            timestamp = time.time()
+
         # Find object positions, return for gui drawing
-        model_positions, regular_positions = self.vision.locate(frame)
-        model_positions = self.postprocessing.analyze(model_positions)
-
-        # Grabber areas - TODO should be adjusted once the robot is finalised
-        # Note that due to how the setter is written, these things need to be
-        # set on every frame - bit hacked together.
-        self.world.our_defender.catcher_area = \
-            {'width': 30, 'height': 30, 'front_offset': 20}
-        self.world.our_attacker.catcher_area = \
-            {'width': 20, 'height': 20, 'front_offset': 18}
-        self.world.their_defender.catcher_area = \
-            {'width': 30, 'height': 25, 'front_offset': 10}
-        self.world.their_attacker.catcher_area = \
-            {'width': 30, 'height': 25, 'front_offset': 10}
+        model_positions, regular_positions = \
+            self.vision.locate(frame, frame_hsv)
+        model_positions = self.postprocessing.analyze(model_positions,
+                                                      timestamp)
+
+        self.world.update_positions(model_positions, timestamp)
+        self._measure_latency(timestamp)
+        if self.predicted_world is not None:
+            self._update_predicted_world(timestamp)
 
         grabbers = {'our_defender': self.world.our_defender.catcher_area,
                     'our_attacker': self.world.our_attacker.catcher_area,
                     'their_defender': self.world.their_defender.catcher_area,
                     'their_attacker': self.world.their_attacker.catcher_area}
-
-        self.world.update_positions(model_positions)
         return model_positions, regular_positions, grabbers
\ No newline at end of file
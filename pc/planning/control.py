@@ -0,0 +1,144 @@
+from math import pi
+
+from ..models.models import TURNING_WINDOW
+
+# Heading error in radians within which the robot counts as aligned
+HEADING_TOLERANCE = 0.1
+# Time in seconds the robot keeps turning after its motors are stopped
+COAST_TIME = 0.15
+# Angular speed in rad/s below which the robot counts as still
+SETTLED_SPEED = 0.2
+# Weight of the latest measurement in the turn gain estimate
+GAIN_RATE = 0.3
+# Bounds of the turn gain estimate
+MIN_GAIN = 0.3
+MAX_GAIN = 2.0
+# Smallest commanded turn in radians whose response is measured
+MIN_MEASURED_TURN = 0.1
+
+
+def wrap(rads):
+    """
+    Wrap an angle to [-pi, pi).
+    """
+    return (rads + pi) % (2 * pi) - pi
+
+
+class HeadingController(object):
+    """
+    Closed-loop alignment of a robot's heading with a point.
+
+    The robot's response to a turn command is modelled by a gain, the
+    rotation it actually makes per radian commanded, and by the time it
+    coasts on after its motors stop. Each tick the heading the robot will
+    settle at is predicted from its filtered angle and angular velocity in
+    the world history:
+
+    - a still robot short of the target is sent one turn, sized by the gain,
+      to take it all the way;
+    - a turning robot whose predicted heading is within tolerance is stopped
+      so it coasts onto the target instead of overshooting;
+    - a turning robot is otherwise left to finish its command.
+
+    The rotation made by every completed turn updates the gain. Alignments
+    that took at least one command are counted in alignments, and their
+    commands in aligned_commands.
+    """
+
+    def __init__(self, world, robot_mdl, robot_ctl, gain=1.0,
+                 coast_time=COAST_TIME):
+        """
+        :param world: World holding the robot's history
+        :param robot_mdl: Robot model to align
+        :param robot_ctl: Robot control object sending the turns
+        :param gain: Initial rotation made per radian commanded
+        :param coast_time: Time in seconds the robot turns on after stopping
+        """
+        self.world = world
+        self.robot_mdl = robot_mdl
+        self.robot_ctl = robot_ctl
+        self.gain = gain
+        self.coast_time = coast_time
+        self.commands = 0  # Commands sent in the current alignment
+        self.alignments = 0  # Finished alignments that sent commands
+        self.aligned_commands = 0  # Commands sent by those alignments
+        self._turn = None  # (commanded rotation, angle) of the last turn
+        self._stopped = False  # The last turn has been stopped early
+
+    @property
+    def mean_commands(self):
+        """
+        Mean number of commands per finished alignment, None if none.
+        """
+        if not self.alignments:
+            return None
+        return self.aligned_commands / float(self.alignments)
+
+    def predicted_rotation(self, x, y):
+        """
+        Rotation still needed to face the point once the robot has coasted
+        to a stop, positive to the right as for Robot.turn.
+        """
+        omega = self.world.get_angular_velocity(self.robot_mdl,
+                                                TURNING_WINDOW)
+        # Turning anticlockwise adds to the rightward rotation needed
+        return wrap(self.robot_mdl.rotation_to_point(x, y) +
+                    omega * self.coast_time)
+
+    def _measure(self):
+        """
+        Update the gain from the rotation made by the last completed turn.
+        """
+        commanded, angle = self._turn
+        self._turn = None
+        if self._stopped or abs(commanded) < MIN_MEASURED_TURN:
+            return
+        made = wrap(angle - self.robot_mdl.angle)  # Rightward is clockwise
+        ratio = min(max(made / commanded, MIN_GAIN), MAX_GAIN)
+        self.gain += GAIN_RATE * (ratio - self.gain)
+
+    def align(self, x, y, tolerance=HEADING_TOLERANCE):
+        """
+        Queue whatever the robot needs to face a point, if anything.
+
+        :param x: x of the point in model coordinates
+        :param y: y of the point in model coordinates
+        :param tolerance: Heading error in radians that counts as aligned
+        :return: True once the robot is still and facing the point
+        """
+        rotation = self.predicted_rotation(x, y)
+        turning = abs(self.world.get_angular_velocity(
+            self.robot_mdl, TURNING_WINDOW)) > SETTLED_SPEED
+
+        if self.robot_ctl.busy or turning:
+            # Predictive stop: the robot will coast onto the target
+            if self._turn is not None and not self._stopped and \
+                    abs(rotation) < tolerance:
+                self.robot_ctl.stop()
+                self._stopped = True
+            return False
+
+        if self._turn is not None:
+            self._measure()
+
+        if abs(rotation) < tolerance:
+            # Holding an alignment every tick is not a new alignment
+            if self.commands:
+                self.alignments += 1
+                self.aligned_commands += self.commands
+                self.commands = 0
+            return True
+
+        self.robot_ctl.turn(rotation / self.gain)
+        self._turn = (rotation, self.robot_mdl.angle)
+        self._stopped = False
+        self.commands += 1
+        return False
+
+    def reset(self):
+        """
+        Abandon the current alignment without recording it.
+        """
+        self.commands = 0
+        self._turn = None
+        self._stopped = False
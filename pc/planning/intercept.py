@@ -0,0 +1,137 @@
+from math import pi
+import numpy as np
+
+from ..models.models import CM_PER_PX, ROBOT_WIDTH
+from ..models.world import COMMAND_DELAY
+from ..robot import WHEEL_BASE, WHEEL_SPEED, STRAIGHT_THRESHOLD, ARC_LIMIT
+from control import wrap
+
+# Distance in cm the robot runs on after its motors stop, from the offset of
+# the drive calibration in robot.cm_to_ticks
+DRIVE_OVERRUN = 39.472 / 12.095
+# Angle in radians the robot turns on after its motors stop, from the offset
+# of the turn calibration in robot.rad_to_ticks
+TURN_OVERRUN = 6.7339 / 1.0652 * pi / 180
+# Time in seconds the ball's path is forecast over
+INTERCEPT_HORIZON = 2.0
+# Time in seconds between the forecast ball positions
+INTERCEPT_STEP = 0.02
+
+
+def line_region(robot, ymin, ymax):
+    """
+    Region covered by a robot facing the wall as it slides along its line.
+
+    :return: (xmin, xmax, ymin, ymax) as taken by InterceptSolver.solve
+    """
+    return robot.x - ROBOT_WIDTH / 2, robot.x + ROBOT_WIDTH / 2, ymin, ymax
+
+
+class InterceptSolver(object):
+    """
+    Earliest point at which our robot can get in the way of a moving ball.
+
+    The ball's path is forecast by a BallPredictor at regular times up to the
+    horizon. The time the robot takes to reach each forecast position comes
+    from a kinematic model of the robot, after the command delay before it
+    starts. Two motions are modelled:
+
+    - sliding, a straight drive either way along the robot's heading as
+      Intercept and Defend make along their line, after a turn on the spot
+      by the bearing of the point or its reverse. The robot is in the way
+      once it is within the reach of its body.
+    - chasing, the motion Robot.drive_to issues: forward only, straight
+      ahead, along an arc for points within ARC_LIMIT, or a turn on the spot
+      by the full bearing then a straight drive. The robot drives the full
+      distance to the point.
+
+    Drives, arcs and turns run at WHEEL_SPEED.
+
+    The overrun in the tick calibrations is the distance the robot coasts
+    after its motors stop. Coasting down at the rate it speeds up, it loses
+    that distance at full speed while starting, which is added to the time
+    of each drive and turn.
+
+    The earliest forecast position the robot reaches no later than the ball
+    is the intercept. Every position is evaluated in one vectorized pass,
+    taking tens of microseconds, well within a planning tick.
+    """
+
+    def __init__(self, predictor, speed=WHEEL_SPEED, delay=COMMAND_DELAY,
+                 reach=ROBOT_WIDTH / 2, horizon=INTERCEPT_HORIZON,
+                 step=INTERCEPT_STEP):
+        """
+        :param predictor: BallPredictor forecasting the ball's path
+        :param speed: Wheel speed of the robot in cm/s
+        :param delay: Time in seconds before a command takes effect
+        :param reach: Distance in px from the robot's centre within which it
+        blocks the ball
+        :param horizon: Time in seconds the ball is forecast over
+        :param step: Time in seconds between forecast positions
+        """
+        self.predictor = predictor
+        self.speed = speed
+        self.turn_speed = 2 * speed / WHEEL_BASE
+        self.delay = delay
+        self.reach = reach
+        self.times = np.arange(0, horizon + step / 2, step)
+
+    def reach_times(self, robot, points, chase=False):
+        """
+        Time in seconds the robot takes to get to each point.
+
+        :param robot: Robot model
+        :param points: (n, 2) array of (x, y)
+        :param chase: Model the motion of Robot.drive_to rather than a slide
+        :return: (n,) array of times
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        dx = points[:, 0] - robot.x
+        dy = points[:, 1] - robot.y
+        distances = np.hypot(dx, dy)
+        if not chase:
+            distances = np.maximum(distances - self.reach, 0)
+        distances *= CM_PER_PX
+
+        bearings = np.abs(wrap(np.arctan2(dy, dx) - robot.angle))
+        if chase:
+            turns = bearings
+            arcing = (turns >= STRAIGHT_THRESHOLD) & (turns <= ARC_LIMIT)
+        else:
+            turns = np.minimum(bearings, pi - bearings)
+            arcing = np.zeros(len(turns), bool)
+        turning = (turns > STRAIGHT_THRESHOLD) & (distances > 0) & ~arcing
+        turn_times = np.where(
+            turning, (turns + TURN_OVERRUN) / self.turn_speed, 0)
+
+        # The arc through a point at bearing b and distance d turns by 2b on
+        # a radius of d / (2 sin b), its outer wheel running at full speed
+        with np.errstate(invalid='ignore', divide='ignore'):
+            outer = turns * (distances / np.sin(turns) + WHEEL_BASE)
+        lengths = np.where(arcing, outer, distances)
+        drive_times = np.where(
+            distances > 0, (lengths + DRIVE_OVERRUN) / self.speed, 0)
+        return self.delay + turn_times + drive_times
+
+    def solve(self, ball, robot, region=None, chase=False):
+        """
+        Earliest forecast position of the ball the robot can reach in time.
+
+        :param ball: Ball model, or a Vector for a hypothetical shot
+        :param robot: Robot model
+        :param region: Optional (xmin, xmax, ymin, ymax) the intercept must
+        lie in
+        :param chase: Model the motion of Robot.drive_to rather than a slide
+        :return: ((x, y), time) or None if the robot cannot get there first
+        """
+        points = self.predictor.path(ball, self.times)
+        feasible = self.reach_times(robot, points, chase) <= self.times
+        if region is not None:
+            xmin, xmax, ymin, ymax = region
+            feasible &= (points[:, 0] >= xmin) & (points[:, 0] <= xmax) & \
+                (points[:, 1] >= ymin) & (points[:, 1] <= ymax)
+        indices = np.flatnonzero(feasible)
+        if len(indices) == 0:
+            return None
+        first = indices[0]
+        return tuple(points[first]), self.times[first]
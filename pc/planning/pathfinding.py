@@ -0,0 +1,234 @@
+from heapq import heappush, heappop
+from math import hypot
+import time
+import numpy as np
+
+from ..models.occupancy import OCCUPIED_COST, CLEARANCE_COST
+from ..models.world import ROBOTS
+
+# Hard limit on the time spent searching for a path in one query, in seconds
+PATH_BUDGET = 0.005
+# Distance in px the goal may move before a cached path is planned again
+REPLAN_DISTANCE = 10
+# Extra cost of crossing a cell at CLEARANCE_COST, relative to a free cell
+CLEARANCE_WEIGHT = 2.0
+# Cost of crossing an occupied cell while escaping from one
+ESCAPE_WEIGHT = 10.0
+# Inflation of the A* heuristic, trading path length for fewer expansions
+HEURISTIC_WEIGHT = 1.5
+
+_NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1),
+               (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+class PathFinder(object):
+    """
+    Obstacle-aware paths for a robot inside its zone.
+
+    Paths are found by A* over the world's occupancy grid, limited to the
+    cells of the robot's zone. Occupied cells are impassable and cells in the
+    clearance band around obstacles cost more to cross. A robot that starts
+    inside the inflation of an obstacle may cross occupied cells at a high
+    cost until it is out. The cell path is then shortened to the waypoints
+    between which the robot can drive straight.
+
+    The previous path is reused while the goal stays within REPLAN_DISTANCE
+    and every cell along the remaining path is still free. A search that runs
+    over the time budget returns the path to the cell closest to the goal.
+    The outcome of the last query is kept in last_query.
+    """
+
+    def __init__(self, world, robot, budget=PATH_BUDGET):
+        """
+        :param world: World whose occupancy grid is searched
+        :param robot: Robot model the paths are for
+        :param budget: Time limit of a search in seconds
+        """
+        self.world = world
+        self.robot = robot
+        self.budget = budget
+        self._path = None
+        self._goal = None
+        self.last_query = None
+
+    @property
+    def grid(self):
+        return self.world.occupancy
+
+    def _robot_name(self):
+        for name in ROBOTS:
+            if getattr(self.world, name) is self.robot:
+                return name
+
+    def find_path(self, goal):
+        """
+        Get the waypoints from the robot's position to the goal.
+
+        :param goal: (x, y) in model coordinates
+        :return: List of (x, y) waypoints ending at the goal, empty if the
+        robot is there already or no path was found
+        """
+        start_time = time.time()
+        start = (self.robot.x, self.robot.y)
+        costs = self.grid.get_costs(exclude=[self._robot_name()])
+        passable = (costs < OCCUPIED_COST) & \
+            (self.grid.zones == self.robot.zone)
+
+        reused = self._can_reuse(goal, passable)
+        expanded, timed_out = 0, False
+        if not reused:
+            cells, expanded, timed_out = self._search(start, goal, costs,
+                                                      passable)
+            self._path = self._smooth(start, goal, cells, passable)
+            self._goal = goal
+        self._trim(start)
+
+        self.last_query = {'time': time.time() - start_time,
+                           'reused': reused,
+                           'expanded': expanded,
+                           'timed_out': timed_out}
+        return list(self._path)
+
+    def next_waypoint(self, goal):
+        """
+        The first waypoint on the path to the goal, or the goal itself if
+        there is no path.
+        """
+        path = self.find_path(goal)
+        return path[0] if path else goal
+
+    def _can_reuse(self, goal, passable):
+        if not self._path or self._goal is None:
+            return False
+        if hypot(goal[0] - self._goal[0], goal[1] - self._goal[1]) > \
+                REPLAN_DISTANCE:
+            return False
+        points = [(self.robot.x, self.robot.y)] + self._path
+        return all(self._segment_free(a, b, passable)
+                   for a, b in zip(points, points[1:]))
+
+    def _trim(self, start):
+        """
+        Drop the waypoints the robot has reached.
+        """
+        while len(self._path) > 1 and \
+                hypot(self._path[0][0] - start[0],
+                      self._path[0][1] - start[1]) < self.grid.cell:
+            self._path.pop(0)
+
+    def _cell_centre(self, cell):
+        return ((cell[1] + 0.5) * self.grid.cell,
+                (cell[0] + 0.5) * self.grid.cell)
+
+    def _search(self, start, goal, costs, passable):
+        """
+        A* from the start cell to the goal cell.
+
+        :return: (cells, expanded, timed_out) - the cells of the path from
+        start to goal, or to the closest cell reached if the goal is
+        unreachable or the budget ran out
+        """
+        grid = self.grid
+        start_cell, goal_cell = grid.cell_of(*start), grid.cell_of(*goal)
+        # Nested lists index much faster than arrays one cell at a time
+        weights = (1 + CLEARANCE_WEIGHT * np.minimum(costs, CLEARANCE_COST) /
+                   float(CLEARANCE_COST)).tolist()
+        in_zone = (grid.zones == self.robot.zone).tolist()
+        passable = passable.tolist()
+        rows, cols = grid.rows, grid.cols
+
+        def heuristic(cell):
+            return HEURISTIC_WEIGHT * hypot(cell[0] - goal_cell[0],
+                                            cell[1] - goal_cell[1])
+
+        deadline = time.time() + self.budget
+        came_from = {start_cell: None}
+        best_cost = {start_cell: 0.0}
+        closest, closest_distance = start_cell, heuristic(start_cell)
+        frontier = [(closest_distance, start_cell)]
+        expanded, timed_out = 0, False
+
+        while frontier:
+            _, cell = heappop(frontier)
+            if cell == goal_cell:
+                closest = cell
+                break
+            expanded += 1
+            if expanded % 16 == 0 and time.time() > deadline:
+                timed_out = True
+                break
+
+            distance = heuristic(cell)
+            if distance < closest_distance:
+                closest, closest_distance = cell, distance
+
+            # Cells inside an obstacle's inflation are only entered while
+            # escaping from it
+            escaping = not passable[cell[0]][cell[1]]
+            for dr, dc in _NEIGHBOURS:
+                row, col = cell[0] + dr, cell[1] + dc
+                if not (0 <= row < rows and 0 <= col < cols):
+                    continue
+                neighbour = (row, col)
+                if passable[row][col] or neighbour == goal_cell:
+                    weight = weights[row][col]
+                elif escaping and in_zone[row][col]:
+                    weight = ESCAPE_WEIGHT
+                else:
+                    continue
+                step = weight * (1.4142 if dr and dc else 1.0)
+                cost = best_cost[cell] + step
+                if cost < best_cost.get(neighbour, float('inf')):
+                    best_cost[neighbour] = cost
+                    came_from[neighbour] = cell
+                    heappush(frontier, (cost + heuristic(neighbour),
+                                        neighbour))
+
+        cells = []
+        cell = closest
+        while cell is not None:
+            cells.append(cell)
+            cell = came_from[cell]
+        cells.reverse()
+        return cells, expanded, timed_out
+
+    def _segment_free(self, a, b, passable):
+        """
+        True if every cell along the straight segment from a to b is
+        passable.
+        """
+        steps = max(int(hypot(b[0] - a[0], b[1] - a[1]) /
+                        (self.grid.cell / 2.0)), 1)
+        fractions = np.linspace(0, 1, steps + 1)
+        xs = a[0] + fractions * (b[0] - a[0])
+        ys = a[1] + fractions * (b[1] - a[1])
+        rows = (ys // self.grid.cell).astype(int)
+        cols = (xs // self.grid.cell).astype(int)
+        inside = (rows >= 0) & (rows < self.grid.rows) & \
+            (cols >= 0) & (cols < self.grid.cols)
+        if not inside.all():
+            return False
+        # The robot may start inside the inflation of a nearby obstacle
+        return bool(passable[rows[1:], cols[1:]].all())
+
+    def _smooth(self, start, goal, cells, passable):
+        """
+        Reduce the cell path to the waypoints where the robot has to turn.
+        """
+        points = [start] + [self._cell_centre(cell) for cell in cells[1:-1]]
+        if cells and cells[-1] == self.grid.cell_of(*goal):
+            points.append(goal)
+        elif cells:
+            points.append(self._cell_centre(cells[-1]))
+
+        waypoints = []
+        current = 0
+        while current < len(points) - 1:
+            following = current + 1
+            while following < len(points) - 1 and \
+                    self._segment_free(points[current], points[following + 1],
+                                       passable):
+                following += 1
+            waypoints.append(points[following])
+            current = following
+        return waypoints
@@ -1,5 +1,16 @@
 from strategies import *
 from utilities import *
+import sys
+import threading
+import time
+
+# Speed in cm/s above which the ball is treated as heading at us
+BALL_MOVING_SPEED = 40
+# Rate in Hz at which the planning loop plans and acts
+PLANNING_RATE = 30
+# Time in seconds the planning loop waits for a stop to be acknowledged after
+# a planning error
+STOP_TIMEOUT = 1.0
 
 
 class Planner(object):
@@ -36,6 +47,26 @@ class Planner(object):
     def strategy_state_string(self):
         return self.strategy.state.replace('_', ' ').capitalize() + '.'
 
+    @property
+    def strategies(self):
+        """
+        The strategies of the current profile.
+        """
+        return set(self._strategy_map.values())
+
+    @property
+    def alignment_commands(self):
+        """
+        Mean number of turn commands per heading alignment across the
+        strategies of the current profile, None before any alignment.
+        """
+        headings = [strategy.heading for strategy in self.strategies]
+        alignments = sum(heading.alignments for heading in headings)
+        if not alignments:
+            return None
+        return sum(heading.aligned_commands
+                   for heading in headings) / float(alignments)
+
     @property
     def profile(self):
         return self._profile
@@ -128,7 +159,7 @@ class Planner(object):
         elif self.world.ball_in_area([self.robot_mdl]):
             # The ball is heading at us (hopefully) or is slow
             if (self.state == DEFENDING or self.state == INTERCEPT) \
-                    and self.world.ball.velocity > 4:  # TODO tweak
+                    and self.world.ball.velocity > BALL_MOVING_SPEED:  # TODO tweak
                 self.state = INTERCEPT
             else:
                 self.state = GETTING_BALL
@@ -198,3 +229,128 @@ class Planner(object):
             self.profile = 'attacker'
 
         self.update_strategy()
+
+
+class PlanningLoop(object):
+    """
+    Runs a planner and its robot at a fixed rate on a thread of its own, so
+    commands are not held up by drawing or the Tk event queue.
+
+    Each tick plans with the world lock held, so the planner sees every
+    object from the same frame and the robot is only commanded from this
+    thread. The planner and strategy states are published after each tick
+    for the GUI to read. Ticks that run over their period are counted in
+    overruns and the schedule restarts from the late tick.
+
+    If a tick raises, the loop ends: the robot is stopped and the exception
+    is kept for check to raise on the thread that owns the loop.
+    """
+
+    def __init__(self, planner, rate=PLANNING_RATE):
+        """
+        :param planner: Planner to run
+        :param rate: Ticks per second
+        """
+        self.planner = planner
+        self.world = planner.world
+        self.period = 1.0 / rate
+        self.paused = False
+        self.ticks = 0
+        self.overruns = 0
+        self.last_duration = None  # Time taken by the last tick in seconds
+        self.error = None  # Exception that ended the loop
+        self._exc_info = None
+        self._status = (None, None)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run,
+                                        name='PlanningLoop')
+        self._thread.daemon = True
+
+    @property
+    def status(self):
+        """
+        (planner state, strategy state) strings as of the last tick, None
+        while paused or before the first.
+        """
+        return self._status
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the loop and wait for the tick in progress to finish.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def toggle_pause(self):
+        """
+        Pause or resume planning. The robot is stopped on pausing and still
+        acted on, so the stop is sent and acknowledged.
+        """
+        with self.world.lock:
+            self.paused = not self.paused
+            if self.paused:
+                self.planner.robot_ctl.stop()
+                self._status = (None, None)
+
+    def tick(self):
+        with self.world.lock:
+            if not len(self.world.history):
+                return  # Nothing seen yet
+            if self.paused:
+                self.planner.robot_ctl.act()
+            else:
+                self.planner.plan()
+                self._status = (self.planner.planner_state_string,
+                                self.planner.strategy_state_string)
+        self.ticks += 1
+
+    def check(self):
+        """
+        Raise the exception that ended the loop, if any, with its traceback.
+        """
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+
+    def _halt_robot(self, timeout=STOP_TIMEOUT):
+        """
+        Stop the robot and act on it until the stop has been acknowledged,
+        so it does not carry on with its last command.
+        """
+        robot_ctl = self.planner.robot_ctl
+        robot_ctl.stop()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            robot_ctl.act()
+            if robot_ctl.queued_command is None and \
+                    not robot_ctl.waiting_for_ack:
+                return
+            time.sleep(0.001)
+
+    def run(self):
+        try:
+            self._run()
+        except Exception as error:
+            self._exc_info = sys.exc_info()
+            self.error = error
+            self._status = (None, None)
+            with self.world.lock:
+                self._halt_robot()
+
+    def _run(self):
+        next_tick = time.time()
+        while not self._stop.is_set():
+            start = time.time()
+            self.tick()
+            self.last_duration = time.time() - start
+
+            next_tick += self.period
+            delay = next_tick - time.time()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                self.overruns += 1
+                next_tick = time.time()
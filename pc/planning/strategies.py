@@ -1,7 +1,15 @@
 from utilities import *
 from Polygon.cPolygon import Polygon
+from ..models.prediction import BallPredictor
+from ..models.models import Vector, ROBOT_WIDTH
+from pathfinding import PathFinder
+from control import HeadingController
+from intercept import InterceptSolver, line_region, INTERCEPT_HORIZON
 import math
 
+# Speed in cm/s assumed of a shot by their defender
+SHOT_SPEED = 150.0
+
 
 class Strategy(object):
     """
@@ -16,6 +24,8 @@ class Strategy(object):
         self._state = self.states[0]
         self.robot_mdl = world.our_attacker
         self.ball = world.ball
+        self.path_finder = PathFinder(world, self.robot_mdl)
+        self.heading = HeadingController(world, self.robot_mdl, robot_ctl)
 
     @property
     def state(self):
@@ -39,6 +49,7 @@ class Strategy(object):
     def reset(self):
         """Reset the Strategy object to its initial state."""
         self.state = self.states[0]
+        self.heading.reset()
 
     def final_state(self):
         """Return True if the current state is final."""
@@ -52,7 +63,16 @@ class Strategy(object):
         pass
 
     def robot_moving(self):
-        return self.robot_ctl.is_moving or self.robot_mdl.is_moving()
+        return self.robot_ctl.busy or self.robot_mdl.is_moving()
+
+    def move_towards(self, dest):
+        """
+        Drive to the next waypoint on the path to dest with a single arc, or
+        a turn then drive sequence if it is far round.
+        """
+        x, y = self.path_finder.next_waypoint(dest)
+        self.robot_ctl.drive_to(self.robot_mdl.rotation_to_point(x, y),
+                                self.robot_mdl.displacement_to_point(x, y))
 
 
 class Idle(Strategy):
@@ -87,13 +107,8 @@ class GetBall(Strategy):
                 and self.robot_ctl.grabber_open:
             self.state = GRABBING_BALL
 
-        elif not self.robot_moving():
-            if self.robot_mdl.is_facing_point(self.ball.x, self.ball.y):
-                self.state = OPENING_GRABBER
-            else:
-                angle = self.robot_mdl.rotation_to_point(self.ball.x,
-                                                             self.ball.y)
-                self.robot_ctl.turn(angle*0.3)
+        elif self.heading.align(self.ball.x, self.ball.y):
+            self.state = OPENING_GRABBER
 
     def open_grabber(self):
         if not self.robot_ctl.is_grabbing:
@@ -149,11 +164,7 @@ class FaceBall(Strategy):
                 self.robot_ctl.open_grabber()
 
     def follow_ball(self):
-        if not self.robot_mdl.is_facing_point(self.ball.x, self.ball.y) \
-                and not self.robot_moving():
-            angle = self.robot_mdl.rotation_to_point(self.ball.x,
-                                                         self.ball.y)
-            self.robot_ctl.turn(angle*0.3)
+        self.heading.align(self.ball.x, self.ball.y)
 
 
 class PassBall(Strategy):
@@ -178,8 +189,9 @@ class PassBall(Strategy):
         self.dest = None
 
     def find_path(self):
-        path = self.robot_mdl.pass_path(self.target)
-        if path.overlaps(self.their_attacker.get_polygon()):
+        if not self.world.is_path_clear((self.robot_mdl.x, self.robot_mdl.y),
+                                        (self.target.x, self.target.y),
+                                        [self.their_attacker]):
             self.dest = self.world.find_pass_spot_ms3(self.robot_mdl)
             self.state = MOVING_TO_DEST
         else:
@@ -189,23 +201,12 @@ class PassBall(Strategy):
         if not self.robot_moving():
             if self.robot_mdl.is_at_point(self.dest[0], self.dest[1]):
                 self.state = TURNING_TO_DEFENDER
-            elif self.robot_mdl.is_facing_point(self.dest[0], self.dest[1]):
-                dist = self.robot_mdl.displacement_to_point(self.dest[0],
-                                                                self.dest[1])
-                self.robot_ctl.drive(dist, dist)
             else:
-                angle = self.robot_mdl.rotation_to_point(self.dest[0],
-                                                             self.dest[1])
-                self.robot_ctl.turn(angle*0.3)
+                self.move_towards(self.dest)
 
     def turn_to_def(self):
-        if not self.robot_moving():
-            if self.robot_mdl.is_facing_point(self.target.x, self.target.y):
-                self.state = OPENING_GRABBER
-            else:
-                angle = self.robot_mdl.rotation_to_point(self.target.x,
-                                                             self.target.y)
-                self.robot_ctl.turn(angle*0.3)
+        if self.heading.align(self.target.x, self.target.y):
+            self.state = OPENING_GRABBER
 
     def open_grabber(self):
         if not self.robot_ctl.is_grabbing:
@@ -249,6 +250,7 @@ class ShootGoal(Strategy):
         self.target = self.world.their_goal
         self.their_defender = self.world.their_defender
         self.shot_target = None
+        self.shot_probability = None
         self.dest = None
 
     def close_grabber(self):
@@ -278,35 +280,21 @@ class ShootGoal(Strategy):
                 self.dest = None
                 self.state = CHOOSING_SHOT_ANGLE
 
-            # Else, not facing destination
-            elif not self.robot_mdl.is_facing_point(self.dest[0], self.dest[1]):
-                angle = self.robot_mdl.rotation_to_point(self.dest[0],
-                                                             self.dest[1])
-                print "turning: "+str(angle*0.3)
-                self.robot_ctl.turn(angle*0.3) #note: 0.3 = slowing down turn
-
-            # Facing the point, move forward
+            # Else, drive along the path to it
             else:
-                dist = self.robot_mdl.displacement_to_point(self.dest[0],
-                                                                self.dest[1])
-                print "driving: "+str(dist)
-                self.robot_ctl.drive(dist, dist)
+                self.move_towards(self.dest)
 
     def turn_to_shoot(self):
         """
-        Turn to appropriate shot angle. This is going to be a bounce shot if
-        there is an obstacle between the shooter and goal.
+        Turn to the aim point most likely to score. This may be a bounce shot
+        if their defender covers the goal.
         """
         if self.shot_target is None:
-            self.shot_target = self.world.get_shot_target()
+            self.shot_target, self.shot_probability = \
+                self.world.select_shot()
 
         # Turn to shot target
-        if not self.robot_mdl.is_facing_point(self.shot_target[0],
-                                              self.shot_target[1], 0.02):
-            angle = self.robot_mdl.rotation_to_point(self.shot_target[0],
-                                                     self.shot_target[1])
-            self.robot_ctl.turn(angle*0.3)
-        else:
+        if self.heading.align(self.shot_target[0], self.shot_target[1], 0.02):
             self.state = KICKING
 
     def kick(self):
@@ -335,6 +323,7 @@ class ShootGoal(Strategy):
         """
         super(ShootGoal, self).reset()
         self.shot_target = None
+        self.shot_probability = None
 
 
 class Defend(Strategy):
@@ -352,6 +341,7 @@ class Defend(Strategy):
                       TRACKING_SHOT_PATH: self.track_shot_path}
         super(Defend, self).__init__(world, robot_ctl, _STATES, _STATE_MAP)
         self.top_fixated = None
+        self.solver = InterceptSolver(BallPredictor(world.pitch))
 
     def choose_wall(self):
         angle_top = self.robot_mdl.rotation_to_angle(math.pi / 2)
@@ -383,9 +373,17 @@ class Defend(Strategy):
         y_min = self.world.pitch.height * 0.2
         their_def = self.world.their_defender
 
+        # Block a shot along their defender's heading where we can get to
+        # before it, bounces included
+        shot = Vector(their_def.x, their_def.y, their_def.angle, SHOT_SPEED)
+        block = self.solver.solve(shot, self.robot_mdl,
+                                  line_region(self.robot_mdl, y_min, y_max))
+        if block is not None:
+            target_y = block[0][1]
+
         # If their def is facing away (not yet ready for shot)
         # TODO refactor into world state method
-        if self.world.our_side == 'left':
+        elif self.world.our_side == 'left':
             if their_def.angle < 4 * math.pi / 6:
                 target_y = y_max  # TODO turning direction cases
             elif their_def.angle > 4 * math.pi / 3:
@@ -457,6 +455,9 @@ class Intercept(Strategy):
                       TRACKING_BALL: self.track_ball}
         super(Intercept, self).__init__(world, robot_ctl, _STATES, _STATE_MAP)
         self.top_fixated = None
+        self.predictor = BallPredictor(world.pitch)
+        self.solver = InterceptSolver(self.predictor)
+        self.chasing = False
 
     def choose_wall(self):
         angle_top = self.robot_mdl.rotation_to_angle(math.pi / 2)
@@ -483,17 +484,56 @@ class Intercept(Strategy):
                     angle = self.robot_mdl.rotation_to_angle(3*math.pi/2)
                     self.robot_ctl.turn(angle)
 
+    def get_intercept(self):
+        """
+        Where to meet the ball. In order of preference:
+
+        - the earliest point on our robot's line it can reach before the ball;
+        - the earliest point in our zone it can drive to with drive_to before
+          the ball;
+        - where the ball will cross our robot's line within
+          INTERCEPT_HORIZON seconds, even if it cannot get there in time;
+        - the ball's y on our robot's line.
+
+        :return: (x, y)
+        """
+        ball, robot = self.world.ball, self.robot_mdl
+        on_line = self.solver.solve(
+            ball, robot, line_region(robot, 0, self.world.pitch.height))
+        if on_line is not None:
+            return robot.x, on_line[0][1]
+
+        zone = self.world.pitch.zones[robot.zone].boundingBox()
+        in_zone = self.solver.solve(ball, robot, zone, chase=True)
+        if in_zone is not None:
+            return in_zone[0]
+
+        crossing = self.predictor.crossing(ball, robot.x)
+        if crossing is None or crossing[0] > INTERCEPT_HORIZON:
+            return robot.x, ball.y
+        return robot.x, crossing[1]
+
     def track_ball(self):
         """
-        Follow ball's y coordinate.
+        Slide along our robot's line to meet the ball, or drive off it to an
+        earlier intercept then face the wall again.
         """
-        if self.robot_mdl.is_square():
+        if self.chasing:
+            if not self.robot_moving():
+                self.chasing = False
+                self.state = TURNING_TO_WALL
+        elif self.robot_mdl.is_square():
             if not self.robot_moving():
-                ball_y = self.world.ball.y
+                x, y = self.get_intercept()
                 bot_y = self.robot_mdl.y
 
-                if not ball_y - 8 < bot_y < ball_y + 8:
-                    displacement = self.world.px_to_cm(ball_y - bot_y)
+                if abs(x - self.robot_mdl.x) > ROBOT_WIDTH / 2:
+                    self.chasing = True
+                    self.robot_ctl.drive_to(
+                        self.robot_mdl.rotation_to_point(x, y),
+                        self.robot_mdl.displacement_to_point(x, y))
+                elif not y - 8 < bot_y < y + 8:
+                    displacement = self.world.px_to_cm(y - bot_y)
                     if self.top_fixated:
                         self.robot_ctl.drive(displacement, displacement)
                     else:
@@ -502,6 +542,10 @@ class Intercept(Strategy):
             self.robot_ctl.stop()
             self.state = TURNING_TO_WALL
 
+    def reset(self):
+        super(Intercept, self).reset()
+        self.chasing = False
+
 
 class AwaitPass(Strategy):
     """
@@ -532,14 +576,8 @@ class AwaitPass(Strategy):
             if self.robot_mdl.is_at_point(self.dest[0], self.dest[1]):
                 self.dest = None
                 self.state = TURNING_TO_WALL
-            elif self.robot_mdl.is_facing_point(self.dest[0], self.dest[1]):
-                dist = self.robot_mdl.displacement_to_point(self.dest[0],
-                                                            self.dest[1])
-                self.robot_ctl.drive(dist, dist)
             else:
-                angle = self.robot_mdl.rotation_to_point(self.dest[0],
-                                                         self.dest[1])
-                self.robot_ctl.turn(angle)
+                self.move_towards(self.dest)
 
     def face_wall_point(self):
         if self.wall_point is None:
@@ -547,15 +585,9 @@ class AwaitPass(Strategy):
                 self.world.our_defender.x, self.world.our_defender.y,
                 self.robot_mdl.y > self.world.pitch.height/2.0)
 
-        if not self.robot_moving():
-            if self.robot_mdl.is_facing_point(self.wall_point[0],
-                                              self.wall_point[1]):
-                self.state = OPENING_GRABBER
-                self.wall_point = None
-            else:
-                angle = self.robot_mdl.rotation_to_point(self.wall_point[0],
-                                                         self.wall_point[1])
-                self.robot_ctl.turn(angle)
+        if self.heading.align(self.wall_point[0], self.wall_point[1]):
+            self.state = OPENING_GRABBER
+            self.wall_point = None
 
     def open_grabber(self):
         if not self.robot_ctl.grabber_open and not self.robot_ctl.is_grabbing:
@@ -583,22 +615,19 @@ class PenaltyKick(Strategy):
         self.their_defender = self.world.their_defender
         self.dest = None
         self.shot_target = None
+        self.shot_probability = None
 
     def turn_to_goal(self):
         """
-        Turn to appropriate shot angle. This is going to be a bounce shot if
-        there is an obstacle between the shooter and goal.
+        Turn to the aim point most likely to score. This may be a bounce shot
+        if their defender covers the goal.
         """
         if self.shot_target is None:
-            self.shot_target = self.world.get_shot_target()
+            self.shot_target, self.shot_probability = \
+                self.world.select_shot()
 
         # Turn to shot target
-        if not self.robot_mdl.is_facing_point(self.shot_target[0],
-                                              self.shot_target[1], 0.01):
-            angle = self.robot_mdl.rotation_to_point(self.shot_target[0],
-                                                         self.shot_target[1])
-            self.robot_ctl.turn(angle*0.3)
-        else:
+        if self.heading.align(self.shot_target[0], self.shot_target[1], 0.01):
             self.state = OPENING_GRABBER
 
     def open_grabber(self):
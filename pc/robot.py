@@ -1,4 +1,5 @@
 import math
+import time
 from multiprocessing import Process, Pipe
 from communicator import Communicator
 
@@ -11,6 +12,43 @@ READY = "READY"
 STATUS = "STATUS"
 CMD_DELIMITER = ' '
 
+# Distance in cm between the wheels, from the drive and turn calibrations
+WHEEL_BASE = 2 * 1.0652 * 180 / math.pi / 12.095
+# Wheel speed in cm/s at full power
+WHEEL_SPEED = 30.0
+# Largest bearing in radians reached with a single arc by drive_to; points
+# further round are reached by turning on the spot first
+ARC_LIMIT = math.pi / 4
+# Bearing in radians below which drive_to drives straight
+STRAIGHT_THRESHOLD = 0.02
+# Weight of the previous measurement in the smoothing of the round trip
+ROUND_TRIP_SMOOTHING = 0.9
+
+
+def cm_to_ticks(cm):
+    """
+    Convert a wheel distance to rotary encoder ticks, keeping its sign.
+    """
+    ticks = lambda d: 12.095 * d - 39.472 if d >= 6 else 4.3018 * d + 1
+    if cm > 0:
+        return round(ticks(cm))
+    elif cm < 0:
+        return -round(ticks(-cm))
+    return 0
+
+
+def rad_to_ticks(rads):
+    """
+    Convert a turn on the spot to the ticks run by each wheel, keeping its
+    sign.
+    """
+    ticks = lambda deg: 1.0652*deg - 6.7339 if deg > 9 else 1.1673*deg
+    if rads > 0:
+        return round(ticks(rads*180/math.pi))
+    elif rads < 0:
+        return -round(ticks(-rads*180/math.pi))
+    return 0
+
 
 class Robot(object):
     """
@@ -29,6 +67,7 @@ class Robot(object):
 
         self._queued_command = None  # Next command to be sent
         self._current_command = None  # Command being dealt with at the moment
+        self._current_drive = None  # Last drive command sent
         self.waiting_for_ack = False  # Waiting for update from communicator
         self.ready = False  # True if ready to receive a command
         self.grabber_open = True  # Assume open
@@ -36,6 +75,9 @@ class Robot(object):
         self.is_moving = False  # Performing a drive/turn
         self.is_kicking = False  # Kick motor is running
         self.ball_grabbed = False  # Ball sensor is pressed
+        self._sequence = []  # Commands to send once the current one is done
+        self.round_trip = None  # Smoothed command to ack time in seconds
+        self._sent_time = None
         self.comms = comms
 
         if self.comms:
@@ -59,7 +101,8 @@ class Robot(object):
     @queued_command.setter
     def queued_command(self, val):
         """
-        Set the current command.
+        Set the current command. Any command other than a status request
+        abandons the rest of a sequence.
         :param val: Iterable/tuple - cmd [args]
         """
         try:
@@ -67,8 +110,45 @@ class Robot(object):
         except ValueError:
             raise ValueError("Pass an iterable (cmd, [args])")
         else:
+            if cmd != STATUS:
+                self._sequence = []
             self._queued_command = cmd, arguments
 
+    @property
+    def busy(self):
+        """
+        True while the robot is moving, a command other than a status request
+        is yet to be acknowledged or a sequence has commands left.
+        """
+        pending = self._queued_command is not None and \
+            self._queued_command[0] != STATUS
+        return self.is_moving or pending or bool(self._sequence)
+
+    @property
+    def commanded_motion(self):
+        """
+        Speed in cm/s and rate of turn in rad/s, anticlockwise, at which the
+        drive command in flight runs the robot, each wheel at WHEEL_SPEED
+        scaled by its power. A drive is in flight from being sent until the
+        robot reports that it has stopped.
+
+        :return: (speed, turn rate) or None without a drive in flight
+        """
+        command = self._current_drive
+        if command is None:
+            return None
+        in_flight = self.is_moving or \
+            (self.waiting_for_ack and self._current_command is command)
+        if not in_flight:
+            return None
+        l_ticks, r_ticks, l_power, r_power = [float(arg) for arg in command[1]]
+        left, right = [math.copysign(WHEEL_SPEED * power / 100, ticks)
+                       if ticks else 0.0
+                       for ticks, power in [(l_ticks, l_power),
+                                            (r_ticks, r_power)]]
+        # A faster left wheel turns right
+        return (left + right) / 2, (right - left) / WHEEL_BASE
+
     def reset_queued_command(self):
         self._queued_command = None
 
@@ -77,18 +157,34 @@ class Robot(object):
         If we're waiting for an ack then poll and deal with it. Otherwise
         send the queued command.
 
+        Once the robot has stopped, the next command of a sequence is queued.
+
         If comms is false then just print the queued command and clear it.
         """
         if self.waiting_for_ack:
             if self.comm_pipe.poll():
                 state_str = self.comm_pipe.recv()
                 self._update_state_bits(state_str)
+                self._measure_round_trip()
                 self.waiting_for_ack = False
-                self.reset_queued_command()
+                # Keep a command queued while waiting, it is sent next
+                if self._queued_command is self._current_command:
+                    self.reset_queued_command()
+
+        elif self._sequence and self.queued_command is None:
+            if self.is_moving:
+                self.update_state()  # Wait for the last command to finish
+            else:
+                self._queued_command = self._sequence.pop(0)
+                self.act()
 
         elif self.queued_command is not None:  # There is a queued command
             if self.comms:
                 self.comm_pipe.send(self._queued_command)
+                self._current_command = self._queued_command
+                if self._current_command[0] == DRIVE:
+                    self._current_drive = self._current_command
+                self._sent_time = time.time()
                 self.waiting_for_ack = True
             else:
                 print self.queued_command
@@ -98,6 +194,14 @@ class Robot(object):
             self.update_state()
         # TODO return state to caller for passing to world
 
+    def _measure_round_trip(self):
+        round_trip = time.time() - self._sent_time
+        if self.round_trip is None:
+            self.round_trip = round_trip
+        else:
+            self.round_trip = ROUND_TRIP_SMOOTHING * self.round_trip + \
+                (1 - ROUND_TRIP_SMOOTHING) * round_trip
+
     def _update_state_bits(self, string):
         """
         Given the state part of an ack string, update the robot's state bits.
@@ -176,22 +280,19 @@ class Robot(object):
         :param r_power: Motor power from 0-100 - low values may not provide
         enough torque for drive.
         """
-        # TODO REFACTOR ME PLEASE OH DEAR
-        cm_to_ticks = \
-            lambda cm: 12.095 * cm - 39.472 if cm >= 6 else 4.3018 * cm + 1
+        self.queued_command = self._drive_command(l_dist, r_dist, l_power,
+                                                  r_power)
 
-        if l_dist > 0:
-            l_dist = round(cm_to_ticks(l_dist))
-        elif l_dist < 0:
-            l_dist = -round(cm_to_ticks(-l_dist))
+    @staticmethod
+    def _drive_command(l_dist, r_dist, l_power=100, r_power=100):
+        return (DRIVE, [str(cm_to_ticks(l_dist)), str(cm_to_ticks(r_dist)),
+                        str(l_power), str(r_power)])
 
-        if r_dist > 0:
-            r_dist = round(cm_to_ticks(r_dist))
-        elif r_dist < 0:
-            r_dist = -round(cm_to_ticks(-r_dist))
-
-        self.queued_command = \
-            (DRIVE, [str(l_dist), str(r_dist), str(l_power), str(r_power)])
+    @staticmethod
+    def _turn_command(rads, power=100):
+        wheel_dist = rad_to_ticks(rads)
+        return (DRIVE, [str(wheel_dist), str(-wheel_dist), str(power),
+                        str(power)])
 
     def stop(self):
         """
@@ -209,19 +310,69 @@ class Robot(object):
                         direction (negative -> leftward, positive -> rightward)
         :param power: Motor power
         """
-        deg_to_tick = lambda deg: 1.0652*deg - 6.7339 if deg > 9 \
-            else 1.1673*deg
-        rad_to_tick = lambda rad: deg_to_tick(rad*180/math.pi)
+        self.queued_command = self._turn_command(rads, power)
+
+    @staticmethod
+    def _arc_command(rads, radius, power=100):
+        # Positive rads turn right, with the left wheel on the outside
+        l_dist = abs(rads) * radius + rads * WHEEL_BASE / 2
+        r_dist = abs(rads) * radius - rads * WHEEL_BASE / 2
+        # Scale the powers so both wheels finish together
+        longest = max(abs(l_dist), abs(r_dist))
+        l_power = int(round(power * abs(l_dist) / longest))
+        r_power = int(round(power * abs(r_dist) / longest))
+        return Robot._drive_command(l_dist, r_dist, l_power, r_power)
+
+    def arc(self, rads, radius, power=100):
+        """
+        Drive forward along a circular arc, turning by the given angle. The
+        wheels run different distances and proportional powers so that they
+        finish together.
+
+        :param rads: Change of heading over the arc, positive to the right as
+        for turn
+        :param radius: Radius in centimetres of the path of the robot's
+        centre. Radii below half the wheel base run the inner wheel backward.
+        :param power: Motor power of the outer wheel
+        """
+        if rads == 0:
+            self.stop()
+        else:
+            self.queued_command = self._arc_command(rads, abs(radius), power)
 
-        if rads > 0:
-            wheel_dist = round(rad_to_tick(rads))
-        elif rads < 0:
-            wheel_dist = round(-rad_to_tick(-rads))
+    def drive_to(self, rads, dist, power=100):
+        """
+        Drive to a point given relative to the robot, with one call. Points
+        almost straight ahead are driven to directly and points within
+        ARC_LIMIT either side are reached along the arc through them that
+        starts on the current heading. Points further round are reached by a
+        sequence of a turn on the spot then a straight drive.
+
+        :param rads: Bearing of the point, as given by rotation_to_point
+        :param dist: Distance in centimetres to the point
+        :param power: Motor power
+        """
+        if abs(rads) < STRAIGHT_THRESHOLD:
+            self.drive(dist, dist, power, power)
+        elif abs(rads) <= ARC_LIMIT:
+            # The arc through a point at bearing b and distance d turns by 2b
+            # on a radius of d / (2 sin b)
+            radius = dist / (2 * abs(math.sin(rads)))
+            self.queued_command = self._arc_command(2 * rads, radius, power)
         else:
-            wheel_dist = 0
+            self.sequence([self._turn_command(rads, power),
+                           self._drive_command(dist, dist, power, power)])
+
+    def sequence(self, commands):
+        """
+        Queue several commands, each sent once the robot has stopped after
+        the one before. Any other command abandons the rest.
 
-        self.queued_command = \
-            (DRIVE, [str(wheel_dist), str(-wheel_dist), str(power), str(power)])
+        :param commands: List of (cmd, [args]) tuples
+        """
+        if commands:
+            self.queued_command = commands[0]
+            self._sequence = list(commands[1:])
 
     def open_grabber(self, time=1000, power=100):
         """
@@ -0,0 +1,190 @@
+from multiprocessing import Pool
+from math import pi
+import os
+import sys
+import numpy as np
+
+from ..models.models import ROBOT_LENGTH
+from episode import Episode
+
+PROFILES = ['attacker', 'ms3', 'penalty']
+# Standard deviations in px of the position noise scenarios are drawn from
+NOISE_LEVELS = [0.0, 1.0, 3.0]
+# Standard deviation of the angle noise in radians per px of position noise
+ANGLE_NOISE_PER_PX = 0.01
+# Limit in seconds of simulated time of an episode
+EPISODE_LIMIT = 30.0
+
+
+def _sample_point(pitch, zone, random, margin=ROBOT_LENGTH/2):
+    """
+    A random point in a zone, at least margin from its edges.
+    """
+    xmin, xmax, ymin, ymax = pitch.zones[zone].boundingBox()
+    while True:
+        x, y = random.uniform(xmin, xmax), random.uniform(ymin, ymax)
+        if all(pitch.zone_at(x + dx, y + dy) == zone
+               for dx, dy in [(0, 0), (-margin, 0), (margin, 0),
+                              (0, -margin), (0, margin)]):
+            return x, y
+
+
+def make_scenarios(count, seed, profiles=PROFILES, noise_levels=NOISE_LEVELS,
+                   our_side='left', pitch_num=0):
+    """
+    Random scenarios, the same for the same arguments.
+
+    Our attacker and both opponents are placed anywhere in their zones
+    facing any way, and the noise level is drawn from noise_levels. The
+    ball starts in our attacker's zone, or in its grabber for penalties.
+    Profiles take turns.
+
+    :return: List of scenario dictionaries for run_scenario
+    """
+    random = np.random.RandomState(seed)
+    # Only the pitch is needed, so a bare episode is enough
+    episode = Episode(our_side=our_side, pitch_num=pitch_num)
+    pitch, world = episode.world.pitch, episode.world
+
+    scenarios = []
+    for index in range(count):
+        placements = {}
+        for name in ['our_attacker', 'their_attacker', 'their_defender']:
+            x, y = _sample_point(pitch, getattr(world, name).zone, random)
+            placements[name] = (x, y, random.uniform(0, 2 * pi))
+        noise = noise_levels[random.randint(len(noise_levels))]
+        scenarios.append({
+            'index': index,
+            'profile': profiles[index % len(profiles)],
+            'our_side': our_side,
+            'pitch_num': pitch_num,
+            'placements': placements,
+            'ball': _sample_point(pitch, world.our_attacker.zone, random,
+                                  margin=ROBOT_LENGTH/4),
+            'noise': noise,
+            'seed': random.randint(2**31 - 1)
+        })
+    return scenarios
+
+
+def _succeeded(episode, profile):
+    """
+    Whether an episode has met the goal of its profile: a goal in their
+    goal, or for ms3 the ball passed into our defender's zone.
+    """
+    simulator, world = episode.simulator, episode.world
+    if profile == 'ms3':
+        return world.pitch.zone_at(*simulator.ball) == \
+            world.our_defender.zone
+    their_end = 'right' if world.our_side == 'left' else 'left'
+    return simulator.goal == their_end
+
+
+def run_scenario(scenario, limit=EPISODE_LIMIT):
+    """
+    Run the episode of a scenario.
+
+    :return: Dictionary of the scenario's index and profile and whether it
+    succeeded, with the outcome of Episode.run
+    """
+    profile = scenario['profile']
+    episode = Episode(profile, scenario['our_side'], scenario['pitch_num'],
+                      noise=scenario['noise'],
+                      angle_noise=scenario['noise'] * ANGLE_NOISE_PER_PX,
+                      seed=scenario['seed'], budget=float('inf'))
+    simulator = episode.simulator
+    for name, (x, y, angle) in scenario['placements'].iteritems():
+        simulator.place(name, x, y, angle)
+    if profile == 'penalty':
+        simulator.give_ball('our_attacker')
+    else:
+        simulator.place('ball', *scenario['ball'])
+
+    result = episode.run(limit, lambda ep: _succeeded(ep, profile))
+    result['success'] = _succeeded(episode, profile)
+    result['index'] = scenario['index']
+    result['profile'] = profile
+    return result
+
+
+def _run_quietly(scenario):
+    # The planner prints as it goes, which would swamp the report
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return run_scenario(scenario)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def run_batch(scenarios, processes=None, quiet=True):
+    """
+    Run scenarios across a pool of processes.
+
+    :param processes: Number of processes, None for one per CPU and 1 to run
+    in this process
+    :param quiet: Discard what the planner prints
+    :return: Results of run_scenario in the order of the scenarios
+    """
+    runner = _run_quietly if quiet else run_scenario
+    if processes == 1:
+        return [runner(scenario) for scenario in scenarios]
+    pool = Pool(processes)
+    try:
+        return pool.map(runner, scenarios, chunksize=4)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def summarize(results):
+    """
+    Aggregate results per profile.
+
+    :return: Dictionary by profile of episodes, success rate, mean
+    time-to-goal of the successful episodes (None if there are none) and
+    mean command count
+    """
+    summary = {}
+    for profile in sorted(set(result['profile'] for result in results)):
+        runs = [result for result in results if result['profile'] == profile]
+        times = [result['time'] for result in runs if result['success']]
+        summary[profile] = {
+            'episodes': len(runs),
+            'success_rate': len(times) / float(len(runs)),
+            'time_to_goal': sum(times) / len(times) if times else None,
+            'commands': sum(result['commands'] for result in runs) /
+            float(len(runs))
+        }
+    return summary
+
+
+def format_report(summary):
+    lines = ['%-10s %8s %8s %12s %9s' % ('profile', 'episodes', 'success',
+                                          'time (s)', 'commands')]
+    for profile, row in sorted(summary.iteritems()):
+        time = '-' if row['time_to_goal'] is None else \
+            '%.2f' % row['time_to_goal']
+        lines.append('%-10s %8d %7.1f%% %12s %9.1f' % (
+            profile, row['episodes'], 100 * row['success_rate'], time,
+            row['commands']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Evaluate planner profiles over random scenarios.')
+    parser.add_argument('--episodes', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--profiles', nargs='+', default=PROFILES,
+                        choices=PROFILES)
+    parser.add_argument('--side', default='left', choices=['left', 'right'])
+    parser.add_argument('--pitch', type=int, default=0, choices=[0, 1])
+    args = parser.parse_args()
+
+    scenarios = make_scenarios(args.episodes, args.seed, args.profiles,
+                               our_side=args.side, pitch_num=args.pitch)
+    print format_report(summarize(run_batch(scenarios, args.processes)))
@@ -0,0 +1,171 @@
+from ..models.models import Vector
+from ..models.world import World, ROBOTS, GRABBERS
+from ..planning.planner import Planner
+from ..robot import Robot
+from simulator import Simulator, SERIAL_DELAY, BALL_FRICTION
+
+# Rate in Hz of the simulated camera, and of planning
+FRAME_RATE = 25
+
+
+class SimulatedLink(object):
+    """
+    Stands in for the pipe to the communicator process. Commands are carried
+    out by the simulator as they are sent and acknowledged once the serial
+    delay has passed in simulated time.
+
+    The angles of turns on the spot go along with their commands, as their
+    ticks alone do not tell which turn calibration they were converted with.
+    """
+
+    def __init__(self, simulator, name, delay=SERIAL_DELAY):
+        self.simulator = simulator
+        self.name = name
+        self.delay = delay
+        self._ack_time = None
+        self.turns = []  # (arguments, rads) of turns made but not yet sent
+
+    def send(self, command):
+        cmd, arguments = command
+        rads = None
+        # Queueing a command rebuilds its tuple but keeps its arguments
+        for i, (turn_arguments, turn_rads) in enumerate(self.turns):
+            if turn_arguments is arguments:
+                rads = turn_rads
+                # Commands are sent in order, turns made earlier were dropped
+                del self.turns[:i + 1]
+                break
+        self.simulator.command(self.name, cmd, arguments, rads)
+        self._ack_time = self.simulator.time + self.delay
+
+    def poll(self):
+        return self._ack_time is not None and \
+            self.simulator.time >= self._ack_time
+
+    def recv(self):
+        self._ack_time = None
+        return self.simulator.state_bits(self.name)
+
+
+class SimulatedRobot(Robot):
+    """
+    Robot controller for a simulated robot. Commands, acks and state bits go
+    through the same code as for the real robot, over a SimulatedLink.
+    """
+
+    def __init__(self, simulator, name='our_attacker', delay=SERIAL_DELAY):
+        """
+        :param simulator: Simulator the robot is in
+        :param name: Name of the simulated robot
+        :param delay: Serial delay in seconds of simulated time
+        """
+        super(SimulatedRobot, self).__init__(comms=False)
+        self.comms = True
+        self.comm_pipe = SimulatedLink(simulator, name, delay)
+        self._update_state_bits(simulator.state_bits(name))
+        self.ready = True
+
+    def _turn_command(self, rads, power=100):
+        command = Robot._turn_command(rads, power)
+        self.comm_pipe.turns.append((command[1], rads))
+        return command
+
+    def teardown(self):
+        self.reset_queued_command()
+        self.waiting_for_ack = False
+
+
+class Episode(object):
+    """
+    A planner playing against the simulator, faster than real time.
+
+    Each tick the simulated camera is read into a World, the planner plans
+    and acts on it, then the simulation is advanced by one frame. Sensor
+    noise can be added to the observed positions.
+    """
+
+    def __init__(self, profile='attacker', our_side='left', pitch_num=0,
+                 frame_rate=FRAME_RATE, noise=0.0, angle_noise=0.0,
+                 friction=BALL_FRICTION, seed=None, budget=None):
+        """
+        :param profile: Planning profile, as for Planner
+        :param our_side: Side of our defender
+        :param pitch_num: Pitch whose croppings give the zones
+        :param frame_rate: Frames per second of simulated time
+        :param noise: Standard deviation of the position noise in px
+        :param angle_noise: Standard deviation of the angle noise in radians
+        :param friction: Decay rate of the ball's speed
+        :param seed: Seed of the sensor noise
+        :param budget: Time limit in seconds of every time-budgeted search in
+        planning (path searches and shot selection), None for their own. An
+        unlimited budget makes runs independent of the speed of the machine.
+        """
+        self.world = World(our_side, pitch_num)
+        for name in ROBOTS:
+            getattr(self.world, name).catcher_area = GRABBERS[name]
+        self.simulator = Simulator(self.world.pitch, our_side, friction, seed)
+        self.robot = SimulatedRobot(self.simulator)
+        self.profile = profile
+        self.frame_time = 1.0 / frame_rate
+        self.noise = noise
+        self.angle_noise = angle_noise
+        self.budget = budget
+        self.ticks = 0
+        self._planner = None
+
+    @property
+    def planner(self):
+        """
+        The planner, created on the first frame so that it starts from the
+        observed positions.
+        """
+        if self._planner is None:
+            self.observe()
+            self._planner = Planner(self.world, self.robot, self.profile)
+        return self._planner
+
+    @property
+    def commands(self):
+        """
+        Number of commands our robot has been sent, other than status
+        requests.
+        """
+        return self.simulator.bodies['our_attacker'].commands
+
+    def observe(self):
+        """
+        Update the world from the simulated camera.
+        """
+        observed = self.simulator.observe(self.noise, self.angle_noise)
+        vectors = dict((name, Vector._unchecked(*values))
+                       for name, values in observed.iteritems())
+        self.world.update_positions(vectors, self.simulator.time)
+
+    def tick(self):
+        planner = self.planner
+        self.observe()
+        if self.budget is not None:
+            self.world.shot_selector.budget = self.budget
+            for strategy in planner.strategies:
+                strategy.path_finder.budget = self.budget
+        planner.plan()
+        self.simulator.step(self.frame_time)
+        self.ticks += 1
+
+    def run(self, seconds, until=None):
+        """
+        Run until a goal is scored, the condition holds or the time is up.
+
+        :param seconds: Limit in seconds of simulated time
+        :param until: Optional function of the episode, True to stop
+        :return: Dictionary of the outcome: 'goal' (side or None), 'time',
+        'ticks' and 'commands'
+        """
+        while self.simulator.time < seconds and \
+                self.simulator.goal is None and \
+                not (until is not None and until(self)):
+            self.tick()
+        return {'goal': self.simulator.goal,
+                'time': self.simulator.time,
+                'ticks': self.ticks,
+                'commands': self.commands}
@@ -0,0 +1,385 @@
+from math import cos, sin, hypot, atan2, exp, pi
+import numpy as np
+
+from ..models.models import CM_PER_PX, BALL_WIDTH, GOAL_WIDTH, \
+    ROBOT_WIDTH, ROBOT_LENGTH
+from ..models.world import ROBOTS, GRABBERS
+from ..robot import WHEEL_BASE, WHEEL_SPEED, DRIVE, OPEN_GRABBER, \
+    CLOSE_GRABBER, KICK, STATUS
+
+# Decay rate (1/s) of the ball's speed from rolling friction
+BALL_FRICTION = 0.8
+# Speed in cm/s below which the ball stops
+BALL_STOP_SPEED = 1.0
+# Fraction of the ball's speed kept when it bounces off a wall or robot
+RESTITUTION = 0.7
+# Speed in cm/s of the ball when kicked at full power
+KICK_SPEED = 150.0
+# Time in seconds from a command being sent to the robot acknowledging it
+SERIAL_DELAY = 0.02
+# Longest step in seconds the physics is advanced by at once
+PHYSICS_STEP = 0.005
+
+
+def ticks_to_cm(ticks):
+    """
+    Wheel distance run for a number of encoder ticks when driving, the
+    inverse of robot.cm_to_ticks.
+    """
+    magnitude = abs(ticks)
+    if magnitude >= 12.095 * 6 - 39.472:
+        cm = (magnitude + 39.472) / 12.095
+    else:
+        cm = max(magnitude - 1, 0) / 4.3018
+    return cm if ticks >= 0 else -cm
+
+
+def ticks_to_rad(ticks, large=None):
+    """
+    Angle turned on the spot for a number of ticks run by each wheel, the
+    inverse of robot.rad_to_ticks.
+
+    The two calibrations of rad_to_ticks overlap, so the ticks of a turn of
+    9 to 16 degrees do not tell on their own which one was followed.
+
+    :param large: Whether the turn was of over 9 degrees, following the
+    calibration of larger turns, defaults to guessing from the ticks
+    """
+    magnitude = abs(ticks)
+    if large is None:
+        large = magnitude > 1.1673 * 9
+    if large:
+        deg = (magnitude + 6.7339) / 1.0652
+    else:
+        deg = magnitude / 1.1673
+    return deg * pi / 180 if ticks >= 0 else -deg * pi / 180
+
+
+class Body(object):
+    """
+    A differential drive robot on the simulated pitch.
+
+    Each wheel runs at a speed set by its motor power until it has covered
+    the distance of its last command. The grabber and kicker run for the
+    time of their commands.
+    """
+
+    def __init__(self, x, y, angle, grabber):
+        """
+        :param x: x in model coordinates (px)
+        :param y: y in model coordinates (px)
+        :param angle: Heading in radians, anticlockwise from the x axis
+        :param grabber: Catcher area dictionary as in GRABBERS
+        """
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.grabber = grabber
+        self.wheel_speeds = [0.0, 0.0]  # Left and right in cm/s
+        self.wheel_left = [0.0, 0.0]  # Distance in cm still to run
+        self.grabber_open = False
+        self.grabber_time = 0.0  # Time the grabber motor still runs
+        self.kick_time = 0.0
+        self.speed = 0.0  # Speed of the centre in cm/s
+        self.commands = 0
+
+    @property
+    def is_moving(self):
+        return any(left > 0 for left in self.wheel_left)
+
+    def drive(self, l_ticks, r_ticks, l_power, r_power, rads=None):
+        """
+        :param rads: Angle of the turn on the spot the ticks were converted
+        from, telling which turn calibration they follow
+        """
+        if l_ticks == -r_ticks and l_ticks != 0:
+            # Turns on the spot follow the turn calibration
+            large = None if rads is None else abs(rads) * 180 / pi > 9
+            distance = ticks_to_rad(l_ticks, large) * WHEEL_BASE / 2
+            distances = [distance, -distance]
+        else:
+            distances = [ticks_to_cm(l_ticks), ticks_to_cm(r_ticks)]
+        for wheel, (distance, power) in \
+                enumerate(zip(distances, [l_power, r_power])):
+            speed = WHEEL_SPEED * min(max(power, 0), 100) / 100.0
+            if distance == 0 or speed == 0:
+                self.wheel_left[wheel] = 0.0
+                self.wheel_speeds[wheel] = 0.0
+            else:
+                self.wheel_left[wheel] = abs(distance)
+                self.wheel_speeds[wheel] = speed if distance > 0 else -speed
+
+    def local(self, x, y):
+        """
+        A point in the body's frame: (distance ahead, distance to the left).
+        """
+        dx, dy = x - self.x, y - self.y
+        c, s = cos(self.angle), sin(self.angle)
+        return dx * c + dy * s, dy * c - dx * s
+
+    def can_catch(self, x, y):
+        along, across = self.local(x, y)
+        start = self.grabber['front_offset']
+        return start <= along <= start + self.grabber['height'] and \
+            abs(across) <= self.grabber['width'] / 2.0
+
+    def catch_point(self):
+        """
+        Where a held ball sits, in the middle of the catcher area.
+        """
+        along = self.grabber['front_offset'] + self.grabber['height'] / 2.0
+        return (self.x + along * cos(self.angle),
+                self.y + along * sin(self.angle))
+
+    def step(self, dt):
+        """
+        Advance the wheels by dt seconds.
+        """
+        distances = [0.0, 0.0]
+        for wheel in range(2):
+            if self.wheel_left[wheel] > 0:
+                run = min(abs(self.wheel_speeds[wheel]) * dt,
+                          self.wheel_left[wheel])
+                self.wheel_left[wheel] -= run
+                distances[wheel] = run if self.wheel_speeds[wheel] > 0 \
+                    else -run
+        left, right = distances
+        forward = (left + right) / 2.0 / CM_PER_PX
+        # Anticlockwise, so a faster left wheel turns right
+        turn = (right - left) / WHEEL_BASE
+        heading = self.angle + turn / 2
+        self.x += forward * cos(heading)
+        self.y += forward * sin(heading)
+        self.angle = (self.angle + turn) % (2 * pi)
+        self.speed = abs(forward) * CM_PER_PX / dt if dt > 0 else 0.0
+
+        self.grabber_time = max(self.grabber_time - dt, 0.0)
+        self.kick_time = max(self.kick_time - dt, 0.0)
+
+
+class Simulator(object):
+    """
+    Headless 2D physics of the four robots and the ball on a pitch.
+
+    The pitch is the model's Pitch, so its zones come from the same
+    croppings as on the real pitch. The ball rolls with exponential
+    friction, bounces off the walls and the robots, and a goal is scored
+    when it crosses either end within the goal mouth. Robots take the same
+    commands as the real robot over a simulated serial link, see
+    SimulatedRobot, and report the same state bits.
+
+    All positions are in model coordinates (px), with y up, angles in
+    radians and times in seconds of simulated time.
+    """
+
+    def __init__(self, pitch, our_side='left', friction=BALL_FRICTION,
+                 seed=None):
+        """
+        :param pitch: Pitch whose zones bound the simulation
+        :param our_side: Side of our defender, 'left' or 'right'
+        :param friction: Decay rate of the ball's speed
+        :param seed: Seed of the sensor noise
+        """
+        self.pitch = pitch
+        self.our_side = our_side
+        self.friction = friction
+        self.random = np.random.RandomState(seed)
+        points = [point for zone in pitch.zones for point in zone[0]]
+        radius = BALL_WIDTH / 2
+        self.left = min(x for x, _ in points)
+        self.right = max(x for x, _ in points)
+        self.bottom = min(y for _, y in points)
+        self.top = max(y for _, y in points)
+        self.radius = radius
+
+        self.time = 0.0
+        self.bodies = {}
+        self.ball = [pitch.width / 2.0, pitch.height / 2.0]
+        self.ball_velocity = [0.0, 0.0]  # px/s
+        self.holder = None  # Name of the robot holding the ball
+        self.goal = None  # 'left' or 'right' once a goal is scored
+
+        for zone, name in enumerate(self.zone_order()):
+            x, y = pitch.zones[zone].center()
+            self.bodies[name] = Body(x, y, 0.0, GRABBERS[name])
+
+    def zone_order(self):
+        """
+        Robot names by zone from left to right.
+        """
+        order = ['our_defender', 'their_attacker', 'our_attacker',
+                 'their_defender']
+        return order if self.our_side == 'left' else order[::-1]
+
+    def place(self, name, x, y, angle=None):
+        """
+        Move a robot or the ball, stopping it.
+        """
+        if name == 'ball':
+            self.ball = [x, y]
+            self.ball_velocity = [0.0, 0.0]
+            self.holder = None
+            return
+        body = self.bodies[name]
+        body.x, body.y = x, y
+        if angle is not None:
+            body.angle = angle % (2 * pi)
+        body.wheel_left = [0.0, 0.0]
+
+    def give_ball(self, name):
+        """
+        Put the ball in a robot's closed grabber.
+        """
+        self.bodies[name].grabber_open = False
+        self.holder = name
+        self.ball = list(self.bodies[name].catch_point())
+        self.ball_velocity = [0.0, 0.0]
+
+    def roll_ball(self, speed, angle):
+        """
+        Set the ball rolling at speed cm/s in direction angle.
+        """
+        self.holder = None
+        self.ball_velocity = [speed / CM_PER_PX * cos(angle),
+                              speed / CM_PER_PX * sin(angle)]
+
+    def command(self, name, cmd, arguments, rads=None):
+        """
+        Carry out a robot command.
+
+        :param name: Robot the command is for
+        :param cmd: Command string, as in pc.robot
+        :param arguments: Argument strings
+        :param rads: Angle given to Robot.turn for a turn on the spot
+        """
+        body = self.bodies[name]
+        values = [float(arg) for arg in arguments]
+        if cmd != STATUS:
+            body.commands += 1
+        if cmd == DRIVE:
+            body.drive(*values, rads=rads)
+        elif cmd == OPEN_GRABBER:
+            body.grabber_time = values[0] / 1000.0
+            body.grabber_open = True
+            if self.holder == name:
+                self.holder = None  # The ball drops in front of the robot
+        elif cmd == CLOSE_GRABBER:
+            body.grabber_time = values[0] / 1000.0
+            body.grabber_open = False
+            if self.holder is None and body.can_catch(*self.ball):
+                self.holder = name
+                self.ball_velocity = [0.0, 0.0]
+        elif cmd == KICK:
+            body.kick_time = values[0] / 1000.0
+            if body.grabber_open and self.holder is None and \
+                    body.can_catch(*self.ball):
+                self.roll_ball(KICK_SPEED * values[1] / 100.0, body.angle)
+
+    def state_bits(self, name):
+        """
+        The state part of the robot's ack string.
+        """
+        body = self.bodies[name]
+        return ''.join('1' if bit else '0' for bit in [
+            body.grabber_open, body.grabber_time > 0, body.is_moving,
+            body.kick_time > 0,
+            # The ball sensor is pressed by a ball in the catcher area
+            self.holder == name or body.can_catch(*self.ball)])
+
+    def _clamp(self, body):
+        margin = hypot(ROBOT_WIDTH, ROBOT_LENGTH) / 2
+        body.x = min(max(body.x, self.left + margin), self.right - margin)
+        body.y = min(max(body.y, self.bottom + margin), self.top - margin)
+
+    def _bounce_off_robots(self):
+        x, y = self.ball
+        for body in self.bodies.values():
+            along, across = body.local(x, y)
+            depth_along = ROBOT_LENGTH / 2 + self.radius - abs(along)
+            depth_across = ROBOT_WIDTH / 2 + self.radius - abs(across)
+            if depth_along <= 0 or depth_across <= 0:
+                continue
+            c, s = cos(body.angle), sin(body.angle)
+            vx, vy = self.ball_velocity
+            v_along, v_across = vx * c + vy * s, vy * c - vx * s
+            # Push out along the shallower side and reflect
+            if depth_along < depth_across:
+                along += depth_along if along > 0 else -depth_along
+                if v_along * along < 0:
+                    v_along *= -RESTITUTION
+            else:
+                across += depth_across if across > 0 else -depth_across
+                if v_across * across < 0:
+                    v_across *= -RESTITUTION
+            self.ball = [body.x + along * c - across * s,
+                         body.y + along * s + across * c]
+            self.ball_velocity = [v_along * c - v_across * s,
+                                  v_along * s + v_across * c]
+
+    def _move_ball(self, dt):
+        if self.holder is not None:
+            self.ball = list(self.bodies[self.holder].catch_point())
+            self.ball_velocity = [0.0, 0.0]
+            return
+
+        decay = exp(-self.friction * dt)
+        self.ball_velocity = [v * decay for v in self.ball_velocity]
+        if hypot(*self.ball_velocity) * CM_PER_PX < BALL_STOP_SPEED:
+            self.ball_velocity = [0.0, 0.0]
+            return
+
+        self.ball[0] += self.ball_velocity[0] * dt
+        self.ball[1] += self.ball_velocity[1] * dt
+        for axis, low, high in [(1, self.bottom, self.top),
+                                (0, self.left, self.right)]:
+            low, high = low + self.radius, high - self.radius
+            if low <= self.ball[axis] <= high:
+                continue
+            if axis == 0 and abs(self.ball[1] - self.pitch.height / 2.0) < \
+                    GOAL_WIDTH / 2:
+                self.goal = 'left' if self.ball[0] < low else 'right'
+                self.ball_velocity = [0.0, 0.0]
+                return
+            edge = low if self.ball[axis] < low else high
+            self.ball[axis] = 2 * edge - self.ball[axis]
+            self.ball_velocity[axis] *= -RESTITUTION
+        self._bounce_off_robots()
+
+    def step(self, dt):
+        """
+        Advance the simulation by dt seconds.
+        """
+        while dt > 1e-9:
+            step = min(dt, PHYSICS_STEP)
+            for body in self.bodies.values():
+                body.step(step)
+                self._clamp(body)
+            if self.goal is None:
+                self._move_ball(step)
+            self.time += step
+            dt -= step
+
+    def observe(self, noise=0.0, angle_noise=0.0):
+        """
+        The positions as vision and postprocessing would give them.
+
+        :param noise: Standard deviation of the position noise in px
+        :param angle_noise: Standard deviation of the angle noise in radians
+        :return: Dictionary of (x, y, angle, velocity) tuples by name, with
+        velocities in cm/s and the ball's angle its direction of motion
+        """
+        def jitter(scale):
+            return self.random.normal(0, scale) if scale > 0 else 0.0
+
+        observed = {}
+        for name in ROBOTS:
+            body = self.bodies[name]
+            observed[name] = (body.x + jitter(noise), body.y + jitter(noise),
+                              (body.angle + jitter(angle_noise)) % (2 * pi),
+                              body.speed)
+        vx, vy = self.ball_velocity
+        observed['ball'] = (self.ball[0] + jitter(noise),
+                            self.ball[1] + jitter(noise),
+                            atan2(vy, vx) % (2 * pi),
+                            hypot(vx, vy) * CM_PER_PX)
+        return observed
@@ -0,0 +1,172 @@
+import argparse
+import time
+from Queue import Queue
+
+import cv2
+import numpy as np
+
+import tools
+from engines import KINDS, DEFAULT_ENGINES, get_engine_names
+from preprocessing import Preprocessor
+from vision import Vision
+
+# Detections of two engines closer than this (px) agree with each other
+AGREEMENT_PX = 5.0
+
+
+def read_frames(filename, pitch=0, raw=False, limit=None):
+    """
+    Read the frames of a recorded session.
+
+    :param filename: Video file of the session
+    :param pitch: Pitch the session was recorded on
+    :param raw: True if the frames are straight from the capture card, in
+    which case they are undistorted and cropped as Camera.get_frame does
+    :param limit: Maximum number of frames to read
+    :return: List of (frame, frame_hsv) tuples
+    """
+    capture = cv2.VideoCapture(filename)
+    preprocessor = Preprocessor(region=tools.get_lighting_region(pitch))
+
+    if raw:
+        crop_values = tools.get_crop_extremes(pitch)
+
+    frames = []
+    while limit is None or len(frames) < limit:
+        status, frame = capture.read()
+        if not status:
+            break
+        if raw:
+            height, width = frame.shape[:2]
+            map1, map2 = tools.get_undistort_maps((width, height), pitch)
+            frame = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
+            frame = tools.crop(frame, crop_values)
+        frames.append(preprocessor.process(frame))
+    capture.release()
+    return frames
+
+
+def run_engine(kind, name, frames, pitch, colour, side, calibration):
+    """
+    Run one engine over the frames in order, one tracker at a time.
+
+    :return: (times, detections) - the time in seconds spent on each frame,
+    and per frame a list of (x, y) or None for each object tracked
+    """
+    height, width, _ = frames[0][0].shape
+    vision = Vision(pitch, colour, side, frames[0][0].shape,
+                    (width / 2, height / 2), calibration,
+                    perspective_correction=False, engines={kind: name})
+    trackers = vision.trackers[:4] if kind == 'robot' else \
+        vision.trackers[4:]
+    queue = Queue()
+
+    times = []
+    detections = []
+    for frame, frame_hsv in frames:
+        found = []
+        start = time.time()
+        for tracker in trackers:
+            tracker.find(frame, queue, frame_hsv)
+            result = queue.get()
+            tracker.update(result)
+            if result is not None and result['x'] is not None:
+                found.append((result['x'], result['y']))
+            else:
+                found.append(None)
+        times.append(time.time() - start)
+        detections.append(found)
+    return np.array(times), detections
+
+
+def get_agreement(detections, reference):
+    """
+    Fraction of objects over all frames on which two engines agree: either
+    both miss the object or both find it within AGREEMENT_PX.
+    """
+    agreed = total = 0
+    for found, expected in zip(detections, reference):
+        for a, b in zip(found, expected):
+            total += 1
+            if a is None or b is None:
+                agreed += a is None and b is None
+            elif np.hypot(a[0] - b[0], a[1] - b[1]) <= AGREEMENT_PX:
+                agreed += 1
+    return float(agreed) / total if total else 0.0
+
+
+def get_detection_rate(detections):
+    found = [d for frame in detections for d in frame]
+    return float(sum(d is not None for d in found)) / len(found)
+
+
+def benchmark(frames, pitch, colour, side, calibration):
+    """
+    Run every registered engine over the same frames.
+
+    :return: Dictionary of {kind: {name: results}}
+    """
+    report = {}
+    for kind in KINDS:
+        report[kind] = {}
+        names = get_engine_names(kind)
+        runs = dict((name, run_engine(kind, name, frames, pitch, colour,
+                                      side, calibration))
+                    for name in names)
+        _, reference = runs[DEFAULT_ENGINES[kind]]
+        for name in names:
+            times, detections = runs[name]
+            times_ms = times * 1000
+            report[kind][name] = {
+                'fps': 1.0 / times.mean() if times.mean() > 0 else
+                float('inf'),
+                'p50_ms': np.percentile(times_ms, 50),
+                'p90_ms': np.percentile(times_ms, 90),
+                'p99_ms': np.percentile(times_ms, 99),
+                'detection_rate': get_detection_rate(detections),
+                'agreement': get_agreement(detections, reference)
+            }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the registered detection engines on a recorded '
+                    'session.')
+    parser.add_argument('video', help='Video file of the recorded session')
+    parser.add_argument('--pitch', type=int, default=0,
+                        help='Pitch the session was recorded on')
+    parser.add_argument('--colour', default='yellow',
+                        help='Our plate colour in the session')
+    parser.add_argument('--side', default='left',
+                        help="Our defender's side in the session")
+    parser.add_argument('--raw', action='store_true',
+                        help='Undistort and crop frames as the camera does')
+    parser.add_argument('--frames', type=int, default=None,
+                        help='Maximum number of frames to use')
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.pitch, args.raw, args.frames)
+    if not frames:
+        print 'No frames read from %s' % args.video
+        return
+
+    calibration = tools.get_colors(args.pitch)
+    report = benchmark(frames, args.pitch, args.colour, args.side,
+                       calibration)
+
+    print 'Frames: %d' % len(frames)
+    print '%-6s %-16s %9s %8s %8s %8s %9s %9s' % (
+        'kind', 'engine', 'fps', 'p50 ms', 'p90 ms', 'p99 ms', 'detected',
+        'agreement')
+    for kind in KINDS:
+        for name in sorted(report[kind]):
+            result = report[kind][name]
+            print '%-6s %-16s %9.1f %8.2f %8.2f %8.2f %8.1f%% %8.1f%%' % (
+                kind, name, result['fps'], result['p50_ms'],
+                result['p90_ms'], result['p99_ms'],
+                result['detection_rate'] * 100, result['agreement'] * 100)
+
+
+if __name__ == '__main__':
+    main()
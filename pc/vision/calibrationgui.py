@@ -53,7 +53,7 @@ class CalibrationGUI(object):
         self.color = color
         self.set_window()
 
-    def show(self, frame, key_event, key=None):
+    def show(self, frame, key_event, key=None, frame_hsv=None):
         if key_event:
             try:
                 self.change_color(KEYS[key])
@@ -80,7 +80,7 @@ class CalibrationGUI(object):
         self.calibration[self.color]['brightness'] = values['BR']
         self.calibration[self.color]['blur'] = values['BL']
 
-        mask = self.get_mask(frame)
+        mask = self.get_mask(frame, frame_hsv)
 
         # Convert the image to Tkinter format, and display
         img = Image.fromarray(cv2.cvtColor(mask, cv2.COLOR_GRAY2RGBA))
@@ -89,18 +89,21 @@ class CalibrationGUI(object):
         self.wrapper.calibration_frame.configure(image=img_tk)
 
     # Duplicated from tracker.py
-    def get_mask(self, frame):
+    def get_mask(self, frame, frame_hsv=None):
         blur = self.calibration[self.color]['blur']
         if blur > 1:
             if blur % 2 == 0:
                 blur -= 1
             frame = cv2.GaussianBlur(frame, (blur, blur), 0)
+            frame_hsv = None
 
         brightness = self.calibration[self.color]['brightness']
         if brightness > 1.0:
             frame = cv2.add(frame, np.array([brightness]))
+            frame_hsv = None
 
-        frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        if frame_hsv is None:
+            frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
 
         min_hsv_color = self.calibration[self.color]['hsv_min']
         max_hsv_color = self.calibration[self.color]['hsv_max']
@@ -1,4 +1,5 @@
 import cv2
+import time
 import tools
 
 
@@ -8,8 +9,7 @@ class Camera(object):
     """
     def __init__(self, pitch, video_src=0, options=None):
         self.capture = cv2.VideoCapture(video_src)
-        calibration = tools.get_croppings(pitch=pitch)
-        self.crop_values = tools.find_extremes(calibration['outline'])
+        self.crop_values = tools.get_crop_extremes(pitch)
 
         # Set defaults
         self.options = {
@@ -23,14 +23,14 @@ class Camera(object):
                 if key in self.options:
                     self.options[key] = options[key]
 
-        # Radial distortion parameters
-        radial_data = tools.get_radial_data()
-        self.nc_matrix = radial_data['new_camera_matrix']
-        self.c_matrix = radial_data['camera_matrix']
-        self.dist = radial_data['dist']
+        # Radial distortion remap tables, fetched for the frame size of the
+        # first frame
+        self.undistort_maps = None
 
         # Cache previous frame in case of feed disruption
         self.current_frame = None
+        # Capture time of the last frame returned, in seconds
+        self.timestamp = None
         # Throw away some frames, the first few are usually corrupt
         for i in range(0,10):
             status, self.current_frame = self.capture.read()
@@ -42,6 +42,7 @@ class Camera(object):
         """
         status, frame = self.capture.read()
         if status:  # If a frame is received, process and return it
+            self.timestamp = time.time()
             if self.options['fix_radial_distortion']:  # Fix radial distortion
                 frame = self.fix_radial_distortion(frame)
             if self.options['crop']:  # Crop the frame
@@ -57,8 +58,11 @@ class Camera(object):
                 return self.current_frame
 
     def fix_radial_distortion(self, frame):
-        return cv2.undistort(
-            frame, self.c_matrix, self.dist, None, self.nc_matrix)
+        if self.undistort_maps is None:
+            height, width = frame.shape[:2]
+            self.undistort_maps = tools.get_undistort_maps((width, height))
+        return cv2.remap(frame, self.undistort_maps[0],
+                         self.undistort_maps[1], cv2.INTER_LINEAR)
 
     def get_adjusted_center(self):
         return 320 - self.crop_values[0], 240 - self.crop_values[2]
@@ -0,0 +1,70 @@
+"""
+Registry of detection engines for the robots and the ball.
+
+An engine is a Tracker subclass registered under a name for an object kind.
+Engines of a kind must take the same constructor arguments as the built-in
+engine of that kind:
+
+    robot:  (colour, crop, offset, pitch, name, calibration) - RobotTracker
+    ball:   (crop, offset, calibration)                      - BallTracker
+
+Register new engines with the decorator:
+
+    @register_engine('ball', 'my_engine')
+    class MyBallTracker(BallTracker):
+        ...
+"""
+
+KINDS = ['robot', 'ball']
+
+# The engines used when nothing else is configured, also the reference
+# engines that others are compared against when benchmarking.
+DEFAULT_ENGINES = {'robot': 'threshold', 'ball': 'threshold'}
+
+_ENGINES = dict((kind, {}) for kind in KINDS)
+
+
+def register_engine(kind, name):
+    """
+    Class decorator registering a tracker class as an engine.
+
+    :param kind: Kind of object the engine detects, one of KINDS
+    :param name: Name to select the engine by
+    """
+    if kind not in KINDS:
+        raise ValueError('Unknown engine kind: %s' % kind)
+
+    def register(cls):
+        _ENGINES[kind][name] = cls
+        return cls
+    return register
+
+
+def get_engine(kind, name):
+    """
+    Get the tracker class registered under name for the given kind.
+    """
+    try:
+        return _ENGINES[kind][name]
+    except KeyError:
+        raise ValueError('No %s engine registered as %s' % (kind, name))
+
+
+def get_engine_names(kind):
+    """
+    Get the names of all engines registered for the given kind.
+    """
+    return sorted(_ENGINES[kind])
+
+
+def get_engine_config(engines=None):
+    """
+    Fill in a (possibly partial) {kind: name} engine configuration with the
+    defaults, checking that every engine is registered.
+    """
+    config = dict(DEFAULT_ENGINES)
+    if engines is not None:
+        config.update(engines)
+    for kind in KINDS:
+        get_engine(kind, config[kind])
+    return config
@@ -0,0 +1,191 @@
+import cv2
+import numpy as np
+
+# Percentiles of the reference region matched by the lighting compensation
+LIGHTING_PERCENTILES = (10, 90)
+# Limits on the per-channel gain of the lighting compensation
+MIN_GAIN = 0.5
+MAX_GAIN = 2.0
+
+
+class ContrastStage(object):
+    """
+    CLAHE contrast enhancement of the luminance (HSV value) channel.
+
+    The CLAHE object is kept between frames and only rebuilt when the clip
+    limit or tile size (the C1/C2 sliders) change.
+    """
+
+    def __init__(self):
+        self._clahe = None
+        self._settings = None
+
+    def get_clahe(self, clip_limit, tile_size):
+        """
+        Get the CLAHE object for the given settings, creating it only if the
+        settings have changed since the last call.
+
+        :param clip_limit: Contrast clip limit, values below 1 are raised to 1
+        :param tile_size: Size of the square tile grid, values below 1 are
+        raised to 1
+        """
+        settings = (max(1.0, float(clip_limit)), max(1, int(tile_size)))
+        if settings != self._settings:
+            self._clahe = cv2.createCLAHE(clipLimit=settings[0],
+                                          tileGridSize=(settings[1],
+                                                        settings[1]))
+            self._settings = settings
+        return self._clahe
+
+    def apply(self, frame_hsv, clip_limit, tile_size):
+        """
+        Enhance the value channel of an HSV frame.
+
+        :return: New HSV frame with the value channel equalised
+        """
+        hue, saturation, value = cv2.split(frame_hsv)
+        value = self.get_clahe(clip_limit, tile_size).apply(value)
+        return cv2.merge((hue, saturation, value))
+
+
+class LightingCompensation(object):
+    """
+    Compensation of lighting drift over a session.
+
+    Every few frames the low and high percentiles of each channel are measured
+    in a fixed reference region of the pitch, and a per-channel gain and
+    offset mapping them back onto the reference percentiles is baked into a
+    lookup table. The reference is stored in the calibration under 'lighting'
+    together with its region, so that it is saved with the thresholds it was
+    tuned with and is measured in the same place in later sessions.
+    """
+
+    def __init__(self, calibration=None, region=None, interval=30):
+        """
+        :param calibration: Calibration dictionary holding the reference
+        percentiles, which are taken from the first frame if not present
+        :param region: Reference region (x_min, x_max, y_min, y_max) of the
+        frame, such as tools.get_lighting_region, used when the calibration
+        has no reference yet. Defaults to the whole frame.
+        :param interval: Number of frames between updates of the correction
+        """
+        self.calibration = calibration if calibration is not None else {}
+        self._region = region
+        self.interval = interval
+        self._lut = None
+        self._frames = 0
+
+    @property
+    def reference(self):
+        return self.calibration.get('lighting')
+
+    @property
+    def region(self):
+        """
+        Region of the reference, or the one given if there is none yet.
+        """
+        if self.reference is not None and \
+                self.reference.get('region') is not None:
+            return self.reference['region']
+        return self._region
+
+    def reset(self):
+        """
+        Take the reference again from the next frame.
+        """
+        self.calibration.pop('lighting', None)
+        self._lut = None
+        self._frames = 0
+
+    def get_percentiles(self, frame):
+        """
+        Measure the low and high percentiles of each channel in the reference
+        region, subsampled to keep the measurement cheap.
+        """
+        if self.region is not None:
+            x_min, x_max, y_min, y_max = self.region
+            frame = frame[y_min:y_max, x_min:x_max]
+        pixels = frame[::4, ::4].reshape(-1, frame.shape[2])
+        low, high = np.percentile(pixels, LIGHTING_PERCENTILES, axis=0)
+        return low, high
+
+    def update(self, frame):
+        """
+        Re-estimate the gain and offset of each channel and rebuild the lookup
+        table.
+        """
+        low, high = self.get_percentiles(frame)
+        if self.reference is None:
+            region = None if self._region is None else \
+                [int(v) for v in self._region]
+            self.calibration['lighting'] = {'low': [float(v) for v in low],
+                                            'high': [float(v) for v in high],
+                                            'region': region}
+            self._lut = None
+            return
+
+        ref_low = np.array(self.reference['low'])
+        ref_high = np.array(self.reference['high'])
+        gain = (ref_high - ref_low) / np.maximum(high - low, 1.0)
+        gain = np.clip(gain, MIN_GAIN, MAX_GAIN)
+        offset = ref_low - gain * low
+
+        values = np.arange(256).reshape(256, 1) * gain + offset
+        self._lut = np.clip(values, 0, 255).astype(np.uint8) \
+            .reshape(256, 1, len(gain))
+
+    def apply(self, frame):
+        """
+        Correct the frame with the current lookup table, updating the table
+        every interval frames.
+        """
+        if self._frames % self.interval == 0:
+            self.update(frame)
+        self._frames += 1
+
+        if self._lut is None:
+            return frame
+        return cv2.LUT(frame, self._lut)
+
+
+class Preprocessor(object):
+    """
+    Shared per-frame preprocessing for the vision system and the GUIs.
+
+    Produces the BGR frame together with its HSV conversion so that the
+    trackers and the calibration GUI do not have to convert it again.
+    """
+
+    def __init__(self, calibration=None, region=None):
+        """
+        :param calibration: Calibration dictionary, used to store the lighting
+        reference
+        :param region: Reference region of the lighting compensation
+        """
+        self.contrast = ContrastStage()
+        self.lighting = LightingCompensation(calibration, region)
+
+    def process(self, frame, contrast=None, lighting=False):
+        """
+        Run the frame through the enabled stages.
+
+        :param frame: BGR frame from the camera
+        :param contrast: None to skip contrast enhancement, otherwise a
+        (clip_limit, tile_size) tuple
+        :param lighting: Compensate lighting drift
+        :return: (frame, frame_hsv) - the processed BGR frame and its HSV
+        conversion
+        """
+        if frame is None:
+            return None, None
+
+        if lighting:
+            frame = self.lighting.apply(frame)
+
+        frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+
+        if contrast is not None:
+            frame_hsv = self.contrast.apply(frame_hsv, *contrast)
+            frame = cv2.cvtColor(frame_hsv, cv2.COLOR_HSV2BGR)
+
+        return frame, frame_hsv
@@ -4,8 +4,12 @@ import json
 import socket
 import os
 import cPickle
+import copy
+import hashlib
 
 PATH = os.path.dirname(os.path.realpath(__file__))
+# Directory of the binary sidecars of artefacts derived from calibrations
+CACHE_PATH = PATH + '/calibrations/cache'
 BLACK = (0, 0, 0)
 
 # HSV Colors
@@ -22,40 +26,186 @@ YELLOW_LOWER = np.array([9, 50, 50])
 YELLOW_HIGHER = np.array([11, 255, 255])
 
 PITCHES = ['Pitch_0', 'Pitch_1']
+# Width in px of the reference band of the lighting compensation
+LIGHTING_BAND = 16
+
+
+class CalibrationStore(object):
+    """
+    Calibration files and the artefacts derived from them, loaded once per
+    process and shared by every consumer.
+
+    Files are read and parsed on first use and kept until they are written
+    through write_json. Derived artefacts that are expensive to compute, such
+    as the undistortion remap tables, are also cached on disk in sidecar files
+    under CACHE_PATH, keyed by a hash of the content they were derived from.
+    """
+
+    def __init__(self):
+        self._files = {}     # filename -> (parsed content, content hash)
+        self._derived = {}   # key -> derived artefact
+
+    def _load(self, filename, parse):
+        if filename not in self._files:
+            _file = open(filename, 'rb')
+            raw = _file.read()
+            _file.close()
+            self._files[filename] = (parse(raw), hashlib.md5(raw).hexdigest())
+        return self._files[filename]
+
+    def invalidate(self, filename):
+        """
+        Forget a file and everything derived from it, e.g. after writing it.
+        """
+        self._files.pop(filename, None)
+        for key in [key for key in self._derived if key[1] == filename]:
+            del self._derived[key]
+
+    def get_json(self, filename):
+        return self._load(filename, json.loads)[0]
+
+    def get_pickle(self, filename):
+        return self._load(filename, cPickle.loads)[0]
+
+    def get_hash(self, filename):
+        return self._files[filename][1]
+
+    def derive(self, name, filename, args, compute):
+        """
+        Get an artefact derived from a file, computing it only once.
+
+        :param name: Name of the artefact
+        :param filename: File the artefact is derived from
+        :param args: Hashable arguments the artefact depends on
+        :param compute: Function computing the artefact from the arguments
+        """
+        key = (name, filename, args)
+        if key not in self._derived:
+            self._derived[key] = compute(*args)
+        return self._derived[key]
+
+    def get_sidecar(self, name, filename, args, compute):
+        """
+        Like derive, but also cache the arrays returned by compute on disk,
+        keyed by the file's content hash and the arguments.
+
+        :param compute: Function returning a tuple of numpy arrays
+        """
+        def load_or_compute(*args):
+            key = hashlib.md5(self.get_hash(filename) + repr(args)) \
+                .hexdigest()
+            sidecar = os.path.join(CACHE_PATH, '%s_%s.npz' % (name, key))
+            if os.path.exists(sidecar):
+                arrays = np.load(sidecar)
+                return tuple(arrays['arr_%d' % i]
+                             for i in range(len(arrays.files)))
+            arrays = compute(*args)
+            try:
+                if not os.path.isdir(CACHE_PATH):
+                    os.makedirs(CACHE_PATH)
+                np.savez(sidecar, *arrays)
+            except (IOError, OSError):
+                print 'Could not cache %s in %s' % (name, CACHE_PATH)
+            return arrays
+        return self.derive(name, filename, args, load_or_compute)
+
+
+# The store shared by everything in the process
+STORE = CalibrationStore()
 
 
 def get_zones(width, height,
               filename=PATH+'/calibrations/croppings.json', pitch=0):
-    calibration = get_croppings(filename, pitch)
-    zones_poly = [calibration[key] for key in ['Zone_0', 'Zone_1',
-                                               'Zone_2', 'Zone_3']]
+    def compute(width, height, pitch):
+        calibration = get_croppings(filename, pitch)
+        zones_poly = [calibration[key] for key in ['Zone_0', 'Zone_1',
+                                                   'Zone_2', 'Zone_3']]
 
-    maxes = [max(zone, key=lambda x: x[0])[0] for zone in zones_poly[:3]]
-    mins = [min(zone, key=lambda x: x[0])[0] for zone in zones_poly[1:]]
-    mids = [(maxes[i] + mins[i]) / 2 for i in range(3)]
-    mids.append(0)
-    mids.append(width)
-    mids.sort()
-    return [(mids[i], mids[i+1], 0, height) for i in range(4)]
+        maxes = [max(zone, key=lambda x: x[0])[0] for zone in zones_poly[:3]]
+        mins = [min(zone, key=lambda x: x[0])[0] for zone in zones_poly[1:]]
+        mids = [(maxes[i] + mins[i]) / 2 for i in range(3)]
+        mids.append(0)
+        mids.append(width)
+        mids.sort()
+        return [(mids[i], mids[i+1], 0, height) for i in range(4)]
+
+    return list(STORE.derive('zones', filename, (width, height, pitch),
+                             compute))
 
 
 def get_croppings(filename=PATH+'/calibrations/croppings.json', pitch=0):
-    croppings = get_json(filename)
+    """
+    Get the croppings of a pitch. Shared between all callers, so must not be
+    modified.
+    """
+    croppings = STORE.get_json(filename)
     return croppings[PITCHES[pitch]]
 
 
+def get_crop_extremes(pitch=0, filename=PATH+'/calibrations/croppings.json'):
+    """
+    Get the (left, right, top, bottom) extremes of the pitch outline.
+    """
+    outline = get_croppings(filename, pitch)['outline']
+    return STORE.derive('extremes', filename, (pitch,),
+                        lambda pitch: find_extremes(outline))
+
+
+def get_lighting_region(pitch=0,
+                        filename=PATH+'/calibrations/croppings.json',
+                        band=LIGHTING_BAND):
+    """
+    Get the reference region of the lighting compensation, in cropped frame
+    coordinates: a band of bare pitch on the halfway line between the
+    attacker zones, over the middle half of its height. No robot is allowed
+    to stand there, so only the ball ever crosses it.
+
+    :return: (x_min, x_max, y_min, y_max)
+    """
+    croppings = get_croppings(filename, pitch)
+    left = max(x for x, _ in croppings['Zone_1'])
+    right = min(x for x, _ in croppings['Zone_2'])
+    ys = [y for key in ['Zone_1', 'Zone_2'] for _, y in croppings[key]]
+    top, bottom = min(ys), max(ys)
+    middle = (left + right) / 2
+    return (middle - band / 2, middle + band / 2,
+            top + (bottom - top) / 4, bottom - (bottom - top) / 4)
+
+
 def get_json(filename=PATH+'/calibrations/calibrations.json'):
-    _file = open(filename, 'r')
-    content = json.loads(_file.read())
-    _file.close()
-    return content
+    """
+    Get the content of a JSON file. The caller gets its own copy that it is
+    free to modify.
+    """
+    return copy.deepcopy(STORE.get_json(filename))
 
 
 def get_radial_data(pitch=0, filename=PATH+'/calibrations/undistort.txt'):
-    _file = open(filename, 'r')
-    data = cPickle.load(_file)
-    _file.close()
-    return data[pitch]
+    """
+    Get the camera matrices and distortion coefficients of a pitch. Shared
+    between all callers, so must not be modified.
+    """
+    return STORE.get_pickle(filename)[pitch]
+
+
+def get_undistort_maps(size, pitch=0,
+                       filename=PATH+'/calibrations/undistort.txt'):
+    """
+    Get the remap tables that undistort frames of the given size, as
+    cv2.undistort would with the radial data of the pitch.
+
+    :param size: (width, height) of the frames
+    :return: (map1, map2) for cv2.remap
+    """
+    data = get_radial_data(pitch, filename)
+
+    def compute(size, pitch):
+        return cv2.initUndistortRectifyMap(
+            data['camera_matrix'], data['dist'], None,
+            data['new_camera_matrix'], size, cv2.CV_16SC2)
+
+    return STORE.get_sidecar('undistort', filename, (tuple(size), pitch),
+                             compute)
 
 
 def get_colors(pitch=0, filename=PATH+'/calibrations/calibrations.json'):
@@ -124,6 +274,7 @@ def write_json(filename=PATH+'/calibrations/calibrations.json', data={}):
     _file = open(filename, 'w')
     _file.write(json.dumps(data))
     _file.close()
+    STORE.invalidate(filename)
 
 
 def mask_pitch(frame, points):
@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
 from collections import namedtuple
+from engines import register_engine
 import warnings
 
 # Turn off warnings for PolynomialFit
@@ -10,16 +11,26 @@ warnings.simplefilter('ignore', RuntimeWarning)
 # Turning on KMEANS fitting:
 KMEANS = False
 
+# Expected sizes of detected objects in px, used for confidence scores
+PLATE_SIDE = 26.0
+BALL_RADIUS = 5.5
+
+# Confidence factor applied to a plate found without its dot
+NO_DOT_CONFIDENCE = 0.4
+
 BoundingBox = namedtuple('BoundingBox', 'x y width height')
 Center = namedtuple('Center', 'x y')
 
 
 class Tracker(object):
 
-    def get_contours(self, frame, adjustments):
+    def get_contours(self, frame, adjustments, frame_hsv=None):
         """
         Adjust the given frame based on 'min', 'max', 'brightness' and 'blur'
         keys in adjustments dictionary.
+
+        If frame_hsv is given it is used as the HSV conversion of frame, unless
+        blur or brightness adjustments change the frame first.
         """
         try:
             if frame is None:
@@ -29,13 +40,16 @@ class Tracker(object):
                 if blur % 2 == 0:
                     blur -= 1
                 frame = cv2.GaussianBlur(frame, (blur, blur), 0)
+                frame_hsv = None
 
             if adjustments['brightness'] > 1.0:
                 frame = cv2.add(frame,
                                 np.array([float(adjustments['brightness'])]))
+                frame_hsv = None
 
             # Convert frame to HSV
-            frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            if frame_hsv is None:
+                frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
 
             # Create a HSV mask
             hsv_frame_mask = cv2.inRange(frame_hsv, adjustments['hsv_min'], adjustments['hsv_max'])
@@ -67,9 +81,11 @@ class Tracker(object):
     # TODO this function is a mess - probably hacked together at last minute
     # TODO Kernel mask and erosion were left in unused
     # TODO: Used by Ball tracker - REFACTOR
-    def preprocess(self, frame, crop, min_hsv_color, max_hsv_color, min_rgb_color, max_rgb_color, brightness, blur):
+    def preprocess(self, frame, crop, min_hsv_color, max_hsv_color, min_rgb_color, max_rgb_color, brightness, blur, frame_hsv=None):
         # Crop frame
         frame = frame[crop[2]:crop[3], crop[0]:crop[1]]
+        if frame_hsv is not None:
+            frame_hsv = frame_hsv[crop[2]:crop[3], crop[0]:crop[1]]
 
         # Apply simple kernel blur
         # Take a matrix given by second argument and
@@ -78,13 +94,16 @@ class Tracker(object):
             if blur % 2 == 0:
                 blur -= 1
             frame = cv2.GaussianBlur(frame, (blur, blur), 0)
+            frame_hsv = None
 
         # Set Brightness
         if brightness > 1.0:
             frame = cv2.add(frame, np.array([float(brightness)]))
+            frame_hsv = None
 
-        # Convert frame to HSV
-        frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        # Convert frame to HSV, unless the shared conversion is still valid
+        if frame_hsv is None:
+            frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
 
         # Create a HSV mask
         hsv_frame_mask = cv2.inRange(frame_hsv, min_hsv_color, max_hsv_color)
@@ -163,6 +182,21 @@ class Tracker(object):
         """
         return cv2.minEnclosingCircle(contour)
 
+    def get_size_score(self, area, expected_area):
+        """
+        Score in [0, 1] of how close an area is to the expected area.
+        """
+        if area <= 0 or expected_area <= 0:
+            return 0.0
+        return min(area, expected_area) / max(area, expected_area)
+
+    def update(self, result):
+        """
+        Update tracker state in the main process from the result of find.
+        find runs in a subprocess, so any state it changes there is lost.
+        """
+        pass
+
     def get_angle(self, line, dot):
         """
         From dot to line
@@ -173,6 +207,7 @@ class Tracker(object):
         return angle
 
 
+@register_engine('robot', 'threshold')
 class RobotTracker(Tracker):
 
     def __init__(self, colour, crop, offset, pitch, name, calibration):
@@ -199,19 +234,37 @@ class RobotTracker(Tracker):
         self.pitch = pitch
         self.calibration = calibration
 
-    def get_plate(self, frame):
+    def get_plate_contour(self, frame, frame_hsv=None):
         """
-        Given the frame to search, find a bounding rectangle for the green plate
+        Given the frame to search, find the joined contour of the plate.
 
         Returns:
-            list of corner points
+            contour points, or None if no plate is found
         """
         # Adjustments are colors and brightness/blur
         adjustments = self.calibration['plate']
-        contours = self.get_contours(frame.copy(), adjustments)
-        return self.get_contour_corners(self.join_contours(contours))
+        contours = self.get_contours(frame.copy(), adjustments, frame_hsv)
+        if not contours:
+            return None
+        return self.join_contours(contours)
 
-    def get_dot(self, frame, x_offset, y_offset):
+    def get_plate_confidence(self, contour, dot):
+        """
+        Confidence in [0, 1] of a plate detection, from the area and aspect
+        ratio of the plate's minimum area rectangle and whether the dot was
+        found on it.
+        """
+        if contour is None:
+            return 0.0
+        _, (width, height), _ = cv2.minAreaRect(contour)
+        if width <= 0 or height <= 0:
+            return 0.0
+        size_score = self.get_size_score(width * height, PLATE_SIDE ** 2)
+        aspect_score = min(width, height) / max(width, height)
+        dot_score = 1.0 if dot is not None else NO_DOT_CONFIDENCE
+        return size_score * aspect_score * dot_score
+
+    def get_dot(self, frame, x_offset, y_offset, frame_hsv=None):
         """
         Find center point of the black dot on the plate.
 
@@ -230,6 +283,7 @@ class RobotTracker(Tracker):
                         to the final values
             y_offset    The offset from the uncropped image - to be added
                         to the final values
+            frame_hsv   Optional HSV conversion of frame
         """
         # Create dummy mask
         height, width, channel = frame.shape
@@ -244,9 +298,13 @@ class RobotTracker(Tracker):
             # Mask the original image
             mask_frame = cv2.cvtColor(mask_frame, cv2.COLOR_BGR2GRAY)
             frame = cv2.bitwise_and(frame, frame, mask=mask_frame)
+            if frame_hsv is not None:
+                # Black BGR pixels are black in HSV, so the same mask applies
+                frame_hsv = cv2.bitwise_and(frame_hsv, frame_hsv,
+                                            mask=mask_frame)
 
             adjustment = self.calibration['dot']
-            contours = self.get_contours(frame, adjustment)
+            contours = self.get_contours(frame, adjustment, frame_hsv)
 
             if contours and len(contours) > 0:
                 # Take the largest contour
@@ -254,7 +312,7 @@ class RobotTracker(Tracker):
                 (x, y), radius = self.get_contour_centre(contour)
                 return Center(x + x_offset, y + y_offset)
 
-    def find(self, frame, queue):
+    def find(self, frame, queue, frame_hsv=None):
         """
         Retrieve coordinates for the robot, it's orientation and speed - if
         available.
@@ -268,6 +326,7 @@ class RobotTracker(Tracker):
         Params:
             [np.array] frame                - the frame to scan
             [multiprocessing.Queue] queue   - shared resource for process
+            [np.array] frame_hsv            - optional HSV conversion of frame
 
         Returns:
             None. Result is put into the queue.
@@ -279,9 +338,13 @@ class RobotTracker(Tracker):
 
         # Trim the image to only consist of one zone
         frame = frame[self.crop[2]:self.crop[3], self.crop[0]:self.crop[1]]
+        if frame_hsv is not None:
+            frame_hsv = \
+                frame_hsv[self.crop[2]:self.crop[3], self.crop[0]:self.crop[1]]
 
         # (1) Find the plates
-        plate_corners = self.get_plate(frame)
+        plate_contour = self.get_plate_contour(frame, frame_hsv)
+        plate_corners = self.get_contour_corners(plate_contour)
 
         if plate_corners is not None:
             # Find the bounding box
@@ -299,10 +362,18 @@ class RobotTracker(Tracker):
                     plate_bound_box.x:plate_bound_box.x +
                     plate_bound_box.width
                 ]
+                plate_frame_hsv = None
+                if frame_hsv is not None:
+                    plate_frame_hsv = frame_hsv[
+                        plate_bound_box.y:plate_bound_box.y +
+                        plate_bound_box.height,
+                        plate_bound_box.x:plate_bound_box.x +
+                        plate_bound_box.width
+                    ]
 
                 # (3) Search for the dot
                 dot = self.get_dot(plate_frame, plate_bound_box.x + self.offset,
-                                   plate_bound_box.y)
+                                   plate_bound_box.y, plate_frame_hsv)
 
                 if dot is not None:
                     # Since get_dot adds offset, we need to remove it
@@ -363,7 +434,8 @@ class RobotTracker(Tracker):
                 'dot': dot,
                 'box': plate_corners,
                 'direction': direction,
-                'front': front
+                'front': front,
+                'confidence': self.get_plate_confidence(plate_contour, dot)
             })
             return
 
@@ -374,7 +446,8 @@ class RobotTracker(Tracker):
             'dot': None,
             'box': None,
             'direction': None,
-            'front': None
+            'front': None,
+            'confidence': 0.0
         })
         return
 
@@ -396,6 +469,7 @@ class RobotTracker(Tracker):
         return res2
 
 
+@register_engine('ball', 'threshold')
 class BallTracker(Tracker):
     """
     Track red ball on the pitch.
@@ -417,7 +491,22 @@ class BallTracker(Tracker):
         self.name = name
         self.calibration = calibration
 
-    def find(self, frame, queue):
+    def find(self, frame, queue, frame_hsv=None):
+        result = self.detect(frame, frame_hsv)
+        if result is not None:
+            del result['mask'], result['contour']
+        queue.put(result)
+        return
+
+    def detect(self, frame, frame_hsv=None):
+        """
+        Find the ball by thresholding the whole crop.
+
+        Returns:
+            dictionary with the ball position, or None if not found. The
+            threshold mask and largest contour are included under 'mask' and
+            'contour' for engines building on this detector.
+        """
         for color in self.color:
             contours, hierarchy, mask = self.preprocess(
                 frame,
@@ -427,13 +516,13 @@ class BallTracker(Tracker):
                 color['rgb_min'],
                 color['rgb_max'],
                 color['brightness'],
-                color['blur']
+                color['blur'],
+                frame_hsv
             )
 
             if len(contours) <= 0:
                 # print 'No ball found.'
                 pass
-                # queue.put(None)
             else:
                 # Trim contours matrix
                 cnt = self.get_largest_contour(contours)
@@ -441,14 +530,211 @@ class BallTracker(Tracker):
                 # Get center
                 (x, y), radius = cv2.minEnclosingCircle(cnt)
 
-                queue.put({
+                return {
                     'name': self.name,
                     'x': x,
                     'y': y,
                     'angle': None,
-                    'velocity': None
-                })
-                return
+                    'velocity': None,
+                    'confidence': self.get_confidence(cnt, radius),
+                    'radius': radius,
+                    'mask': mask,
+                    'contour': cnt
+                }
+
+        return None
+
+    def get_confidence(self, contour, radius):
+        """
+        Confidence in [0, 1] of a ball detection, from the size of its
+        enclosing circle and how much of that circle the contour fills.
+        """
+        if radius <= 0:
+            return 0.0
+        circle_area = np.pi * radius ** 2
+        size_score = self.get_size_score(circle_area, np.pi * BALL_RADIUS ** 2)
+        fill_score = min(1.0, cv2.contourArea(contour) / circle_area)
+        return size_score * fill_score
+
+
+
+@register_engine('ball', 'backprojection')
+class BackProjectionBallTracker(BallTracker):
+    """
+    Track the ball by histogram back-projection and CamShift inside a window
+    predicted from the previous detections.
+
+    The hue-saturation histogram is learned from confirmed threshold
+    detections. When tracking is lost the threshold detector of BallTracker
+    is used to reacquire the ball.
+    """
+
+    # Histogram bins and ranges over hue and saturation
+    HIST_BINS = [16, 16]
+    HIST_RANGES = [0, 180, 0, 256]
+    # Threshold detections at least this confident update the histogram
+    CONFIRM_CONFIDENCE = 0.5
+    # Weight of a new histogram when blending it into the current one
+    HIST_LEARNING_RATE = 0.2
+    # Search region around the predicted window, as a multiple of its size
+    SEARCH_SCALE = 3
+    # Minimum mean back-projection inside the window to accept a track
+    MIN_BACKPROJECTION = 40
+    # Frames without a track before the prediction is dropped
+    MAX_MISSES = 3
 
-        queue.put(None)
+    def __init__(self, crop, offset, calibration, name='ball'):
+        super(BackProjectionBallTracker, self).__init__(crop, offset,
+                                                        calibration, name)
+        self.histogram = None
+        self.window = None  # (x, y, width, height) in crop coordinates
+        self.velocity = (0, 0)  # Window displacement per frame
+        self.misses = 0
+
+    def find(self, frame, queue, frame_hsv=None):
+        """
+        Track the ball inside the predicted window, falling back to
+        thresholding the whole crop. The new window and any histogram learned
+        from the frame are put on the queue with the position so that update
+        can keep them in the main process.
+        """
+        if frame_hsv is None:
+            frame_hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        crop_hsv = frame_hsv[self.crop[2]:self.crop[3],
+                             self.crop[0]:self.crop[1]]
+
+        result = None
+        if self.histogram is not None and self.window is not None:
+            result = self.track(crop_hsv)
+
+        if result is None:
+            result = self.detect(frame, frame_hsv)
+            if result is not None:
+                result['engine'] = 'threshold'
+                result['histogram'] = self.learn_histogram(crop_hsv, result)
+                result['window'] = self.get_window(result, crop_hsv.shape)
+                del result['mask'], result['contour']
+
+        queue.put(result)
         return
+
+    def get_search_region(self, shape):
+        """
+        Get the region of the crop to search, around the predicted window.
+        """
+        height, width = shape[:2]
+        x, y, w, h = self.window
+        x += self.velocity[0]
+        y += self.velocity[1]
+        margin_x = w * (self.SEARCH_SCALE - 1) / 2
+        margin_y = h * (self.SEARCH_SCALE - 1) / 2
+        left = int(max(0, x - margin_x))
+        top = int(max(0, y - margin_y))
+        right = int(min(width, x + w + margin_x))
+        bottom = int(min(height, y + h + margin_y))
+        return left, top, right, bottom
+
+    def track(self, crop_hsv):
+        """
+        Run CamShift over the back-projection of the search region.
+
+        Returns:
+            dictionary with the ball position, or None if the track is lost.
+        """
+        left, top, right, bottom = self.get_search_region(crop_hsv.shape)
+        if right - left < 2 or bottom - top < 2:
+            return None
+
+        region = crop_hsv[top:bottom, left:right]
+        back_projection = cv2.calcBackProject(
+            [region], [0, 1], self.histogram, self.HIST_RANGES, 1)
+
+        x, y, w, h = self.window
+        start = (int(min(max(0, x + self.velocity[0] - left),
+                         right - left - 1)),
+                 int(min(max(0, y + self.velocity[1] - top),
+                         bottom - top - 1)),
+                 max(1, int(w)), max(1, int(h)))
+        criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 1)
+        (center, size, _), (wx, wy, ww, wh) = \
+            cv2.CamShift(back_projection, start, criteria)
+
+        if ww <= 0 or wh <= 0:
+            return None
+        score = back_projection[wy:wy + wh, wx:wx + ww].mean()
+        if score < self.MIN_BACKPROJECTION:
+            return None
+
+        x, y = center[0] + left, center[1] + top
+        radius = max(size) / 2.0
+        size_score = self.get_size_score(np.pi * radius ** 2,
+                                         np.pi * BALL_RADIUS ** 2)
+        return {
+            'name': self.name,
+            'x': x,
+            'y': y,
+            'angle': None,
+            'velocity': None,
+            'confidence': size_score * score / 255.0,
+            'radius': radius,
+            'engine': 'backprojection',
+            'histogram': None,
+            'window': (wx + left, wy + top, ww, wh)
+        }
+
+    def learn_histogram(self, crop_hsv, detection):
+        """
+        Build a hue-saturation histogram from the masked pixels around a
+        confident threshold detection.
+
+        Returns:
+            the histogram, or None if the detection is not confident enough
+        """
+        if detection['confidence'] < self.CONFIRM_CONFIDENCE:
+            return None
+        x, y, w, h = cv2.boundingRect(detection['contour'])
+        roi = crop_hsv[y:y + h, x:x + w]
+        mask = detection['mask'][y:y + h, x:x + w]
+        histogram = cv2.calcHist([roi], [0, 1], mask, self.HIST_BINS,
+                                 self.HIST_RANGES)
+        cv2.normalize(histogram, histogram, 0, 255, cv2.NORM_MINMAX)
+        return histogram
+
+    def get_window(self, detection, shape):
+        """
+        Tracking window around a detection, clipped to the crop.
+        """
+        height, width = shape[:2]
+        radius = max(detection['radius'], 1)
+        x = int(max(0, detection['x'] - radius))
+        y = int(max(0, detection['y'] - radius))
+        w = int(min(width - x, 2 * radius + 1))
+        h = int(min(height - y, 2 * radius + 1))
+        return x, y, w, h
+
+    def update(self, result):
+        """
+        Keep the tracking window, velocity and histogram from the last find.
+        """
+        if result is None:
+            self.misses += 1
+            if self.misses > self.MAX_MISSES:
+                self.window = None
+                self.velocity = (0, 0)
+            return
+
+        self.misses = 0
+        window = result.pop('window', None)
+        if window is not None and self.window is not None:
+            self.velocity = (window[0] - self.window[0],
+                             window[1] - self.window[1])
+        self.window = window
+
+        histogram = result.pop('histogram', None)
+        if histogram is not None:
+            if self.histogram is None:
+                self.histogram = histogram
+            else:
+                self.histogram = cv2.addWeighted(
+                    self.histogram, 1 - self.HIST_LEARNING_RATE,
+                    histogram, self.HIST_LEARNING_RATE, 0)
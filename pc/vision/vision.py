@@ -1,13 +1,65 @@
 import tools
-from tracker import BallTracker, RobotTracker
+import tracker  # Registers the built-in engines
+from engines import get_engine, get_engine_config
 from multiprocessing import Process, Queue
-from collections import namedtuple
+from collections import namedtuple, deque
 
 
 TEAM_COLOURS = set(['yellow', 'blue'])
 PITCHES = [0, 1]
 PROCESSING_DEBUG = False
 Center = namedtuple('Center', 'x y')
+OBJECT_KEYS = ['our_defender', 'our_attacker', 'their_defender',
+               'their_attacker', 'ball']
+HEALTH_WINDOW = 100  # Number of frames in the rolling health statistics
+
+
+class TrackerHealth(object):
+    """
+    Rolling detection rate and confidence statistics of a single tracker.
+    """
+
+    def __init__(self, window=HEALTH_WINDOW):
+        self._confidences = deque(maxlen=window)
+        self.last_confidence = 0.0
+
+    def update(self, confidence):
+        """
+        Record the confidence of the latest detection, None or 0 if the object
+        was not found.
+        """
+        self.last_confidence = confidence or 0.0
+        self._confidences.append(self.last_confidence)
+
+    @property
+    def detection_rate(self):
+        """
+        Fraction of frames in the window in which the object was found.
+        """
+        if not self._confidences:
+            return 0.0
+        found = sum(1 for c in self._confidences if c > 0)
+        return float(found) / len(self._confidences)
+
+    @property
+    def mean_confidence(self):
+        """
+        Mean confidence of the frames in the window where the object was found.
+        """
+        found = [c for c in self._confidences if c > 0]
+        if not found:
+            return 0.0
+        return sum(found) / len(found)
+
+    def summary(self):
+        return {'detection_rate': self.detection_rate,
+                'mean_confidence': self.mean_confidence,
+                'confidence': self.last_confidence}
+
+    def __repr__(self):
+        return ('detected: %.0f%%, confidence: %.2f (mean %.2f)' %
+                (self.detection_rate * 100, self.last_confidence,
+                 self.mean_confidence))
 
 
 class Vision(object):
@@ -17,7 +69,7 @@ class Vision(object):
 
     def __init__(self, pitch, colour, our_side,
                  frame_shape, frame_center, calibration,
-                 perspective_correction=True):
+                 perspective_correction=True, engines=None):
         """
         Initialize the vision system.
 
@@ -25,6 +77,8 @@ class Vision(object):
             [int] pitch         pitch number (0 or 1)
             [string] colour      color of our robot
             [string] our_side   our side
+            [dict] engines      detection engine name per object kind
+                                ('robot', 'ball'), see engines.py
         """
         self.pitch = pitch
         self.colour = colour
@@ -32,6 +86,9 @@ class Vision(object):
         self.calibration = calibration
         self.frame_center = frame_center
         self.perspective_correction = perspective_correction
+        self.engines = get_engine_config(engines)
+        robot_engine = get_engine('robot', self.engines['robot'])
+        ball_engine = get_engine('ball', self.engines['ball'])
 
         height, width, channels = frame_shape
 
@@ -42,20 +99,20 @@ class Vision(object):
 
         if our_side == 'left':
             self.us = [
-                RobotTracker(
+                robot_engine(
                     colour=colour, crop=zones[0], offset=zones[0][0],
                     pitch=pitch, name='Our Defender', calibration=calibration),
-                RobotTracker(
+                robot_engine(
                     colour=colour, crop=zones[2], offset=zones[2][0],
                     pitch=pitch, name='Our Attacker', calibration=calibration)
             ]
 
             self.opponents = [
-                RobotTracker(
+                robot_engine(
                     colour=self.opponent_color, crop=zones[3], offset=zones[3][0],
                     pitch=pitch, name='Their Defender',
                     calibration=calibration),
-                RobotTracker(
+                robot_engine(
                     colour=self.opponent_color, crop=zones[1], offset=zones[1][0],
                     pitch=pitch, name='Their Attacker',
                     calibration=calibration)
@@ -63,27 +120,38 @@ class Vision(object):
             ]
         else:
             self.us = [
-                RobotTracker(
+                robot_engine(
                     colour=colour, crop=zones[3], offset=zones[3][0],
                     pitch=pitch, name='Our Defender', calibration=calibration),
-                RobotTracker(
+                robot_engine(
                     colour=colour, crop=zones[1], offset=zones[1][0],
                     pitch=pitch, name='Our Attacker', calibration=calibration)
             ]
 
             self.opponents = [
-                RobotTracker(  # defender
+                robot_engine(  # defender
                     colour=self.opponent_color, crop=zones[0], offset=zones[0][0],
                     pitch=pitch, name='Their Defender',
                     calibration=calibration),
-                RobotTracker(  # attacker
+                robot_engine(  # attacker
                     colour=self.opponent_color, crop=zones[2], offset=zones[2][0],
                     pitch=pitch, name='Their Attacker',
                     calibration=calibration)
             ]
 
-        self.ball_tracker = BallTracker(
-            (0, width, 0, height), 0, calibration, pitch)
+        self.ball_tracker = ball_engine(
+            (0, width, 0, height), 0, calibration)
+
+        # Rolling tracker health statistics per object
+        self.health = dict((key, TrackerHealth()) for key in OBJECT_KEYS)
+
+    @property
+    def trackers(self):
+        """
+        The trackers for each object, in the order of OBJECT_KEYS.
+        """
+        return [self.us[0], self.us[1], self.opponents[0],
+                self.opponents[1], self.ball_tracker]
 
     def _get_zones(self, width, height):
         return [(val[0], val[1], 0, height)
@@ -92,26 +160,30 @@ class Vision(object):
     def _get_opponent_colour(self, our_colour):
         return (TEAM_COLOURS - set([our_colour])).pop()
 
-    def locate(self, frame):
+    def locate(self, frame, frame_hsv=None):
         """
         Find objects on the pitch using multiprocessing.
 
+        Params:
+            [np.frame] frame        - frame to run trackers on
+            [np.frame] frame_hsv    - optional shared HSV conversion of frame
+
         Returns:
             [5-tuple] Location of the robots and the ball
         """
         # Run trackers as processes
-        positions = self._run_trackers(frame)
+        positions = self._run_trackers(frame, frame_hsv)
 
         # Correct for perspective
         if self.perspective_correction:
             positions = self.get_adjusted_positions(positions)
 
         # Wrap list of positions into a dictionary
-        keys = ['our_defender', 'our_attacker', 'their_defender',
-                'their_attacker', 'ball']
         regular_positions = dict()
-        for i, key in enumerate(keys):
+        for i, key in enumerate(OBJECT_KEYS):
             regular_positions[key] = positions[i]
+            self.health[key].update(
+                positions[i]['confidence'] if positions[i] else None)
 
         # Error check we got a frame
         height, width, channels = frame.shape \
@@ -127,6 +199,13 @@ class Vision(object):
 
         return model_positions, regular_positions
 
+    def get_health(self):
+        """
+        Returns a dictionary of rolling detection rate and confidence
+        statistics for each object.
+        """
+        return dict((key, self.health[key].summary()) for key in OBJECT_KEYS)
+
     def get_adjusted_point(self, point):
         """
         Given a point on the plane, calculate the adjusted point, by taking
@@ -188,24 +267,25 @@ class Vision(object):
 
         return positions
 
-    def _run_trackers(self, frame):
+    def _run_trackers(self, frame, frame_hsv=None):
         """
         Run trackers as separate processes
 
         Params:
             [np.frame] frame        - frame to run trackers on
+            [np.frame] frame_hsv    - optional shared HSV conversion of frame
 
         Returns:
             [5-tuple] positions     - locations of the robots and the ball
         """
         queues = [Queue() for i in range(5)]
-        objects = [self.us[0], self.us[1], self.opponents[0],
-                   self.opponents[1], self.ball_tracker]
+        objects = self.trackers
 
         # Define processes
         processes = [
             Process(target=obj.find,
-                    args=(frame, queues[i])) for (i, obj) in enumerate(objects)]
+                    args=(frame, queues[i], frame_hsv))
+            for (i, obj) in enumerate(objects)]
 
         # Start processes
         for process in processes:
@@ -219,13 +299,17 @@ class Vision(object):
         for process in processes:
             process.join()
 
+        # Carry tracker state over to the next frame
+        for obj, position in zip(objects, positions):
+            obj.update(position)
+
         return positions
 
     def to_info(self, args, height):
         """
         Returns a dictionary with object position information
         """
-        x, y, angle, velocity = None, None, None, None
+        x, y, angle, velocity, confidence = None, None, None, None, 0.0
         if args is not None:
             if 'x' in args and 'y' in args:
                 x = args['x']
@@ -239,7 +323,11 @@ class Vision(object):
             if 'velocity' in args:
                 velocity = args['velocity']
 
-        return {'x': x, 'y': y, 'angle': angle, 'velocity': velocity}
+            if 'confidence' in args:
+                confidence = args['confidence']
+
+        return {'x': x, 'y': y, 'angle': angle, 'velocity': velocity,
+                'confidence': confidence}
 
 def split_into_rgb_channels(image):
     """
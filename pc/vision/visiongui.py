@@ -3,6 +3,7 @@ from colours import BGR_COMMON
 import numpy as np
 import tools
 import warnings
+from ..models.models import CM_PER_PX
 from PIL import Image, ImageTk
 
 
@@ -46,11 +47,15 @@ class VisionGUI(object):
         return {'x': x, 'y': y, 'angle': angle, 'velocity': velocity}
 
     def draw(self, frame, model_positions, regular_positions,
-             grabbers, fps, our_color, our_side, p_state, s_state, brightness, blur):
+             grabbers, fps, our_color, our_side, p_state, s_state, brightness, blur,
+             health=None):
         """
         Draw information onto the GUI given positions from the vision and
         post processing.
         NOTE: model_positions contains coordinates with y coordinate reversed!
+
+        health is an optional dictionary of tracker health statistics from
+        Vision.get_health().
         """
         # Get general information about the frame
         frame_height, frame_width, channels = frame.shape
@@ -105,7 +110,8 @@ class VisionGUI(object):
                         frame_with_blank, (frame_width, frame_height), our_side,
                         key, model_positions[key].x, model_positions[key].y,
                         model_positions[key].angle,
-                        model_positions[key].velocity)
+                        model_positions[key].velocity,
+                        health[key] if health else None)
                     self.draw_velocity(
                         frame_with_blank, (frame_width, frame_height),
                         model_positions[key].x, model_positions[key].y,
@@ -221,7 +227,7 @@ class VisionGUI(object):
             cv2.line(frame, points[0], points[1], BGR_COMMON['red'], thickness)
 
     def data_text(self, frame, frame_offset, our_side,
-                  text, x, y, angle, velocity):
+                  text, x, y, angle, velocity, health=None):
         if x is not None and y is not None:
             frame_width, frame_height = frame_offset
             if text == "ball":
@@ -256,16 +262,27 @@ class VisionGUI(object):
                 self.draw_text(frame, 'velocity: %.2f' % velocity,
                                draw_x, y_offset + 40)
 
+            if health is not None:
+                self.draw_text(frame, 'detected: %.0f%% conf: %.2f' %
+                               (health['detection_rate'] * 100,
+                                health['mean_confidence']),
+                               draw_x, y_offset + 50)
+
     def draw_text(self, frame, text, x, y,
                   color=BGR_COMMON['green'], thickness=1.3, size=0.3):
         if x is not None and y is not None:
             cv2.putText(frame, text, (int(x), int(y)),
                         cv2.FONT_HERSHEY_SIMPLEX, size, color, thickness)
 
-    def draw_velocity(self, frame, frame_offset, x, y, angle, vel, scale=10):
+    def draw_velocity(self, frame, frame_offset, x, y, angle, vel,
+                      seconds=0.4):
+        """
+        Draw an object's velocity (cm/s) as the line it covers in the given
+        time, 10 frames at 25 fps.
+        """
         if not (None in [frame, x, y, angle, vel]) and vel is not 0:
             frame_width, frame_height = frame_offset
-            r = vel*scale
+            r = vel / CM_PER_PX * seconds
             y = frame_height - y
             start_point = (x, y)
             end_point = (x + r * np.cos(angle), y - r * np.sin(angle))
@@ -1,5 +1,7 @@
 import unittest
-from tests import models_tests, postprocessing_tests, planner_tests, world_tests
+from tests import models_tests, postprocessing_tests, planner_tests, world_tests, \
+	geometry_tests, prediction_tests, robot_tests, simulation_tests, \
+	preprocessing_tests
 '''
 This just aggregates and runs all of the tests from the tests folder
 '''
@@ -9,4 +11,9 @@ if __name__ == "__main__":
 	suite.addTests(unittest.TestLoader().loadTestsFromModule(postprocessing_tests))
 	suite.addTests(unittest.TestLoader().loadTestsFromModule(planner_tests))
 	suite.addTests(unittest.TestLoader().loadTestsFromModule(world_tests))
+	suite.addTests(unittest.TestLoader().loadTestsFromModule(geometry_tests))
+	suite.addTests(unittest.TestLoader().loadTestsFromModule(prediction_tests))
+	suite.addTests(unittest.TestLoader().loadTestsFromModule(robot_tests))
+	suite.addTests(unittest.TestLoader().loadTestsFromModule(simulation_tests))
+	suite.addTests(unittest.TestLoader().loadTestsFromModule(preprocessing_tests))
 	unittest.TextTestRunner(verbosity=2).run(suite)
\ No newline at end of file
@@ -0,0 +1,39 @@
+import unittest
+from math import pi
+import numpy as np
+from numpy.testing import assert_almost_equal
+from pc.models import geometry
+
+
+class TestGeometry(unittest.TestCase):
+    '''
+    Tests the numpy convex geometry.
+    '''
+
+    def test_rectangle(self):
+        corners = geometry.rectangle(10, 10, pi / 2, 4, 2)
+        assert_almost_equal(corners, [(8, 11), (12, 11), (12, 9), (8, 9)])
+
+    def test_order_convex(self):
+        # Front left, front right, back left, back right as in get_polygon
+        ordered = geometry.order_convex([(1, 1), (1, -1), (-1, 1), (-1, -1)])
+        self.assertTrue(geometry.point_in_convex(ordered, (0.9, 0)))
+        self.assertEqual(len(ordered), 4)
+
+    def test_point_in_convex(self):
+        square = geometry.rectangle(0, 0, 0, 2, 2)
+        inside = geometry.point_in_convex(square, [(0, 0), (1, 1), (2, 0)])
+        self.assertEqual(list(inside), [True, True, False])
+
+    def test_overlaps(self):
+        square = geometry.rectangle(0, 0, pi / 4, 2, 2)
+        triangles = np.array([[(0, 0), (5, 0), (5, 5)],
+                              [(1.2, 1.2), (5, 1.2), (5, 5)]])
+        self.assertEqual(list(geometry.overlaps(triangles, square)),
+                         [True, False])
+        self.assertEqual(geometry.overlaps(triangles, [square, square]).shape,
+                         (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
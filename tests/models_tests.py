@@ -70,10 +70,27 @@ class TestVector(unittest.TestCase):
             vec = Vector(2, 5, 0, 5)
             vec.angle = 0
             vec = Vector(2, 5, 2 * pi - 0.1, 0)
-            vec.speed = 0
+            vec.velocity = 0
         except ValueError:
             print "ValueError"
 
+    def test_unchecked_construction(self):
+        '''
+        Checks that the unchecked constructor builds the same vector as the
+        validating one.
+        '''
+        self.assertEqual(Vector._unchecked(2, 5, pi, 10), Vector(2, 5, pi, 10))
+        self.assertNotEqual(Vector._unchecked(2, 5, pi, 9),
+                            Vector(2, 5, pi, 10))
+
+    def test_slots(self):
+        '''
+        Checks that vectors do not take attributes outside their slots.
+        '''
+        vec = Vector(2, 5, pi, 10)
+        self.assertFalse(hasattr(vec, '__dict__'))
+        self.assertRaises(AttributeError, setattr, vec, 'speed', 0)
+
 
 class TestPitchObject(unittest.TestCase):
     '''
@@ -110,6 +127,31 @@ class TestPitchObject(unittest.TestCase):
             # TODO learn how to fail
             print "ValueError!"
 
+    def test_unchecked_vector(self):
+        '''
+        Checks that the unchecked update applies the angle offset like the
+        vector setter.
+        '''
+        p = PitchObject(2, 2, 0, 0, 20, 20, 20, angle_offset=0.5)
+        p._set_vector_unchecked(3, 4, 1, 10)
+        checked = PitchObject(2, 2, 0, 0, 20, 20, 20, angle_offset=0.5)
+        checked.vector = Vector(3, 4, 1, 10)
+        self.assertEqual(p.vector, checked.vector)
+
+    def test_memoized_polygon(self):
+        '''
+        Checks that the polygon is reused until the object moves.
+        '''
+        p = PitchObject(50, 50, 0, 0, 40, 20, 10)
+        poly = p.get_polygon()
+        self.assertTrue(p.get_polygon() is poly)
+        p._set_vector_unchecked(50, 50, 0, 5)
+        self.assertTrue(p.get_polygon() is poly)
+        p._set_vector_unchecked(60, 50, 0, 5)
+        self.assertFalse(p.get_polygon() is poly)
+        assert_almost_equal(p.get_polygon()[0],
+                            p.get_generic_polygon(40, 20)[0])
+
     def test_generic_polygon(self):
         '''
         Checks if the points returned by the
@@ -220,6 +262,18 @@ class TestPitch(unittest.TestCase):
                 if not zone1 == zone2:
                     self.assertFalse(zone1.overlaps(zone2))
 
+    def test_zone_map(self):
+        '''
+        Checks the zone label map against the zone polygons
+        '''
+        pitch = Pitch(0)
+        centers = [zone.center() for zone in pitch.zones]
+        for i, (x, y) in enumerate(centers):
+            self.assertEqual(pitch.zone_at(x, y), i)
+        self.assertEqual(pitch.zone_at(-5, 10), None)
+        self.assertEqual(list(pitch.zone_of(centers + [(-5, 10)])),
+                         [0, 1, 2, 3, -1])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,284 @@
+import unittest
+import time
+from math import pi
+from pc.models.world import World
+from pc.models.models import Vector
+from pc.planning.pathfinding import PathFinder
+from pc.planning.control import HeadingController
+from pc.planning.intercept import InterceptSolver, line_region
+from pc.models.prediction import BallPredictor
+from pc.planning.planner import PlanningLoop
+
+
+def positions(attacker_angle=0):
+    """
+    Positions of every moving object, with our attacker in the middle of its
+    zone and clear of their attacker.
+    """
+    return {
+        'our_defender': Vector(60, 150, 0, 0),
+        'our_attacker': Vector(280, 150, attacker_angle, 0),
+        'their_defender': Vector(470, 150, 0, 0),
+        'their_attacker': Vector(340, 60, 0, 0),
+        'ball': Vector(0, 0, 0, 0)
+    }
+
+
+class TestPathFinder(unittest.TestCase):
+    '''
+    Tests the path finding in our attacker's zone.
+    '''
+
+    def setUp(self):
+        self.world = World('left', 0)
+        self.positions = positions()
+        self.world.update_positions(self.positions)
+        self.path_finder = PathFinder(self.world, self.world.our_attacker,
+                                      budget=1.0)
+
+    def test_straight_path(self):
+        self.assertEqual(self.path_finder.find_path((380, 150)), [(380, 150)])
+
+    def test_avoids_obstacle(self):
+        self.positions['their_attacker'] = Vector(330, 150, 0, 0)
+        self.world.update_positions(self.positions)
+        path = self.path_finder.find_path((385, 150))
+        self.assertTrue(len(path) > 1)
+        self.assertEqual(path[-1], (385, 150))
+        for x, y in path:
+            self.assertTrue(self.world.occupancy.is_free(
+                x, y, zone=2, exclude=['our_attacker']))
+
+    def test_reuse(self):
+        self.path_finder.find_path((380, 150))
+        self.path_finder.find_path((382, 152))
+        self.assertTrue(self.path_finder.last_query['reused'])
+        self.path_finder.find_path((380, 60))
+        self.assertFalse(self.path_finder.last_query['reused'])
+
+
+class FakeRobotControl(object):
+    """
+    Records the commands sent to the robot.
+    """
+
+    def __init__(self):
+        self.busy = False
+        self.turns = []
+        self.stops = 0
+        self.acts = 0
+        self.queued_command = None
+        self.waiting_for_ack = False
+
+    def turn(self, rads):
+        self.turns.append(rads)
+
+    def stop(self):
+        self.stops += 1
+
+    def act(self):
+        self.acts += 1
+
+
+class FakePlanner(object):
+    """
+    Counts the plans made.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.robot_ctl = FakeRobotControl()
+        self.plans = 0
+        self.planner_state_string = 'Possession.'
+        self.strategy_state_string = 'Kicking.'
+
+    def plan(self):
+        self.plans += 1
+
+
+class TestHeadingController(unittest.TestCase):
+    '''
+    Tests the heading controller against a simulated turn response.
+    '''
+
+    def setUp(self):
+        self.world = World('left', 0)
+        self.robot_ctl = FakeRobotControl()
+        self.controller = HeadingController(
+            self.world, self.world.our_attacker, self.robot_ctl)
+        self.time = 0
+
+    def set_angle(self, angle, elapsed=1.0):
+        self.time += elapsed
+        self.world.update_positions(positions(angle), self.time)
+
+    def test_alignment(self):
+        self.set_angle(0)
+        self.assertFalse(self.controller.align(280, 250))
+        self.assertAlmostEqual(self.robot_ctl.turns[-1], -pi/2)
+
+        # The robot only makes 80% of the turn, the gain follows
+        self.set_angle(0.4 * pi)
+        self.assertFalse(self.controller.align(280, 250))
+        self.assertTrue(self.controller.gain < 1)
+        self.assertAlmostEqual(self.robot_ctl.turns[-1],
+                               -0.1 * pi / self.controller.gain)
+
+        self.set_angle(pi / 2)
+        self.assertTrue(self.controller.align(280, 250))
+        self.assertEqual(self.controller.alignments, 1)
+        self.assertEqual(self.controller.mean_commands, 2)
+
+        # Staying aligned does not count as more alignments
+        for _ in range(5):
+            self.set_angle(pi / 2)
+            self.assertTrue(self.controller.align(280, 250))
+        self.assertEqual(self.controller.alignments, 1)
+        self.assertEqual(self.controller.mean_commands, 2)
+
+    def test_predictive_stop(self):
+        self.set_angle(0)
+        self.controller.align(280, 250)
+        self.robot_ctl.busy = True
+
+        # Far from the target, the turn carries on
+        self.set_angle(0.5)
+        self.set_angle(0.8, 0.1)
+        self.assertFalse(self.controller.align(280, 250))
+        self.assertEqual(self.robot_ctl.stops, 0)
+
+        # Close enough to coast onto it
+        self.set_angle(1.1, 0.1)
+        self.assertFalse(self.controller.align(280, 250))
+        self.assertEqual(self.robot_ctl.stops, 1)
+        self.assertEqual(len(self.robot_ctl.turns), 1)
+
+
+class TestPlanningLoop(unittest.TestCase):
+    '''
+    Tests the fixed rate planning thread.
+    '''
+
+    def setUp(self):
+        self.world = World('left', 0)
+        self.planner = FakePlanner(self.world)
+        self.loop = PlanningLoop(self.planner, rate=200)
+
+    def see_world(self):
+        self.world.update_positions(positions())
+
+    def test_tick(self):
+        # Nothing is planned before the first frame
+        self.loop.tick()
+        self.assertEqual(self.planner.plans, 0)
+        self.assertEqual(self.loop.status, (None, None))
+
+        self.see_world()
+        self.loop.tick()
+        self.assertEqual(self.planner.plans, 1)
+        self.assertEqual(self.loop.status, ('Possession.', 'Kicking.'))
+
+        self.loop.toggle_pause()
+        self.loop.tick()
+        self.assertEqual(self.planner.plans, 1)
+        self.assertEqual(self.planner.robot_ctl.stops, 1)
+        self.assertEqual(self.loop.status, (None, None))
+
+    def test_run(self):
+        self.see_world()
+        self.loop.start()
+        time.sleep(0.1)
+        self.loop.stop()
+        plans = self.planner.plans
+        self.assertTrue(plans > 0)
+        self.assertTrue(plans <= 21 + self.loop.overruns)
+        time.sleep(0.02)
+        self.assertEqual(self.planner.plans, plans)
+
+    def test_error(self):
+        """
+        A planner error ends the loop, stops the robot and is raised by check
+        """
+        def plan():
+            raise ValueError('planning failed')
+        self.planner.plan = plan
+        self.see_world()
+        self.loop.start()
+        self.loop._thread.join(1)
+        self.assertFalse(self.loop._thread.is_alive())
+        self.assertTrue(isinstance(self.loop.error, ValueError))
+        self.assertEqual(self.planner.robot_ctl.stops, 1)
+        self.assertTrue(self.planner.robot_ctl.acts > 0)
+        self.assertEqual(self.loop.status, (None, None))
+        self.assertRaises(ValueError, self.loop.check)
+
+
+class TestInterceptSolver(unittest.TestCase):
+    """
+    Tests the time-to-intercept solver.
+    """
+
+    def setUp(self):
+        self.world = World('left', 0)
+        self.world.our_attacker.vector = Vector(380, 150, pi / 2, 0)
+        self.robot = self.world.our_attacker
+        self.solver = InterceptSolver(BallPredictor(self.world.pitch))
+
+    def test_reach_times(self):
+        times = self.solver.reach_times(
+            self.robot, [(380, 150), (380, 200), (380, 100), (430, 150)])
+        self.assertAlmostEqual(times[0], self.solver.delay)
+        # Driving backward is as quick as forward, turning first is slower
+        self.assertAlmostEqual(times[1], times[2])
+        self.assertTrue(times[3] > times[1])
+
+    def test_chase(self):
+        """
+        drive_to only drives forward, the full distance to the point
+        """
+        behind, ahead = (380, 100), (380, 200)
+        slide = self.solver.reach_times(self.robot, [behind, ahead])
+        chase = self.solver.reach_times(self.robot, [behind, ahead], True)
+        self.assertAlmostEqual(slide[0], slide[1])
+        self.assertTrue(chase[1] > slide[1])
+        self.assertTrue(chase[0] > chase[1] + 0.5)
+
+        # An arc is longer than the straight line to its end
+        arc = self.solver.reach_times(self.robot, [(400, 200)], True)[0]
+        self.assertTrue(arc > self.solver.reach_times(
+            self.robot, [(380, 200 + 20 * 0.4)], True)[0])
+
+        # A ball rolling up behind the robot is met later when chased
+        self.world.ball.vector = Vector(380, 20, pi / 2, 30)
+        region = (0, 600, 0, 140)
+        _, slid = self.solver.solve(self.world.ball, self.robot, region)
+        _, chased = self.solver.solve(self.world.ball, self.robot, region, True)
+        self.assertTrue(chased > slid + 0.2)
+
+    def test_solve(self):
+        # A ball rolling straight at the robot's line is met on it
+        self.world.ball.vector = Vector(500, 200, pi, 60)
+        (x, y), t = self.solver.solve(
+            self.world.ball, self.robot,
+            line_region(self.robot, 0, self.world.pitch.height))
+        self.assertTrue(abs(x - 380) < 20)
+        self.assertAlmostEqual(y, 200)
+        self.assertTrue(0 < t < 1)
+        reach = self.solver.reach_times(self.robot, [(x, y)])[0]
+        self.assertTrue(reach <= t)
+
+        # A shot too far up the pitch to get to in time
+        self.world.ball.vector = Vector(420, 20, pi, 300)
+        self.assertEqual(self.solver.solve(
+            self.world.ball, self.robot,
+            line_region(self.robot, 0, self.world.pitch.height)), None)
+
+        # A still ball is reached as soon as the robot gets there
+        self.world.ball.vector = Vector(380, 250, 0, 0)
+        (x, y), t = self.solver.solve(self.world.ball, self.robot)
+        self.assertEqual((x, y), (380, 250))
+        self.assertTrue(t >= self.solver.reach_times(self.robot, [(x, y)])[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
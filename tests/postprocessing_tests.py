@@ -6,5 +6,38 @@ from numpy.testing import assert_almost_equal
 from Polygon.cPolygon import Polygon
 
 
+class TestPostprocessing(unittest.TestCase):
+	"""
+	Tests the velocity estimation of Postprocessing
+	"""
+	def positions(self, x):
+		return {'ball': {'x': x, 'y': 100, 'angle': None, 'velocity': None}}
+
+	def test_velocity_in_cm_per_second(self):
+		"""
+		Checks that the velocity depends on time, not on the frame rate
+		"""
+		for step in [0.02, 0.1]:
+			postprocessing = Postprocessing(smoothing=0)
+			postprocessing.analyze(self.positions(0), 0)
+			vectors = postprocessing.analyze(self.positions(step * 91), step)
+			assert_almost_equal(vectors['ball'].velocity, 38.4)
+
+	def test_first_sighting(self):
+		"""
+		Checks that an object seen for the first time is not moving
+		"""
+		postprocessing = Postprocessing()
+		vectors = postprocessing.analyze(self.positions(50), 10)
+		self.assertEqual(vectors['ball'].velocity, 0)
+
+	def test_smoothing(self):
+		postprocessing = Postprocessing(smoothing=0.5)
+		postprocessing.analyze(self.positions(0), 0)
+		postprocessing.analyze(self.positions(0), 1)
+		vectors = postprocessing.analyze(self.positions(91), 2)
+		assert_almost_equal(vectors['ball'].velocity, 19.2)
+
+
 if __name__ == '__main__':
 	unittest.main()
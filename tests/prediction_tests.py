@@ -0,0 +1,46 @@
+import unittest
+from math import pi
+from numpy.testing import assert_almost_equal
+from pc.models.models import Ball, CM_PER_PX
+from pc.models.prediction import BallPredictor
+
+
+class FakePitch(object):
+    height = 100
+
+
+class TestBallPredictor(unittest.TestCase):
+    '''
+    Tests the ball trajectory prediction.
+    '''
+
+    def setUp(self):
+        self.predictor = BallPredictor(FakePitch(), radius=0)
+        # 100 px/s up and to the right
+        speed = 100 * 2 ** 0.5 * CM_PER_PX
+        self.ball = Ball(10, 50, pi / 4, speed)
+
+    def test_path_reflects(self):
+        path = self.predictor.path(self.ball, [0, 0.25, 0.75])
+        assert_almost_equal(path, [(10, 50), (35, 75), (85, 75)])
+
+    def test_velocity_after_bounce(self):
+        velocities = self.predictor.velocities(self.ball, [0.25, 0.75])
+        assert_almost_equal(velocities, [(100, 100), (100, -100)])
+
+    def test_crossing(self):
+        time, y = self.predictor.crossing(self.ball, 85)
+        assert_almost_equal((time, y), (0.75, 75))
+        self.assertEqual(self.predictor.crossing(self.ball, 0), None)
+
+    def test_friction(self):
+        predictor = BallPredictor(FakePitch(), friction=1.0, radius=0)
+        # Travels at most 100 px in x before stopping
+        self.assertEqual(predictor.crossing(self.ball, 120), None)
+        time, _ = predictor.crossing(self.ball, 60)
+        assert_almost_equal(predictor.path(self.ball, [time])[0][0], 60)
+        assert_almost_equal(predictor.stopping_point(self.ball)[0], 110)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from pc.vision.preprocessing import LightingCompensation
+
+
+class TestLightingCompensation(unittest.TestCase):
+    '''
+    Tests the correction of lighting drift.
+    '''
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.frame = random.randint(40, 200, (60, 80, 3)).astype(np.uint8)
+        self.region = (20, 60, 10, 50)
+
+    def drifted(self, frame, gain, offset):
+        values = frame.astype(float) * gain + offset
+        return np.clip(values, 0, 255).astype(np.uint8)
+
+    def test_gain_and_offset(self):
+        calibration = {}
+        lighting = LightingCompensation(calibration, self.region, interval=1)
+        self.assertTrue(lighting.apply(self.frame) is self.frame)
+        self.assertEqual(calibration['lighting']['region'], [20, 60, 10, 50])
+
+        corrected = lighting.apply(self.drifted(self.frame, 0.8, 20))
+        error = np.abs(corrected.astype(int) - self.frame.astype(int))
+        self.assertTrue(error.mean() < 2)
+
+    def test_region(self):
+        """
+        Changes outside the reference region do not move the correction
+        """
+        lighting = LightingCompensation(region=self.region, interval=1)
+        lighting.apply(self.frame)
+        frame = self.frame.copy()
+        frame[:, :10] = 255
+        self.assertTrue((lighting.apply(frame) == frame).all())
+
+    def test_stored_region(self):
+        """
+        The region stored with the reference is used over the given one
+        """
+        calibration = {'lighting': {'low': [0, 0, 0], 'high': [255] * 3,
+                                    'region': [0, 10, 0, 10]}}
+        lighting = LightingCompensation(calibration, self.region)
+        self.assertEqual(lighting.region, [0, 10, 0, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
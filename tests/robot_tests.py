@@ -0,0 +1,97 @@
+import unittest
+from math import pi
+from pc.robot import Robot, DRIVE, STATUS, WHEEL_BASE, WHEEL_SPEED, \
+    cm_to_ticks, rad_to_ticks
+
+
+class TestRobot(unittest.TestCase):
+    '''
+    Tests the commands queued by the motion primitives.
+    '''
+
+    def setUp(self):
+        self.robot = Robot(comms=False)
+
+    def args(self):
+        cmd, arguments = self.robot._queued_command
+        self.assertEqual(cmd, DRIVE)
+        return [float(arg) for arg in arguments]
+
+    def test_conversions(self):
+        self.assertEqual(cm_to_ticks(0), 0)
+        self.assertEqual(cm_to_ticks(-20), -cm_to_ticks(20))
+        self.assertEqual(rad_to_ticks(-pi/2), -rad_to_ticks(pi/2))
+
+    def test_turn(self):
+        self.robot.turn(pi/2)
+        l_dist, r_dist, _, _ = self.args()
+        self.assertEqual(l_dist, rad_to_ticks(pi/2))
+        self.assertEqual(r_dist, -l_dist)
+
+    def test_arc(self):
+        self.robot.arc(pi/2, 30)
+        l_dist, r_dist, l_power, r_power = self.args()
+        self.assertTrue(l_dist > r_dist > 0)
+        self.assertEqual(l_power, 100)
+        self.assertTrue(r_power < l_power)
+
+        self.robot.arc(-pi/2, 30)
+        l_dist, r_dist, l_power, r_power = self.args()
+        self.assertTrue(r_dist > l_dist > 0)
+        self.assertEqual(r_power, 100)
+
+    def test_drive_to(self):
+        self.robot.drive_to(0, 40)
+        l_dist, r_dist, _, _ = self.args()
+        self.assertEqual(l_dist, cm_to_ticks(40))
+        self.assertEqual(l_dist, r_dist)
+
+        self.robot.drive_to(0.3, 40)
+        l_dist, r_dist, _, _ = self.args()
+        self.assertTrue(l_dist > r_dist > 0)
+
+        # Busy until the command is sent
+        self.assertTrue(self.robot.busy)
+        self.robot.act()
+        self.assertFalse(self.robot.busy)
+
+    def test_sequence(self):
+        self.robot.drive_to(pi/2, 40)
+        l_dist, r_dist, _, _ = self.args()
+        self.assertEqual(r_dist, -l_dist)
+        self.assertTrue(self.robot.busy)
+
+        # Status requests keep the sequence, the drive follows the turn
+        self.robot.update_state()
+        self.assertTrue(self.robot.busy)
+        self.robot.act()
+        self.assertTrue(self.robot.busy)
+        self.robot.act()
+        self.assertFalse(self.robot.busy)
+
+        # Any other command abandons it
+        self.robot.drive_to(pi/2, 40)
+        self.robot.stop()
+        self.assertNotEqual(self.robot._queued_command[0], STATUS)
+        self.robot.act()
+        self.assertFalse(self.robot.busy)
+
+    def test_commanded_motion(self):
+        self.assertEqual(self.robot.commanded_motion, None)
+
+        # A drive is in flight from being sent until the robot stops
+        self.robot.turn(pi/2, power=50)
+        self.robot._current_command = self.robot._queued_command
+        self.robot._current_drive = self.robot._current_command
+        self.robot.waiting_for_ack = True
+        speed, turn_rate = self.robot.commanded_motion
+        self.assertEqual(speed, 0)
+        self.assertAlmostEqual(turn_rate, -WHEEL_SPEED / WHEEL_BASE)
+
+        self.robot.waiting_for_ack = False
+        self.robot.is_moving = True
+        self.robot.drive(40, 40)
+        self.assertAlmostEqual(self.robot.commanded_motion[1],
+                               -WHEEL_SPEED / WHEEL_BASE)
+        self.robot.is_moving = False
+        self.assertEqual(self.robot.commanded_motion, None)
@@ -0,0 +1,108 @@
+import unittest
+from math import pi
+from pc.robot import cm_to_ticks, rad_to_ticks
+from pc.models.models import CM_PER_PX
+from pc.simulation.simulator import ticks_to_cm, ticks_to_rad
+from pc.simulation.episode import Episode
+from pc.simulation.batch import make_scenarios, run_batch, summarize
+
+
+class TestSimulator(unittest.TestCase):
+    '''
+    Tests the simulated robots and ball.
+    '''
+
+    def setUp(self):
+        self.episode = Episode('attacker', seed=0)
+        self.simulator = self.episode.simulator
+        self.robot = self.episode.robot
+        self.body = self.simulator.bodies['our_attacker']
+
+    def run_robot(self, seconds):
+        for _ in range(int(seconds / 0.04)):
+            self.robot.act()
+            self.simulator.step(0.04)
+
+    def test_conversions(self):
+        for cm in [3, 10, 40]:
+            self.assertAlmostEqual(ticks_to_cm(cm_to_ticks(cm)), cm, 0)
+        self.assertAlmostEqual(ticks_to_rad(rad_to_ticks(-pi/2)), -pi/2, 1)
+        for deg in range(1, 31):
+            for rads in [deg * pi / 180, -deg * pi / 180]:
+                turned = ticks_to_rad(rad_to_ticks(rads), deg > 9)
+                # Within the rounding to whole ticks
+                self.assertAlmostEqual(turned, rads, delta=0.5 * pi / 180)
+
+    def test_drive_and_turn(self):
+        x, y = self.body.x, self.body.y
+        self.robot.drive(20, 20)
+        self.run_robot(2)
+        self.assertAlmostEqual((self.body.x - x) * CM_PER_PX, 20, 0)
+        self.assertAlmostEqual(self.body.y, y)
+        self.assertFalse(self.robot.is_moving)
+
+        self.robot.turn(pi/2)
+        self.run_robot(2)
+        self.assertAlmostEqual(self.body.angle, 3 * pi / 2, 1)
+
+    def test_small_turns(self):
+        # Ticks of 9 to 16 degree turns also fit the small turn calibration
+        for deg in [10, 12, 16]:
+            angle = self.body.angle
+            self.robot.turn(deg * pi / 180)
+            self.run_robot(1)
+            turned = (angle - self.body.angle) % (2 * pi)
+            self.assertAlmostEqual(turned, deg * pi / 180, delta=0.5 * pi / 180)
+        self.assertEqual(self.robot.comm_pipe.turns, [])
+
+    def test_grab_and_kick(self):
+        x, y = self.body.catch_point()
+        self.simulator.place('ball', x, y)
+        self.robot.close_grabber()
+        self.run_robot(1.5)
+        self.assertTrue(self.robot.ball_grabbed)
+        self.assertFalse(self.robot.grabber_open)
+
+        # Kick past their defender
+        defender = self.simulator.bodies['their_defender']
+        self.simulator.place('their_defender', defender.x, defender.y + 60)
+        self.robot.sequence([('O_GRAB', ['1000', '100']),
+                             ('KICK', ['600', '100'])])
+        self.run_robot(3)
+        self.assertEqual(self.simulator.goal, 'right')
+
+    def test_episode(self):
+        body = self.body
+        self.simulator.place('ball', body.x + 60, body.y + 30)
+        result = self.episode.run(30)
+        self.assertEqual(result['goal'], 'right')
+        self.assertTrue(result['commands'] > 0)
+        self.assertTrue(result['time'] < 30)
+
+    def test_budget(self):
+        episode = Episode('attacker', seed=0, budget=float('inf'))
+        episode.tick()
+        self.assertEqual(episode.world.shot_selector.budget, float('inf'))
+        for strategy in episode.planner.strategies:
+            self.assertEqual(strategy.path_finder.budget, float('inf'))
+
+
+class TestBatch(unittest.TestCase):
+    '''
+    Tests the batch scenario runner.
+    '''
+
+    def test_reproducible(self):
+        scenarios = make_scenarios(3, seed=1)
+        self.assertEqual(scenarios, make_scenarios(3, seed=1))
+        self.assertNotEqual(scenarios, make_scenarios(3, seed=2))
+        self.assertEqual([scenario['profile'] for scenario in scenarios],
+                         ['attacker', 'ms3', 'penalty'])
+
+        results = run_batch(scenarios, processes=1)
+        self.assertEqual(results, run_batch(scenarios, processes=1))
+        summary = summarize(results)
+        self.assertEqual(sorted(summary), ['attacker', 'ms3', 'penalty'])
+        for row in summary.values():
+            self.assertEqual(row['episodes'], 1)
+            self.assertTrue(0 <= row['success_rate'] <= 1)
@@ -1,10 +1,12 @@
 import unittest
+import time
 from math import pi, sin, cos, tan, atan, hypot, sqrt
-from pc.models.world import World, WorldUpdater
+from pc.models.world import World, WorldUpdater, COMMAND_DELAY
 from pc.models.models import *
 from pc.vision import *
 from numpy.testing import assert_almost_equal
 from pc.models.postprocessing import Postprocessing
+from pc.models.history import WorldHistory
 from Polygon.cPolygon import Polygon
 
 class TestWorld(unittest.TestCase):
@@ -37,6 +39,221 @@ class TestWorld(unittest.TestCase):
 		self.assertRaises(ValueError, setattr, world, 'their_goal', None)
 		self.assertRaises(ValueError, setattr, world, 'pitch', None)
 
+class TestWorldState(unittest.TestCase):
+	"""
+	Tests the struct-of-arrays state kept by the world
+	"""
+	def setUp(self):
+		self.world = World("right", 0)
+		self.positions = {
+			'our_defender': Vector(10, 20, 0.5, 1),
+			'our_attacker': Vector(30, 40, 1.5, 2),
+			'their_defender': Vector(50, 60, 2.5, 3),
+			'their_attacker': Vector(70, 80, 3.5, 4),
+			'ball': Vector(90, 100, 4.5, 5)
+		}
+
+	def test_update_writes_rows(self):
+		"""
+		Checks that every object's row matches the object after an update
+		"""
+		self.world.update_positions(self.positions)
+		for name in ['our_defender', 'our_attacker', 'their_defender',
+					 'their_attacker', 'ball', 'our_goal', 'their_goal']:
+			obj = getattr(self.world, name)
+			row = self.world.state.row(name)
+			assert_almost_equal((row['x'], row['y'], row['angle'], row['velocity']),
+								(obj.x, obj.y, obj.angle, obj.velocity))
+		self.assertEqual(self.world.state.frame, 1)
+
+	def test_assignment_writes_row(self):
+		"""
+		Checks that assigning an object's vector updates its row and snapshots
+		"""
+		self.world.update_positions(self.positions)
+		self.world.ball.vector = Vector(5, 6, 1, 2)
+		row = self.world.snapshot().row('ball')
+		assert_almost_equal((row['x'], row['y'], row['angle'], row['velocity']),
+							(5, 6, 1, 2))
+		self.assertEqual(self.world.state.frame, 1)
+
+	def test_snapshot(self):
+		"""
+		Checks that a snapshot is not changed by later updates
+		"""
+		self.world.update_positions(self.positions)
+		snapshot = self.world.snapshot()
+		self.positions['ball'] = Vector(0, 0, 0, 0)
+		self.world.update_positions(self.positions)
+		self.assertEqual(snapshot.row('ball')['x'], 90)
+		self.assertEqual(self.world.state.row('ball')['x'], 0)
+
+	def test_history(self):
+		"""
+		Checks interpolation and derivatives of the world history
+		"""
+		for i in range(5):
+			self.positions['ball'] = Vector(10 * i, 100, 0, 0)
+			self.positions['our_attacker'] = Vector(30, 40, 0.2 * i, 0)
+			self.world.update_positions(self.positions, timestamp=0.1 * i)
+		history = self.world.history
+		ball = history.rows['ball']
+		self.assertEqual(len(history), 5)
+		assert_almost_equal(history.at(0.25)[ball][:2], (25, 100))
+		assert_almost_equal(history.velocity(1)[ball], (100, 0))
+		assert_almost_equal(history.acceleration(1)[ball], (0, 0))
+		self.assertTrue(self.world.our_attacker.is_turning())
+		self.assertFalse(self.world.their_attacker.is_turning())
+
+	def test_predict(self):
+		"""
+		Checks that objects are carried forward at their measured velocities
+		"""
+		for i in range(5):
+			self.positions['their_attacker'] = Vector(70 + 5 * i, 80, 0, 0)
+			self.positions['our_attacker'] = Vector(30 + 5 * i, 40, 0, 0)
+			self.positions['ball'] = Vector(90, 100, 0, 10 * CM_PER_PX)
+			self.world.update_positions(self.positions, timestamp=0.05 * i)
+		predicted = self.world.predict(0.5, still=['our_attacker'])
+		assert_almost_equal((predicted['their_attacker'].x,
+							 predicted['their_attacker'].y), (140, 80))
+		self.assertEqual(predicted['our_attacker'].x, 50)
+		assert_almost_equal(predicted['ball'].x, 95)
+
+	def test_history_wraps(self):
+		"""
+		Checks that the oldest samples are overwritten when full
+		"""
+		history = WorldHistory(['ball'], capacity=3)
+		for i in range(5):
+			history.append(i, [(i, 0, 0, 0)])
+		self.assertEqual(len(history), 3)
+		times, states = history.window(10)
+		assert_almost_equal(times, (2, 3, 4))
+		assert_almost_equal(history.at(0)[0][0], 2)
+
+class TestRaycaster(unittest.TestCase):
+	"""
+	Tests the line of sight tests of the world
+	"""
+	def setUp(self):
+		self.world = World("left", 0)
+		self.world.our_attacker.vector = Vector(300, 200, 0, 0)
+		self.raycaster = self.world.raycaster
+
+	def test_clear(self):
+		blocker = self.world.their_defender
+		blocker.vector = Vector(400, 200, 0, 0)
+		self.assertFalse(self.world.is_path_clear((300, 200), (500, 200), [blocker]))
+		self.assertTrue(self.world.is_path_clear((300, 200), (500, 280), [blocker]))
+		clear = self.raycaster.clear([(300, 200), (300, 100)], (500, 200),
+									 [blocker.get_corners()], 5)
+		self.assertEqual(list(clear), [False, True])
+
+	def test_bounce(self):
+		top = self.raycaster.top
+		bounce = self.raycaster.bounce_points((100, top - 50), (300, top - 50))
+		assert_almost_equal(bounce, (200, top))
+		x, y = self.world.our_attacker.target_via_wall(300, top - 50)
+		assert_almost_equal((x, y), (300, top + 50))
+
+	def test_shot_target(self):
+		"""
+		Checks that a blocked straight shot becomes a bounce shot
+		"""
+		self.world.their_defender.vector = Vector(450, 100, 0, 0)
+		self.assertTrue(self.world.get_shot_target()[1] < self.raycaster.top)
+		self.world.their_defender.vector = Vector(450, 180, 0, 0)
+		self.assertTrue(self.world.get_shot_target()[1] > self.raycaster.top)
+		# Covering the straight shot and the top bounce leaves the bottom one
+		self.world.their_defender.vector = Vector(480, 170, 0, 0)
+		self.assertTrue(self.world.get_shot_target()[1] < self.raycaster.bottom)
+
+	def test_select_shot(self):
+		"""
+		Checks that the selected shot avoids their defender and that an
+		open goal is more likely to be scored than a covered one
+		"""
+		goal = self.world.their_goal
+		selector = self.world.shot_selector
+		selector.budget = float('inf')
+		self.world.their_defender.vector = Vector(goal.x - 40, goal.y + 40, 0, 0)
+		(x, y), covered = self.world.select_shot()
+		self.assertTrue(0 < covered <= 1)
+		self.assertTrue(self.world.is_path_clear((300, 200), (x, y),
+												 [self.world.their_defender]) or
+						y > self.raycaster.top or y < self.raycaster.bottom)
+		self.assertEqual(selector.last_selection['scored'],
+						 selector.last_selection['aims'])
+
+		self.world.their_defender.vector = Vector(goal.x - 40, 20, 0, 0)
+		_, open_goal = self.world.select_shot()
+		self.assertTrue(open_goal >= covered)
+		self.assertEqual(self.world.select_shot()[1], open_goal)
+
+		# Aiming wide of the goal never scores
+		aims = [(goal.x, goal.y + goal.width), (goal.x, goal.y)]
+		probabilities = selector.score((300, 200), aims, goal, [])
+		self.assertEqual(probabilities[0], 0)
+		self.assertTrue(probabilities[1] > 0.5)
+
+class TestOccupancy(unittest.TestCase):
+	"""
+	Tests the cost grid of the robot footprints
+	"""
+	def setUp(self):
+		self.world = World("left", 0)
+		self.positions = {
+			'our_defender': Vector(60, 150, 0, 0),
+			'our_attacker': Vector(350, 150, 0, 0),
+			'their_defender': Vector(470, 150, 0, 0),
+			'their_attacker': Vector(200, 150, 0, 0),
+			'ball': Vector(0, 0, 0, 0)
+		}
+		self.world.update_positions(self.positions)
+		self.grid = self.world.occupancy
+
+	def test_costs(self):
+		self.assertFalse(self.grid.is_free(350, 150))
+		self.assertTrue(self.grid.is_free(350, 150, exclude=['our_attacker']))
+		self.assertTrue(self.grid.is_free(350, 40, zone=2))
+		self.assertFalse(self.grid.is_free(350, 40, zone=1))
+		self.assertEqual(list(self.grid.costs([(200, 150), (200, 40), (-10, 0)])),
+						 [1000, 0, 1000])
+
+	def test_incremental_update(self):
+		"""
+		Checks that moving a robot away and back restores the grid
+		"""
+		before = self.grid.cost.copy()
+		self.positions['their_attacker'] = Vector(220, 100, 1, 0)
+		self.world.update_positions(self.positions)
+		self.assertTrue(self.grid.is_free(200, 180))
+		self.positions['their_attacker'] = Vector(200, 150, 0, 0)
+		self.world.update_positions(self.positions)
+		self.assertTrue((self.grid.cost == before).all())
+
+class StubVision(object):
+	"""
+	Vision reporting fixed model positions
+	"""
+	def __init__(self, positions):
+		self.positions = positions
+
+	def locate(self, frame, frame_hsv=None):
+		return self.positions, self.positions
+
+
+class StubRobotControl(object):
+	"""
+	Robot controller with a fixed round trip and commanded motion
+	"""
+	def __init__(self, round_trip=0.04, motion=None, busy=False):
+		self.round_trip = round_trip
+		self.commanded_motion = motion
+		self.busy = busy
+
+
 class TestWorldUpdater(unittest.TestCase):
 	"""
 	Test the creation and functions inside of WorldUpdater
@@ -57,6 +274,56 @@ class TestWorldUpdater(unittest.TestCase):
 		worldupdater = WorldUpdater(0,"yellow","left",)
 		self.assert_almost_equal(worldupdater.cm_to_px(testValue), 2.36979166667*testValue) 
 
+	def test_predicted_world(self):
+		"""
+		Checks that the predicted world leads the frame by the lead time, with
+		our attacker following its commanded motion
+		"""
+		positions = {
+			'our_defender': {'x': 60, 'y': 150, 'angle': 0},
+			'our_attacker': {'x': 100, 'y': 100, 'angle': 0},
+			'their_defender': {'x': 470, 'y': 150, 'angle': pi},
+			'their_attacker': {'x': 340, 'y': 60, 'angle': pi},
+			'ball': {'x': 200, 'y': 120}
+		}
+		world = World("left", 0)
+		predicted_world = World("left", 0)
+		robot_ctl = StubRobotControl(motion=(30, 0), busy=True)
+		updater = WorldUpdater(0, "yellow", "left", world,
+							   StubVision(positions), predicted_world, robot_ctl)
+
+		# Driving straight ahead at 30 cm/s
+		timestamp = time.time() - 0.1
+		updater.update_world(None, timestamp=timestamp)
+		lead = updater.lead_time
+		self.assertTrue(updater.latency >= 0.1)
+		assert_almost_equal(lead, updater.latency + COMMAND_DELAY + 0.02)
+		assert_almost_equal(predicted_world.history.latest_time,
+							timestamp + lead)
+		attacker = predicted_world.our_attacker
+		assert_almost_equal((attacker.x, attacker.y, attacker.angle),
+							(100 + 30 * lead / CM_PER_PX, 100, 0))
+		self.assertEqual(predicted_world.our_defender.x, 60)
+
+		# Turning right on the spot
+		robot_ctl.commanded_motion = (0, -pi / 2)
+		timestamp = time.time() - 0.05
+		updater.update_world(None, timestamp=timestamp)
+		lead = updater.lead_time
+		assert_almost_equal(predicted_world.history.latest_time,
+							timestamp + lead)
+		attacker = predicted_world.our_attacker
+		assert_almost_equal((attacker.x, attacker.y), (100, 100))
+		assert_almost_equal(attacker.angle, 2 * pi - pi / 2 * lead)
+
+		# Held still without a command in progress
+		robot_ctl.commanded_motion = None
+		robot_ctl.busy = False
+		updater.update_world(None)
+		attacker = predicted_world.our_attacker
+		assert_almost_equal((attacker.x, attacker.y, attacker.angle),
+							(100, 100, 0))
+
 if __name__ == '__main__':
 	unittest.main()
 